@@ -0,0 +1,169 @@
+from connectors.abi_store import get_abi_hash
+from connectors.metrics import metrics
+from typing import Union
+import sqlite3
+import time
+
+
+class DatabaseStandIn:
+    """
+    In-memory sqlite stand-in for SqlDatabaseConnector with the methods used by the collection path.
+    Contract abis are served from memory, so no etherscan request is needed.
+    """
+
+    def __init__(self, contract_abis: Union[dict, None] = None) -> None:
+        self.contract_abis = {address.lower(): abi for address,
+                              abi in (contract_abis or {}).items()}
+
+        self.connection = sqlite3.connect(":memory:")
+        self.connection.execute(
+            "CREATE TABLE transactions ("
+            "transaction_hash TEXT NOT NULL,"
+            "contract_address TEXT NOT NULL,"
+            "token_id INTEGER,"
+            "value TEXT,"
+            "from_address TEXT NOT NULL,"
+            "to_address TEXT NOT NULL,"
+            "block_number INTEGER NOT NULL,"
+            "block_hash TEXT,"
+            "log_index INTEGER NOT NULL,"
+            "PRIMARY KEY (transaction_hash, log_index)"
+            ")")
+        self.unfinalized_blocks = {}
+
+    # Contract Functions
+
+    def is_contract_in_db(self, table_name: str, contract_address: str) -> bool:
+        return contract_address.lower() in self.contract_abis
+
+    def query_all_contract_data(self, table_name: str, contract_address: str, abi_table_name: Union[str, None] = None) -> dict:
+        contract_abi = self.contract_abis[contract_address.lower()]
+        return {"contract_address": contract_address, "abi_hash": get_abi_hash(contract_abi), "abi": contract_abi, "block_deployed": 0}
+
+    def query_contract_abi_hash(self, table_name: str, contract_address: str) -> Union[str, None]:
+        contract_abi = self.contract_abis.get(contract_address.lower())
+        return None if contract_abi is None else get_abi_hash(contract_abi)
+
+    def insert_contract_data(self, table_name: str, contract_address: str, contract_metadata: dict, contract_implemented_token_standards: dict, contract_abi, abi_table_name: str) -> str:
+        self.contract_abis[contract_address.lower()] = contract_abi
+        return get_abi_hash(contract_abi)
+
+    # Transaction Functions
+
+    def insert_many_data(self, table_name: str, many_data: list, batch_size: int = 10000):
+        field_names = list(many_data[0].keys())
+        insert_query = f"INSERT OR IGNORE INTO transactions ({', '.join(field_names)}) VALUES ({', '.join([f':{key}' for key in field_names])})"
+
+        start_time = time.perf_counter()
+
+        for batch_start in range(0, len(many_data), batch_size):
+            batch = [{key: (str(value) if isinstance(value, int) and value > 2 ** 63 - 1 else value) for key, value in row.items()}
+                     for row in many_data[batch_start:batch_start + batch_size]]
+            self.connection.executemany(insert_query, batch)
+            self.connection.commit()
+
+        metrics.inc("db_inserted_rows_total", len(many_data), table=table_name)
+        metrics.observe("db_insert_duration_seconds",
+                        time.perf_counter() - start_time, table=table_name)
+
+    def insert_many_transaction_data(self, table_name: str, transaction_data: list):
+        self.insert_many_data(table_name, transaction_data)
+
+    def query_contract_transfer_stats(self, table_name: str, contract_address: str) -> tuple:
+        return self.connection.execute("SELECT COUNT(*), MIN(block_number), MAX(block_number) FROM transactions WHERE contract_address = ?", (contract_address,)).fetchone()
+
+    def count_transactions(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def insert_many_rows(self, table_name: str, fields: list, rows: list, batch_size: int = 10000, commit: bool = True) -> int:
+        # one untyped table per name, first field is the primary key
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table_name} ({fields[0]} PRIMARY KEY, {', '.join(fields[1:])})")
+
+        insert_query = f"INSERT OR IGNORE INTO {table_name} ({', '.join(fields)}) VALUES ({', '.join(['?'] * len(fields))})"
+        cursor = self.connection.executemany(insert_query, [tuple((str(value) if isinstance(
+            value, int) and value > 2 ** 63 - 1 else value) for value in row) for row in rows])
+        if commit:
+            self.connection.commit()
+
+        metrics.inc("db_inserted_rows_total", len(rows), table=table_name)
+
+        return cursor.rowcount
+
+    def query_existing_transfer_keys(self, table_name: str, transfer_keys: list, from_block: Union[int, None] = None, to_block: Union[int, None] = None) -> set:
+        transaction_hashes = list({transaction_hash for transaction_hash, _ in transfer_keys})
+        existing_transfer_keys = set()
+        for batch_start in range(0, len(transaction_hashes), 10000):
+            batch = transaction_hashes[batch_start:batch_start + 10000]
+            existing_transfer_keys.update(self.connection.execute(
+                f"SELECT transaction_hash, log_index FROM {table_name} WHERE transaction_hash IN ({', '.join(['?'] * len(batch))})", batch))
+        return existing_transfer_keys & set(transfer_keys)
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    @staticmethod
+    def is_lock_conflict(err: Exception) -> bool:
+        # one connection, no concurrent row locks
+        return False
+
+    def count_rows(self, table_name: str) -> int:
+        return self.connection.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+
+    # Holder Balance Functions
+
+    def update_holder_balances(self, table_name: str, balance_deltas: dict, batch_size: int = 1000, commit: bool = True):
+        # balances as decimal strings summed in python like SqlDatabaseConnector
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table_name} (contract_address, holder_address, balance, PRIMARY KEY (contract_address, holder_address))")
+
+        balance_keys = sorted(balance_deltas.keys())
+        for batch_start in range(0, len(balance_keys), batch_size):
+            batch = balance_keys[batch_start:batch_start + batch_size]
+            balances = {}
+            for contract_address, holder_address in batch:
+                row = self.connection.execute(
+                    f"SELECT balance FROM {table_name} WHERE contract_address = ? AND holder_address = ?", (contract_address, holder_address)).fetchone()
+                balances[(contract_address, holder_address)] = int(
+                    row[0]) if row is not None else 0
+
+            self.connection.executemany(f"INSERT OR REPLACE INTO {table_name} (contract_address, holder_address, balance) VALUES (?, ?, ?)",
+                                        [(contract_address, holder_address, str(balances[(contract_address, holder_address)] + balance_deltas[(contract_address, holder_address)]))
+                                         for contract_address, holder_address in batch])
+        if commit:
+            self.connection.commit()
+
+    def upsert_token_owners(self, table_name: str, token_owners: dict, commit: bool = True):
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table_name} (contract_address, token_id, owner_address, block_number, PRIMARY KEY (contract_address, token_id))")
+
+        self.connection.executemany(
+            f"INSERT INTO {table_name} (contract_address, token_id, owner_address, block_number) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (contract_address, token_id) DO UPDATE SET "
+            "owner_address = CASE WHEN excluded.block_number >= block_number THEN excluded.owner_address ELSE owner_address END, "
+            "block_number = MAX(block_number, excluded.block_number)",
+            [(contract_address, str(token_id), owner_address, block_number)
+             for (contract_address, token_id), (owner_address, block_number) in token_owners.items()])
+        if commit:
+            self.connection.commit()
+
+    # Block Functions
+
+    def query_block_numbers(self, table_name: str, from_block: int, to_block: int) -> set:
+        try:
+            return {row[0] for row in self.connection.execute(f"SELECT block_number FROM {table_name} WHERE block_number >= ? AND block_number <= ?", (from_block, to_block))}
+        except sqlite3.OperationalError:
+            # table is created with the first insert
+            return set()
+
+    def insert_unfinalized_blocks(self, table_name: str, block_hashes: dict):
+        self.unfinalized_blocks.update(block_hashes)
+
+    def query_unfinalized_blocks(self, table_name: str) -> list:
+        return sorted(self.unfinalized_blocks.items(), reverse=True)
+
+    def delete_data_by_block_range(self, table_name: str, from_block: Union[int, None] = None, to_block: Union[int, None] = None, commit: bool = True) -> int:
+        return 0
@@ -0,0 +1,299 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import json
+import threading
+
+
+TRANSFER_EVENT_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+
+def _hash(*values) -> str:
+    return "0x" + hashlib.sha256(":".join([str(value) for value in values]).encode()).hexdigest()
+
+
+def _transaction_hash(block_number: int, transaction_index: int) -> str:
+    # block number and index can be read back from the hash (eth_getTransactionReceipt)
+    return "0x" + f"{block_number:032x}{transaction_index:032x}"
+
+
+def _topic_address(index: int) -> str:
+    return "0x" + f"{index % 5000 + 1:064x}"
+
+
+class MockRpcServer:
+    """
+    Local json-rpc server which generates synthetic ERC721 Transfer logs.
+
+    * log_density: average Transfer logs per block and contract
+    * max_block_range: eth_getLogs ranges above this fail with -32005 (provider range limit)
+    * max_results: eth_getLogs results above this fail with -32005 and a suggested smaller range (like infura)
+    * transactions_per_block: transactions of full blocks and block receipts
+    * bloom_addresses: contracts in the logsBloom of blocks with logs (empty blooms without)
+    """
+
+    def __init__(self,
+                 head_block: int = 1000000,
+                 log_density: float = 1.0,
+                 max_block_range: int = None,
+                 max_results: int = 10000,
+                 transactions_per_block: int = 0,
+                 bloom_addresses: list = [],
+                 port: int = 0
+                 ) -> None:
+        self.head_block = head_block
+        self.log_density = log_density
+        self.max_block_range = max_block_range
+        self.max_results = max_results
+        self.transactions_per_block = transactions_per_block
+
+        self.logs_bloom = "0x" + "00" * 256
+        if len(bloom_addresses) != 0:
+            from connectors.log_bloom import get_bloom_mask
+
+            bloom = get_bloom_mask(bytes.fromhex(TRANSFER_EVENT_TOPIC[2:]))
+            for address in bloom_addresses:
+                bloom |= get_bloom_mask(bytes.fromhex(address[2:]))
+            self.logs_bloom = "0x" + f"{bloom:0512x}"
+
+        self.rpc_calls = {}
+        self.lock = threading.Lock()
+
+        server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(
+                    int(self.headers["Content-Length"])))
+                response = json.dumps(server.handle(request)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.http_server = ThreadingHTTPServer(
+            ("127.0.0.1", port), RequestHandler)
+        self.url = f"http://127.0.0.1:{self.http_server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.http_server.serve_forever,
+                         daemon=True).start()
+        return self
+
+    def stop(self):
+        self.http_server.shutdown()
+
+    def get_rpc_call_count(self, method: str = None) -> int:
+        if method is not None:
+            return self.rpc_calls.get(method, 0)
+        return sum(self.rpc_calls.values())
+
+    def handle(self, request):
+        if isinstance(request, list):
+            return [self.handle(single_request) for single_request in request]
+
+        method = request["method"]
+        params = request.get("params", [])
+
+        with self.lock:
+            self.rpc_calls[method] = self.rpc_calls.get(method, 0) + 1
+
+        try:
+            result = getattr(self, method)(*params)
+        except AttributeError:
+            return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32601, "message": f"the method {method} does not exist"}}
+        except RangeLimitError as e:
+            return {"jsonrpc": "2.0", "id": request["id"], "error": e.error}
+
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+    # json-rpc methods
+
+    def eth_chainId(self):
+        return "0x1"
+
+    def net_version(self):
+        return "1"
+
+    def eth_blockNumber(self):
+        return hex(self.head_block)
+
+    def eth_getBlockByNumber(self, block_identifier, full_transactions=False):
+        if block_identifier in ("latest", "safe", "finalized", "pending"):
+            block_number = self.head_block
+        elif block_identifier == "earliest":
+            block_number = 0
+        else:
+            block_number = int(block_identifier, 16)
+
+        if block_number > self.head_block:
+            return None
+
+        transactions = [self._transaction(block_number, transaction_index)
+                        for transaction_index in range(self.transactions_per_block)]
+
+        return {
+            "number": hex(block_number),
+            "hash": _hash("block", block_number),
+            "parentHash": _hash("block", block_number - 1),
+            "timestamp": hex(1600000000 + block_number * 12),
+            "miner": "0x" + f"{block_number % 100:040x}",
+            "gasUsed": hex(21000 * len(transactions)),
+            "gasLimit": hex(30000000),
+            "baseFeePerGas": hex(10 ** 10),
+            "size": hex(1000 + 200 * len(transactions)),
+            "logsBloom": self.logs_bloom if self._log_count(block_number) != 0 else "0x" + "00" * 256,
+            "transactions": transactions if full_transactions else [transaction["hash"] for transaction in transactions]
+        }
+
+    def _transaction(self, block_number: int, transaction_index: int) -> dict:
+        return {
+            "hash": _transaction_hash(block_number, transaction_index),
+            "blockHash": _hash("block", block_number),
+            "blockNumber": hex(block_number),
+            "transactionIndex": hex(transaction_index),
+            "type": "0x2",
+            "from": "0x" + f"{transaction_index + 1:040x}",
+            "to": "0x" + f"{block_number % 5000 + 1:040x}",
+            "value": hex(10 ** 18 * transaction_index),
+            "nonce": hex(block_number),
+            "gas": hex(100000),
+            "gasPrice": hex(2 * 10 ** 10),
+            "maxFeePerGas": hex(3 * 10 ** 10),
+            "maxPriorityFeePerGas": hex(10 ** 9),
+            "input": "0xa9059cbb" + "00" * 64
+        }
+
+    def _receipt(self, block_number: int, transaction_index: int) -> dict:
+        return {
+            "transactionHash": _transaction_hash(block_number, transaction_index),
+            "blockHash": _hash("block", block_number),
+            "blockNumber": hex(block_number),
+            "transactionIndex": hex(transaction_index),
+            "status": "0x1",
+            "gasUsed": hex(21000),
+            "cumulativeGasUsed": hex(21000 * (transaction_index + 1)),
+            "effectiveGasPrice": hex(2 * 10 ** 10),
+            "contractAddress": None,
+            "logs": []
+        }
+
+    def eth_getTransactionReceipt(self, transaction_hash):
+        block_number = int(transaction_hash[2:34], 16)
+        transaction_index = int(transaction_hash[34:], 16)
+        if block_number > self.head_block or transaction_index >= self.transactions_per_block:
+            return None
+
+        return self._receipt(block_number, transaction_index)
+
+    def eth_getBlockReceipts(self, block_identifier):
+        block_number = int(block_identifier, 16)
+        if block_number > self.head_block:
+            return None
+
+        return [self._receipt(block_number, transaction_index) for transaction_index in range(self.transactions_per_block)]
+
+    def _balance(self, address: str, block_number: int) -> int:
+        # deterministic balance of an address at a block (ETH and token balances)
+        return int(address, 16) % 10 ** 18 + block_number
+
+    def eth_getBalance(self, address, block_identifier):
+        return hex(self._balance(address, int(block_identifier, 16)))
+
+    def _call(self, call_data: str, block_number: int):
+        # getEthBalance(address) of Multicall3 and balanceOf(address), None for other functions (reverted)
+        if call_data[2:10] in ("4d2301cc", "70a08231"):
+            return f"{self._balance('0x' + call_data[34:74], block_number):064x}"
+        return None
+
+    def eth_call(self, transaction, block_identifier):
+        from eth_abi import decode, encode
+
+        block_number = int(block_identifier, 16)
+        call_data = transaction["data"]
+
+        # Multicall3 aggregate3((address,bool,bytes)[])
+        if call_data[2:10] == "82ad56cb":
+            calls = decode(["(address,bool,bytes)[]"],
+                           bytes.fromhex(call_data[10:]))[0]
+            results = []
+            for _, _, inner_call_data in calls:
+                result = self._call("0x" + inner_call_data.hex(), block_number)
+                results.append((result is not None, bytes.fromhex(result or "")))
+            return "0x" + encode(["(bool,bytes)[]"], [results]).hex()
+
+        result = self._call(call_data, block_number)
+        if result is None:
+            raise RangeLimitError({"code": 3, "message": "execution reverted"})
+        return "0x" + result
+
+    def eth_getStorageAt(self, address, slot, block_identifier):
+        # every third contract is an EIP-1967 proxy (implementation and admin slot set), other slots are empty
+        if int(address, 16) % 3 == 0 and int(slot, 16) in (0x360894a13ba1a3210667c828492db98dca3e2076cc3735a920a3ca505d382bbc,
+                                                           0xb53127684a568b3173ae13b9f8a6016e243e63b6e8ee1178d6a717850b5d6103):
+            return "0x" + _hash("slot", address.lower(), slot)[-40:].rjust(64, "0")
+        return "0x" + "00" * 32
+
+    def _log_count(self, block_number: int) -> int:
+        # deterministic, evenly spread logs per block
+        return int((block_number + 1) * self.log_density) - int(block_number * self.log_density)
+
+    def eth_getLogs(self, log_filter):
+        from_block = int(log_filter["fromBlock"], 16)
+        to_block = min(int(log_filter["toBlock"], 16), self.head_block)
+        addresses = log_filter["address"]
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        # nodes ignore duplicate addresses
+        addresses = list(dict.fromkeys(addresses))
+
+        if self.max_block_range is not None and to_block - from_block + 1 > self.max_block_range:
+            raise RangeLimitError(
+                {"code": -32005, "message": f"block range too large, max {self.max_block_range} blocks"})
+
+        logs = []
+        for block_number in range(from_block, to_block + 1):
+            log_count = self._log_count(block_number)
+            if log_count == 0:
+                continue
+
+            for address in addresses:
+                for log_index in range(log_count):
+                    logs.append({
+                        "address": address,
+                        "topics": [
+                            TRANSFER_EVENT_TOPIC,
+                            _topic_address(block_number + log_index),
+                            _topic_address(block_number + log_index + 1),
+                            f"0x{block_number * 16 + log_index:064x}"
+                        ],
+                        "data": "0x",
+                        "blockNumber": hex(block_number),
+                        "blockHash": _hash("block", block_number),
+                        "transactionHash": _hash("tx", address, block_number, log_index),
+                        "transactionIndex": hex(log_index),
+                        "logIndex": hex(log_index),
+                        "removed": False
+                    })
+
+            if self.max_results is not None and len(logs) > self.max_results:
+                # suggest the range which still fits (like infura)
+                raise RangeLimitError({
+                    "code": -32005,
+                    "message": f"query returned more than {self.max_results} results",
+                    "data": {"from": hex(from_block), "to": hex(max(from_block, block_number - 1))}
+                })
+
+        return logs
+
+
+class RangeLimitError(Exception):
+    # error response of a request (range limits and reverted calls)
+
+    def __init__(self, error: dict) -> None:
+        super().__init__(error["message"])
+        self.error = error
@@ -0,0 +1,388 @@
+"""
+Offline benchmarks of the collection path against a local mock json-rpc server and an in-memory database stand-in.
+
+Run from the repository root:
+
+    python benchmarks/run_benchmarks.py [--scenario NAME ...] [--output results.json]
+
+Every scenario runs in a fresh process so peak RSS is measured per scenario. Results are printed as json.
+
+Inserts run through the collector (HolderBalances.insert_transactions: existence checks, balance and owner updates) against the
+sqlite stand-in. The mysql statements of SqlDatabaseConnector are not measured (insert_stand_in is the stand-in alone).
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_rpc_server import MockRpcServer  # noqa: E402
+from database_stand_in import DatabaseStandIn  # noqa: E402
+from connectors.token_standards import load_token_standard_abi  # noqa: E402
+import argparse  # noqa: E402
+import json  # noqa: E402
+import logging  # noqa: E402
+import resource  # noqa: E402
+import subprocess  # noqa: E402
+import time  # noqa: E402
+
+
+CONTRACT_ADDRESS = "0x60E4d786628Fea6478F785A6d7e704777c86a7c6"
+
+# fixed scenarios, changing them invalidates earlier results
+SCENARIOS = {
+    # many logs, provider result limit forces range resizing
+    "get_logs_dense": {"blocks": 10000, "log_density": 2.0, "max_results": 10000, "max_block_range": None},
+    # few logs, provider block range limit
+    "get_logs_sparse": {"blocks": 500000, "log_density": 0.01, "max_results": 10000, "max_block_range": 20000},
+    # sqlite stand-in inserts only (baseline of the stand-in, no collector code)
+    "insert_stand_in": {"rows": 200000},
+    # HolderBalances inserts of new rows, then of the same rows again (duplicates are checked and skipped)
+    "insert_holder_balances": {"rows": 200000},
+    # fetch, decode and insert with HolderBalances like insert_contract_transactions
+    "end_to_end": {"blocks": 20000, "log_density": 1.0, "max_results": 10000, "max_block_range": None},
+    # full blocks with transactions and receipts like ingest_blocks.py
+    "ingest_blocks": {"blocks": 2000, "transactions_per_block": 150, "batch_size": 10, "workers": 8},
+    # head following of a sparse contract with the logsBloom prefilter (poll_blocks new blocks per poll)
+    "follow_bloom": {"blocks": 5000, "log_density": 0.005, "poll_blocks": 10},
+    # ETH balances of many holders at one block (json-rpc batches and Multicall3)
+    "balance_snapshot": {"addresses": 50000, "block": 15000000, "batch_size": 500, "workers": 8},
+    # EIP-1967 proxy slots of many contracts at a finalized block, read twice (second pass from the rpc cache)
+    "storage_proxies": {"contracts": 5000, "block": 15000000, "batch_size": 500, "workers": 8},
+    # ownership intervals of shuffled transfers, token ids up to 2**256 - 1 (checked against a plain python build)
+    "provenance_intervals": {"tokens": 20000, "transfers_per_token": 10}
+}
+
+
+def create_execution_client(mock_rpc_server: MockRpcServer, db_stand_in: DatabaseStandIn):
+    from connectors import ExecutionClientConnector, RetryHandler
+
+    return ExecutionClientConnector(
+        mock_rpc_server.url, "http://127.0.0.1:1", "", db_stand_in, "contract", RetryHandler(max_retries=1, base_delay=0.01))
+
+
+def run_get_logs(params: dict) -> dict:
+    mock_rpc_server = MockRpcServer(params["blocks"], params["log_density"],
+                                    params["max_block_range"], params["max_results"]).start()
+    db_stand_in = DatabaseStandIn(
+        {CONTRACT_ADDRESS: load_token_standard_abi("ERC721")})
+    execution_client = create_execution_client(mock_rpc_server, db_stand_in)
+
+    start_time = time.perf_counter()
+    transfers = execution_client.get_token_transfers(
+        CONTRACT_ADDRESS, 0, params["blocks"])
+    duration = time.perf_counter() - start_time
+
+    mock_rpc_server.stop()
+
+    return {
+        "logs": len(transfers),
+        "seconds": duration,
+        "logs_per_sec": len(transfers) / duration,
+        "rpc_calls": mock_rpc_server.get_rpc_call_count()
+    }
+
+
+def create_holder_balances(db_stand_in: DatabaseStandIn):
+    from collector import HolderBalances, TransferDeduplicator
+
+    return HolderBalances(db_stand_in, "transactions", "holder_balance", "token_owner", deduplicator=TransferDeduplicator())
+
+
+def create_insert_rows(row_count: int) -> list:
+    from connectors.transfer_records import TransferRecord
+
+    return [TransferRecord(f"0x{index:064x}", CONTRACT_ADDRESS, index, None, f"0x{index % 5000:040x}",
+                           f"0x{(index + 1) % 5000:040x}", index // 10, f"0x{index // 10:064x}", index % 10) for index in range(row_count)]
+
+
+def run_insert_stand_in(params: dict) -> dict:
+    from connectors.transfer_records import TRANSFER_RECORD_FIELDS
+
+    rows = create_insert_rows(params["rows"])
+
+    db_stand_in = DatabaseStandIn()
+
+    start_time = time.perf_counter()
+    db_stand_in.insert_many_rows("transactions", TRANSFER_RECORD_FIELDS, rows)
+    duration = time.perf_counter() - start_time
+
+    return {
+        "rows": db_stand_in.count_transactions(),
+        "seconds": duration,
+        "rows_per_sec": len(rows) / duration,
+        "rpc_calls": 0
+    }
+
+
+def run_insert_holder_balances(params: dict) -> dict:
+    rows = create_insert_rows(params["rows"])
+
+    db_stand_in = DatabaseStandIn()
+    holder_balances = create_holder_balances(db_stand_in)
+
+    result = {}
+    for insert_pass in ("new", "duplicate"):
+        start_time = time.perf_counter()
+        result[f"{insert_pass}_inserted_rows"] = holder_balances.insert_transactions(
+            rows)
+        duration = time.perf_counter() - start_time
+
+        result[f"{insert_pass}_seconds"] = duration
+        result[f"{insert_pass}_rows_per_sec"] = len(rows) / duration
+
+    result["rows"] = db_stand_in.count_transactions()
+    result["holders"] = db_stand_in.count_rows("holder_balance")
+    result["rpc_calls"] = 0
+
+    return result
+
+
+def run_end_to_end(params: dict) -> dict:
+    mock_rpc_server = MockRpcServer(params["blocks"], params["log_density"],
+                                    params["max_block_range"], params["max_results"]).start()
+    db_stand_in = DatabaseStandIn(
+        {CONTRACT_ADDRESS: load_token_standard_abi("ERC721")})
+    execution_client = create_execution_client(mock_rpc_server, db_stand_in)
+
+    start_time = time.perf_counter()
+    rows = execution_client.get_transfer_records(
+        [CONTRACT_ADDRESS], 0, params["blocks"])
+    fetch_duration = time.perf_counter() - start_time
+
+    create_holder_balances(db_stand_in).insert_transactions(rows)
+    duration = time.perf_counter() - start_time
+
+    mock_rpc_server.stop()
+
+    return {
+        "logs": len(rows),
+        "rows": db_stand_in.count_transactions(),
+        "seconds": duration,
+        "logs_per_sec": len(rows) / fetch_duration,
+        "rows_per_sec": len(rows) / duration,
+        "rpc_calls": mock_rpc_server.get_rpc_call_count()
+    }
+
+
+def run_ingest_blocks(params: dict) -> dict:
+    from collector import BlockIngester
+
+    mock_rpc_server = MockRpcServer(
+        params["blocks"], transactions_per_block=params["transactions_per_block"]).start()
+    db_stand_in = DatabaseStandIn()
+    execution_client = create_execution_client(mock_rpc_server, db_stand_in)
+
+    block_ingester = BlockIngester(execution_client, db_stand_in, "block", "block_transaction",
+                                   "receipt", params["batch_size"], params["workers"])
+
+    start_time = time.perf_counter()
+    block_count = block_ingester.ingest(0, params["blocks"] - 1)
+    duration = time.perf_counter() - start_time
+
+    mock_rpc_server.stop()
+
+    return {
+        "blocks": block_count,
+        "rows": db_stand_in.count_rows("block_transaction") + db_stand_in.count_rows("receipt"),
+        "seconds": duration,
+        "blocks_per_min": block_count / duration * 60,
+        "rpc_calls": mock_rpc_server.get_rpc_call_count()
+    }
+
+
+def run_follow_bloom(params: dict) -> dict:
+    from connectors import LogBloomFilter
+    from connectors.execution_client_connector import TRANSFER_EVENT_TOPIC
+
+    mock_rpc_server = MockRpcServer(
+        params["blocks"], params["log_density"], bloom_addresses=[CONTRACT_ADDRESS]).start()
+    db_stand_in = DatabaseStandIn(
+        {CONTRACT_ADDRESS: load_token_standard_abi("ERC721")})
+    execution_client = create_execution_client(mock_rpc_server, db_stand_in)
+
+    bloom_filter = LogBloomFilter([CONTRACT_ADDRESS], [TRANSFER_EVENT_TOPIC])
+
+    start_time = time.perf_counter()
+    rows = []
+    for poll_start in range(0, params["blocks"], params["poll_blocks"]):
+        poll_end = poll_start + params["poll_blocks"] - 1
+        for candidate_from_block, candidate_to_block in execution_client.get_bloom_candidate_ranges(bloom_filter, poll_start, poll_end):
+            rows.extend(execution_client.get_transfer_records(
+                [CONTRACT_ADDRESS], candidate_from_block, candidate_to_block))
+    duration = time.perf_counter() - start_time
+
+    mock_rpc_server.stop()
+
+    return {
+        "logs": len(rows),
+        "seconds": duration,
+        "polls": params["blocks"] // params["poll_blocks"],
+        "get_logs_calls": mock_rpc_server.get_rpc_call_count("eth_getLogs"),
+        "rpc_calls": mock_rpc_server.get_rpc_call_count()
+    }
+
+
+def run_balance_snapshot(params: dict) -> dict:
+    from collector import BalanceSnapshotter
+
+    mock_rpc_server = MockRpcServer(params["block"]).start()
+    execution_client = create_execution_client(
+        mock_rpc_server, DatabaseStandIn())
+
+    addresses = [f"0x{address_index + 1:040x}" for address_index in range(params["addresses"])]
+
+    result = {}
+    snapshots = {}
+    for method in ("batch", "multicall"):
+        balance_snapshotter = BalanceSnapshotter(
+            execution_client, method, params["batch_size"], params["workers"])
+
+        rpc_calls = mock_rpc_server.get_rpc_call_count()
+        start_time = time.perf_counter()
+        snapshots[method] = balance_snapshotter.snapshot(
+            addresses, [params["block"]])
+        duration = time.perf_counter() - start_time
+
+        result[f"{method}_seconds"] = duration
+        result[f"{method}_rpc_calls"] = mock_rpc_server.get_rpc_call_count() - rpc_calls
+
+    mock_rpc_server.stop()
+
+    result["balances"] = len(snapshots["multicall"][params["block"]])
+    result["equal"] = snapshots["batch"] == snapshots["multicall"]
+
+    return result
+
+
+def run_storage_proxies(params: dict) -> dict:
+    from collector import StorageReader
+    from connectors import ExecutionClientConnector, RetryHandler, RpcCache
+    import tempfile
+
+    mock_rpc_server = MockRpcServer(params["block"]).start()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        rpc_cache = RpcCache(os.path.join(cache_dir, "rpc_cache.sqlite"))
+        rpc_cache.set_finalized_block(params["block"])
+        execution_client = ExecutionClientConnector(
+            mock_rpc_server.url, "http://127.0.0.1:1", "", DatabaseStandIn(), "contract", RetryHandler(max_retries=1, base_delay=0.01), rpc_cache)
+
+        storage_reader = StorageReader(
+            execution_client, params["batch_size"], params["workers"])
+        addresses = [f"0x{address_index + 1:040x}" for address_index in range(params["contracts"])]
+
+        result = {}
+        for read_pass in ("first", "second"):
+            rpc_calls = mock_rpc_server.get_rpc_call_count()
+            start_time = time.perf_counter()
+            proxy_slots = storage_reader.get_proxy_slots(
+                addresses, params["block"])
+            result[f"{read_pass}_seconds"] = time.perf_counter() - start_time
+            result[f"{read_pass}_rpc_calls"] = mock_rpc_server.get_rpc_call_count() - rpc_calls
+
+    mock_rpc_server.stop()
+
+    result["proxies"] = sum(
+        1 for slots in proxy_slots.values() if slots["implementation"] is not None)
+
+    return result
+
+
+def run_provenance_intervals(params: dict) -> dict:
+    from collector.provenance_index import build_provenance_intervals
+    import random
+
+    random.seed(0)
+    # small ids and uint256 ids above the int64 range
+    token_ids = [token_index if token_index % 2 == 0 else 2 ** 256 - token_index
+                 for token_index in range(params["tokens"])]
+    transfers = [(token_id, block_number, log_index, f"0x{random.getrandbits(160):040x}")
+                 for token_id in token_ids
+                 for block_number in random.sample(range(1000000), params["transfers_per_token"])
+                 for log_index in [random.randrange(100)]]
+    random.shuffle(transfers)
+
+    start_time = time.perf_counter()
+    intervals = build_provenance_intervals(CONTRACT_ADDRESS, *zip(*transfers))
+    duration = time.perf_counter() - start_time
+
+    transfers.sort(key=lambda transfer: transfer[:3])
+    expected = [(CONTRACT_ADDRESS, token_id, block_number, log_index, owner_address,
+                 transfers[index + 1][1] if index + 1 < len(transfers) and transfers[index + 1][0] == token_id else None)
+                for index, (token_id, block_number, log_index, owner_address) in enumerate(transfers)]
+
+    return {
+        "transfers": len(transfers),
+        "seconds": duration,
+        "transfers_per_sec": len(transfers) / duration,
+        "equal": intervals == expected
+    }
+
+
+def run_scenario(name: str) -> dict:
+    params = SCENARIOS[name]
+
+    if name.startswith("get_logs"):
+        result = run_get_logs(params)
+    elif name == "insert_stand_in":
+        result = run_insert_stand_in(params)
+    elif name == "insert_holder_balances":
+        result = run_insert_holder_balances(params)
+    elif name == "ingest_blocks":
+        result = run_ingest_blocks(params)
+    elif name == "follow_bloom":
+        result = run_follow_bloom(params)
+    elif name == "balance_snapshot":
+        result = run_balance_snapshot(params)
+    elif name == "storage_proxies":
+        result = run_storage_proxies(params)
+    elif name == "provenance_intervals":
+        result = run_provenance_intervals(params)
+    else:
+        result = run_end_to_end(params)
+
+    # ru_maxrss is in kilobytes on linux
+    result["peak_rss_kb"] = resource.getrusage(
+        resource.RUSAGE_SELF).ru_maxrss
+    result["scenario"] = name
+
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run collection benchmarks offline.")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS.keys(), default=None,
+                        help="scenario to run (can be repeated, default: all)")
+    parser.add_argument("--output", default=None,
+                        help="json file for the results")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run in this process (used for the scenario subprocesses)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    scenarios = args.scenario if args.scenario is not None else list(
+        SCENARIOS.keys())
+
+    if args.in_process:
+        print(json.dumps([run_scenario(name) for name in scenarios]))
+        sys.exit(0)
+
+    results = []
+    for name in scenarios:
+        completed_process = subprocess.run([sys.executable, os.path.abspath(__file__), "--in-process", "--scenario", name],
+                                           capture_output=True, text=True, check=True)
+        result = json.loads(completed_process.stdout.strip().splitlines()[-1])[0]
+        results.append(result)
+
+        print(f"{name}: {json.dumps(result)}", file=sys.stderr)
+
+    output = json.dumps({"timestamp": int(time.time()), "python": sys.version.split(" ")[0], "results": results}, indent=4)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
@@ -0,0 +1,14 @@
+# __init__.py
+from .provenance_index import ProvenanceIndex, build_provenance_intervals
+from .transfer_deduplicator import TransferDeduplicator, SeenSet
+from .holder_balances import HolderBalances
+from .transaction_writer import TransactionWriter
+from .reorg_tracker import ReorgTracker
+from .contract_registry import ContractRegistry, merge_contract_lists
+from .work_queue import WorkQueue, LeaseLostError, split_block_range
+from .collection_planner import CollectionPlanner
+from .transaction_formatter import get_block_hashes
+from .block_ingester import BlockIngester
+from .address_activity import AddressActivity
+from .balance_snapshot import BalanceSnapshotter
+from .storage_reader import StorageReader, get_mapping_slot
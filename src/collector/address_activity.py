@@ -0,0 +1,47 @@
+from connectors import SqlDatabaseConnector
+from typing import Union
+
+
+class AddressActivity:
+    """
+    Transfers of an address across all collected contracts, paged by keyset (block_number, contract_address, transaction_hash, log_index).
+    Pages are read from the from_activity / to_activity indexes of the transaction table in index order, so the cost of a page
+    does not depend on the table size, the page number or the number of transfers of the address.
+    """
+
+    def __init__(self, sql_db_connector: SqlDatabaseConnector, transaction_table_name: str) -> None:
+        self.sql_db_connector = sql_db_connector
+        self.transaction_table_name = transaction_table_name
+
+    def get_transfers(self,
+                      address: str,
+                      direction: str = "both",
+                      contract_addresses: Union[list, None] = None,
+                      from_block: Union[int, None] = None,
+                      to_block: Union[int, None] = None,
+                      after: Union[tuple, None] = None,
+                      limit: int = 100,
+                      descending: bool = False) -> tuple:
+        """
+        Return (transfers, next_cursor). Pass next_cursor as 'after' to get the next page (None on the last page).
+        """
+        transfers = self.sql_db_connector.query_address_transfers(
+            self.transaction_table_name, address, direction, contract_addresses, from_block, to_block, after, limit, descending)
+
+        next_cursor = None
+        if len(transfers) == limit:
+            next_cursor = (transfers[-1]["block_number"], transfers[-1]["contract_address"],
+                           transfers[-1]["transaction_hash"], transfers[-1]["log_index"])
+
+        return transfers, next_cursor
+
+    def iter_transfers(self, address: str, page_size: int = 1000, **filters):
+        # yield all transfers of the address page by page
+        after = None
+        while True:
+            transfers, after = self.get_transfers(
+                address, after=after, limit=page_size, **filters)
+            yield from transfers
+
+            if after is None:
+                break
@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Union
+import logging
+import time
+
+if TYPE_CHECKING:
+    from connectors import ExecutionClientConnector
+
+
+# same address on all chains (https://github.com/mds1/multicall)
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_DEPLOY_BLOCK = 14353601  # mainnet
+
+GET_ETH_BALANCE_SELECTOR = "4d2301cc"  # getEthBalance(address)
+BALANCE_OF_SELECTOR = "70a08231"  # balanceOf(address)
+AGGREGATE3_SELECTOR = "82ad56cb"  # aggregate3((address,bool,bytes)[])
+
+
+def encode_address_call(selector: str, address: str) -> str:
+    return "0x" + selector + address[2:].lower().rjust(64, "0")
+
+
+def encode_aggregate3(calls: list) -> str:
+    """
+    Encode [(target, call data)] as Multicall3 aggregate3 call data (failing calls are allowed).
+    """
+    # imported here, the collector is used without eth_abi (seconds of startup time with web3)
+    from eth_abi import encode
+    return "0x" + AGGREGATE3_SELECTOR + encode(["(address,bool,bytes)[]"],
+                                               [[(target, True, bytes.fromhex(call_data[2:])) for target, call_data in calls]]).hex()
+
+
+def decode_aggregate3(result: str) -> list:
+    """
+    Return [(success, return data)] of an aggregate3 eth_call result.
+    """
+    from eth_abi import decode
+    return decode(["(bool,bytes)[]"], bytes.fromhex(result[2:]))[0]
+
+
+def decode_uint(return_data: Union[str, bytes, None]) -> Union[int, None]:
+    # None for failed calls and tokens without a uint256 return value
+    if isinstance(return_data, str):
+        return_data = bytes.fromhex(return_data[2:])
+    if return_data is None or len(return_data) < 32:
+        return None
+    return int.from_bytes(return_data[:32], "big")
+
+
+class BalanceSnapshotter:
+    """
+    Resolve ETH or ERC20 balances of many addresses at many blocks.
+
+    * method "batch": one json-rpc batch of 'batch_size' eth_getBalance (or balanceOf eth_call) requests per request
+    * method "multicall": one Multicall3 aggregate3 eth_call of 'batch_size' getEthBalance (or balanceOf) calls per request,
+      blocks before the Multicall3 deploy block fall back to json-rpc batches
+
+    Requests are sent by 'workers' concurrent threads. Balances of failed balanceOf calls are None.
+    """
+
+    def __init__(self,
+                 execution_client: "ExecutionClientConnector",
+                 method: str = "multicall",
+                 batch_size: int = 500,
+                 workers: int = 8,
+                 multicall_address: str = MULTICALL3_ADDRESS,
+                 multicall_deploy_block: int = MULTICALL3_DEPLOY_BLOCK
+                 ) -> None:
+        if method not in ("batch", "multicall"):
+            raise ValueError(
+                f"Unknown method: {method} (expected 'batch' or 'multicall')")
+
+        self.execution_client = execution_client
+        self.method = method
+        self.batch_size = batch_size
+        self.workers = workers
+        self.multicall_address = multicall_address
+        self.multicall_deploy_block = multicall_deploy_block
+
+    def _fetch_batch(self, addresses: list, block_number: int, token_address: Union[str, None]) -> list:
+        if token_address is None:
+            return [int(balance, 16) for balance in self.execution_client.get_raw_balances(addresses, block_number)]
+
+        results = self.execution_client.get_raw_calls(
+            [(token_address, encode_address_call(BALANCE_OF_SELECTOR, address)) for address in addresses], block_number, allow_errors=True)
+        return [decode_uint(result) for result in results]
+
+    def _fetch_multicall(self, addresses: list, block_number: int, token_address: Union[str, None]) -> list:
+        if token_address is None:
+            calls = [(self.multicall_address, encode_address_call(
+                GET_ETH_BALANCE_SELECTOR, address)) for address in addresses]
+        else:
+            calls = [(token_address, encode_address_call(
+                BALANCE_OF_SELECTOR, address)) for address in addresses]
+
+        result = self.execution_client.get_raw_calls(
+            [(self.multicall_address, encode_aggregate3(calls))], block_number)[0]
+
+        return [decode_uint(return_data) if success else None for success, return_data in decode_aggregate3(result)]
+
+    def fetch_balances(self, addresses: list, block_number: int, token_address: Union[str, None] = None) -> list:
+        """
+        Return the balances of the addresses (one request) in address order.
+        """
+        if self.method == "multicall" and block_number >= self.multicall_deploy_block:
+            return self._fetch_multicall(addresses, block_number, token_address)
+        return self._fetch_batch(addresses, block_number, token_address)
+
+    def snapshot(self, addresses: list, block_numbers: list, token_address: Union[str, None] = None) -> dict:
+        """
+        Return {block_number: {address: balance}} of all addresses at all blocks.
+        Balances are ETH balances (wei) or balanceOf of 'token_address'.
+        """
+        start_time = time.perf_counter()
+
+        batches = [(addresses[batch_start:batch_start + self.batch_size], block_number)
+                   for block_number in block_numbers for batch_start in range(0, len(addresses), self.batch_size)]
+
+        balances = {block_number: {} for block_number in block_numbers}
+        with ThreadPoolExecutor(self.workers) as executor:
+            futures = [executor.submit(self.fetch_balances, batch_addresses, block_number, token_address)
+                       for batch_addresses, block_number in batches]
+
+            for (batch_addresses, block_number), future in zip(batches, futures):
+                balances[block_number].update(
+                    zip(batch_addresses, future.result()))
+
+        logging.info(
+            f"Balance snapshot done: {len(addresses)} addresses at {len(block_numbers)} blocks in {len(batches)} requests "
+            f"({time.perf_counter() - start_time:.1f}s)")
+
+        return balances
@@ -0,0 +1,224 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from connectors import SqlDatabaseConnector
+from connectors.metrics import metrics
+from typing import TYPE_CHECKING, Union
+import logging
+import time
+
+if TYPE_CHECKING:
+    from connectors import ExecutionClientConnector
+
+
+# columns of the block tables in order of the decoded tuples
+BLOCK_FIELDS = ["block_number", "block_hash", "parent_hash", "timestamp", "miner",
+                "gas_used", "gas_limit", "base_fee_per_gas", "transaction_count", "size"]
+BLOCK_TRANSACTION_FIELDS = ["transaction_hash", "block_number", "transaction_index", "transaction_type", "from_address", "to_address",
+                            "value", "nonce", "gas", "gas_price", "max_fee_per_gas", "max_priority_fee_per_gas", "method_id", "input_size"]
+RECEIPT_FIELDS = ["transaction_hash", "block_number", "status", "gas_used",
+                  "cumulative_gas_used", "effective_gas_price", "contract_address", "log_count"]
+
+
+def _to_int(value: Union[str, None]) -> Union[int, None]:
+    return None if value is None else int(value, 16)
+
+
+def decode_block(block: dict) -> tuple:
+    return (
+        int(block["number"], 16),
+        block["hash"],
+        block["parentHash"],
+        int(block["timestamp"], 16),
+        block["miner"],
+        int(block["gasUsed"], 16),
+        int(block["gasLimit"], 16),
+        _to_int(block.get("baseFeePerGas")),
+        len(block["transactions"]),
+        int(block["size"], 16)
+    )
+
+
+def decode_transaction(transaction: dict) -> tuple:
+    # only the method id and size of the input are kept
+    input_data = transaction["input"]
+
+    return (
+        transaction["hash"],
+        int(transaction["blockNumber"], 16),
+        int(transaction["transactionIndex"], 16),
+        _to_int(transaction.get("type")) or 0,
+        transaction["from"],
+        transaction["to"],
+        int(transaction["value"], 16),
+        int(transaction["nonce"], 16),
+        int(transaction["gas"], 16),
+        _to_int(transaction.get("gasPrice")),
+        _to_int(transaction.get("maxFeePerGas")),
+        _to_int(transaction.get("maxPriorityFeePerGas")),
+        input_data[:10] if len(input_data) >= 10 else None,
+        (len(input_data) - 2) // 2
+    )
+
+
+def decode_receipt(receipt: dict) -> tuple:
+    return (
+        receipt["transactionHash"],
+        int(receipt["blockNumber"], 16),
+        # no status before byzantium
+        _to_int(receipt.get("status")),
+        int(receipt["gasUsed"], 16),
+        int(receipt["cumulativeGasUsed"], 16),
+        _to_int(receipt.get("effectiveGasPrice")),
+        receipt.get("contractAddress"),
+        len(receipt["logs"])
+    )
+
+
+class BlockIngester:
+    """
+    Ingest blocks, their transactions and receipts of a block range into the block tables.
+
+    Blocks are fetched in json-rpc batches by concurrent threads and written in block order, one db transaction per batch.
+    Blocks already in the block table are skipped, so an interrupted run is resumed by running it again.
+    Receipts are fetched per block (eth_getBlockReceipts) or per transaction if the node does not support it.
+    """
+
+    def __init__(self,
+                 execution_client: "ExecutionClientConnector",
+                 sql_db_connector: SqlDatabaseConnector,
+                 block_table_name: str,
+                 block_transaction_table_name: str,
+                 receipt_table_name: str,
+                 batch_size: int = 10,
+                 workers: int = 8
+                 ) -> None:
+        self.execution_client = execution_client
+        self.sql_db_connector = sql_db_connector
+        self.block_table_name = block_table_name
+        self.block_transaction_table_name = block_transaction_table_name
+        self.receipt_table_name = receipt_table_name
+        self.batch_size = batch_size
+        self.workers = workers
+
+        # unknown until the first request
+        self.block_receipts_supported = None
+
+    def fetch_blocks(self, block_numbers: list) -> tuple:
+        """
+        Return decoded (block rows, transaction rows, receipt rows) of the blocks.
+        """
+        blocks = self.execution_client.get_raw_blocks(block_numbers)
+
+        for block_number, block in zip(block_numbers, blocks):
+            if block is None:
+                raise ValueError(f"Block not found: {block_number}")
+
+        receipts = self._fetch_receipts(block_numbers, blocks)
+
+        block_rows = [decode_block(block) for block in blocks]
+        transaction_rows = [decode_transaction(transaction)
+                            for block in blocks for transaction in block["transactions"]]
+        receipt_rows = [decode_receipt(receipt) for receipt in receipts]
+
+        if len(receipt_rows) != len(transaction_rows):
+            raise ValueError(
+                f"Receipts missing for blocks {block_numbers[0]}-{block_numbers[-1]} ({len(receipt_rows)} of {len(transaction_rows)})")
+
+        return block_rows, transaction_rows, receipt_rows
+
+    def _fetch_receipts(self, block_numbers: list, blocks: list) -> list:
+        if self.block_receipts_supported is not False:
+            try:
+                block_receipts = self.execution_client.get_raw_block_receipts(
+                    block_numbers)
+                self.block_receipts_supported = True
+                return [receipt for receipts in block_receipts for receipt in receipts]
+            except ValueError as e:
+                if self.block_receipts_supported:
+                    raise
+                logging.warning(
+                    f"eth_getBlockReceipts not supported, fetching receipts per transaction: {e}")
+                self.block_receipts_supported = False
+
+        transaction_hashes = [transaction["hash"]
+                              for block in blocks for transaction in block["transactions"]]
+        if len(transaction_hashes) == 0:
+            return []
+
+        return self.execution_client.get_raw_transaction_receipts(transaction_hashes)
+
+    def write_blocks(self, block_rows: list, transaction_rows: list, receipt_rows: list):
+        # the block row is the completion marker of a block, all rows are committed together
+        try:
+            self.sql_db_connector.insert_many_rows(
+                self.receipt_table_name, RECEIPT_FIELDS, receipt_rows, commit=False)
+            self.sql_db_connector.insert_many_rows(
+                self.block_transaction_table_name, BLOCK_TRANSACTION_FIELDS, transaction_rows, commit=False)
+            self.sql_db_connector.insert_many_rows(
+                self.block_table_name, BLOCK_FIELDS, block_rows, commit=False)
+            self.sql_db_connector.commit()
+        except Exception:
+            self.sql_db_connector.rollback()
+            raise
+
+        metrics.inc("ingested_blocks_total", len(block_rows))
+
+    def _iter_missing_batches(self, from_block: int, to_block: int, segment_size: int = 10000):
+        # blocks already in the block table are skipped (segment wise to keep memory flat)
+        for segment_start in range(from_block, to_block + 1, segment_size):
+            segment_end = min(segment_start + segment_size - 1, to_block)
+
+            ingested_block_numbers = self.sql_db_connector.query_block_numbers(
+                self.block_table_name, segment_start, segment_end)
+            missing_block_numbers = [block_number for block_number in range(
+                segment_start, segment_end + 1) if block_number not in ingested_block_numbers]
+
+            for batch_start in range(0, len(missing_block_numbers), self.batch_size):
+                yield missing_block_numbers[batch_start:batch_start + self.batch_size]
+
+    def ingest(self, from_block: int, to_block: int) -> int:
+        """
+        Ingest all missing blocks of from_block <= block_number <= to_block and return the number of ingested blocks.
+        """
+        logging.info(
+            f"Block ingestion started: blocks {from_block}-{to_block} ({self.workers} workers, {self.batch_size} blocks per batch)")
+
+        ingested_blocks = 0
+        start_time = time.perf_counter()
+        last_log_time = start_time
+
+        batches = self._iter_missing_batches(from_block, to_block)
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            # bounded number of batches in flight, results are written in block order
+            futures = deque()
+            for batch in batches:
+                futures.append(executor.submit(self.fetch_blocks, batch))
+                if len(futures) >= self.workers * 2:
+                    break
+
+            while len(futures) != 0:
+                try:
+                    block_rows, transaction_rows, receipt_rows = futures.popleft().result()
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+                batch = next(batches, None)
+                if batch is not None:
+                    futures.append(executor.submit(self.fetch_blocks, batch))
+
+                self.write_blocks(block_rows, transaction_rows, receipt_rows)
+                ingested_blocks += len(block_rows)
+
+                if time.perf_counter() - last_log_time >= 10:
+                    last_log_time = time.perf_counter()
+                    logging.info(
+                        f"Blocks ingested up to {block_rows[-1][0]}: {ingested_blocks} blocks ({ingested_blocks / (last_log_time - start_time) * 60:.0f} blocks/min)")
+
+        duration = time.perf_counter() - start_time
+        logging.info(
+            f"Block ingestion done: {ingested_blocks} blocks in {duration:.1f}s")
+
+        return ingested_blocks
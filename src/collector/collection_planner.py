@@ -0,0 +1,201 @@
+from connectors import SqlDatabaseConnector
+from collector.work_queue import split_block_range
+from typing import TYPE_CHECKING
+import logging
+import math
+import time
+
+if TYPE_CHECKING:
+    from connectors import ExecutionClientConnector
+
+
+class CollectionPlanner:
+    """
+    Estimate transfer count and rpc cost of contract block ranges before collecting them and plan the work queue jobs.
+
+    The density (transfers per block) of a contract is estimated from its transfers already in the transaction table and
+    eth_getLogs samples spread over the range (small ranges are counted completely). Contracts above 'target_job_logs'
+    transfers are split into shards of about 'target_job_logs' transfers, small contracts are batched into one job
+    (one eth_getLogs query for all of them). Jobs are ordered by estimated cost, largest first, so no large job starts last.
+
+    A batched job covers the range of its first contract. Contracts with transfers in the table only join batches starting
+    at their own from_block, so none of their blocks is fetched twice.
+    """
+
+    def __init__(self,
+                 execution_client: "ExecutionClientConnector",
+                 sql_db_connector: SqlDatabaseConnector,
+                 transaction_table_name: str,
+                 sample_count: int = 5,
+                 sample_blocks: int = 2000,
+                 target_job_logs: int = 200000,
+                 max_batch_contracts: int = 50,
+                 max_logs_per_request: int = 10000,
+                 seconds_per_log: float = 0.0002
+                 ) -> None:
+        self.execution_client = execution_client
+        self.sql_db_connector = sql_db_connector
+        self.transaction_table_name = transaction_table_name
+        self.sample_count = sample_count
+        self.sample_blocks = sample_blocks
+        self.target_job_logs = target_job_logs
+        self.max_batch_contracts = max_batch_contracts
+        self.max_logs_per_request = max_logs_per_request
+        # decoding and inserting (measured by the profiler or benchmarks)
+        self.seconds_per_log = seconds_per_log
+
+        # mean duration of the sample requests (updated while estimating)
+        self.seconds_per_request = None
+        self.sample_durations = []
+
+    def _get_sample_ranges(self, from_block: int, to_block: int) -> list:
+        blocks = to_block - from_block + 1
+
+        if blocks <= self.sample_count * self.sample_blocks:
+            return [(from_block, to_block)]
+
+        # the first sample starts at from_block (mints right after the deploy block)
+        step = (blocks - self.sample_blocks) // max(self.sample_count - 1, 1)
+        return [(sample_from_block, sample_from_block + self.sample_blocks - 1)
+                for sample_from_block in range(from_block, from_block + step * self.sample_count, step)]
+
+    def estimate_contract(self, contract_address: str, from_block: int, to_block: int) -> dict:
+        """
+        Return {"contract_address", "from_block", "to_block", "density", "estimated_logs", "exact", "collected_logs"} of the block range.
+        """
+        observed_logs, observed_from_block, observed_to_block = self.sql_db_connector.query_contract_transfer_stats(
+            self.transaction_table_name, contract_address)
+        observed_blocks = observed_to_block - observed_from_block + \
+            1 if observed_logs != 0 else 0
+
+        sample_ranges = self._get_sample_ranges(from_block, to_block)
+
+        sample_logs = 0
+        sample_blocks = 0
+        for sample_from_block, sample_to_block in sample_ranges:
+            start_time = time.perf_counter()
+            sample_logs += len(self.execution_client.get_transfer_records(
+                [contract_address], sample_from_block, sample_to_block))
+            self.sample_durations.append(time.perf_counter() - start_time)
+            sample_blocks += sample_to_block - sample_from_block + 1
+
+        self.seconds_per_request = sum(
+            self.sample_durations) / len(self.sample_durations)
+
+        exact = len(sample_ranges) == 1 and sample_blocks == to_block - from_block + 1
+        if exact:
+            density = sample_logs / sample_blocks
+        else:
+            density = (observed_logs + sample_logs) / \
+                (observed_blocks + sample_blocks)
+
+        return {
+            "contract_address": contract_address,
+            "from_block": from_block,
+            "to_block": to_block,
+            "density": density,
+            "estimated_logs": sample_logs if exact else int(density * (to_block - from_block + 1)),
+            "exact": exact,
+            "collected_logs": observed_logs
+        }
+
+    def estimate_job_seconds(self, estimated_logs: int) -> float:
+        requests = max(1, math.ceil(estimated_logs / self.max_logs_per_request))
+        return requests * (self.seconds_per_request or 0) + estimated_logs * self.seconds_per_log
+
+    def _can_join_batch(self, batch: list, estimate: dict) -> bool:
+        # the batch is fetched from the from_block of its first contract (batches are sorted by from_block)
+        if estimate["to_block"] != batch[0]["to_block"]:
+            return False
+        if estimate["collected_logs"] != 0 and estimate["from_block"] != batch[0]["from_block"]:
+            return False
+        if len(batch) >= self.max_batch_contracts:
+            return False
+        return sum(batch_estimate["estimated_logs"] for batch_estimate in batch) + estimate["estimated_logs"] <= self.target_job_logs
+
+    def plan(self, contracts: list, workers: int = 1, on_error=None) -> dict:
+        """
+        Estimate all contracts ([(contract_address, from_block, to_block)]) and return the plan
+        {"jobs", "contract_addresses", "estimated_logs", "estimated_requests", "estimated_seconds", "eta_seconds"}.
+        Jobs are dicts of the work queue table (contract_address, from_block, to_block, batch_addresses, estimated_logs),
+        contract_addresses are the planned contracts.
+
+        * on_error (optional): called with (contract_address, error) for contracts that can not be estimated
+          (e.g. no abi or Transfer event), they are left out of the plan
+        """
+        estimates = []
+        for contract_address, from_block, to_block in contracts:
+            try:
+                estimates.append(self.estimate_contract(
+                    contract_address, from_block, to_block))
+            except Exception as e:
+                logging.error(
+                    f"Error while estimating contract: {contract_address}, error: {e}")
+                if on_error is not None:
+                    on_error(contract_address, e)
+                continue
+
+            logging.info(
+                f"Contract estimated: {contract_address} blocks {from_block}-{to_block} ({estimates[-1]['estimated_logs']} transfers)")
+
+        jobs = []
+
+        # large contracts are split into shards of about target_job_logs transfers (evenly spread)
+        small_estimates = []
+        for estimate in estimates:
+            if estimate["estimated_logs"] <= self.target_job_logs:
+                small_estimates.append(estimate)
+                continue
+
+            shard_count = math.ceil(
+                estimate["estimated_logs"] / self.target_job_logs)
+            shard_size = math.ceil(
+                (estimate["to_block"] - estimate["from_block"] + 1) / shard_count)
+            for shard_from_block, shard_to_block in split_block_range(estimate["from_block"], estimate["to_block"], shard_size):
+                jobs.append({
+                    "contract_address": estimate["contract_address"],
+                    "from_block": shard_from_block,
+                    "to_block": shard_to_block,
+                    "batch_addresses": None,
+                    "estimated_logs": int(estimate["density"] * (shard_to_block - shard_from_block + 1))
+                })
+
+        # small contracts with similar ranges are batched up to target_job_logs transfers
+        batch = []
+        for estimate in sorted(small_estimates, key=lambda estimate: (estimate["to_block"], estimate["from_block"])) + [None]:
+            if len(batch) != 0 and (estimate is None or not self._can_join_batch(batch, estimate)):
+                jobs.append({
+                    "contract_address": batch[0]["contract_address"],
+                    "from_block": batch[0]["from_block"],
+                    "to_block": batch[0]["to_block"],
+                    "batch_addresses": ",".join([batch_estimate["contract_address"] for batch_estimate in batch[1:]]) or None,
+                    "estimated_logs": sum(batch_estimate["estimated_logs"] for batch_estimate in batch)
+                })
+                batch = []
+            if estimate is not None:
+                batch.append(estimate)
+
+        jobs = sorted(jobs, key=lambda job: job["estimated_logs"], reverse=True)
+
+        job_seconds = [self.estimate_job_seconds(
+            job["estimated_logs"]) for job in jobs]
+        estimated_seconds = sum(job_seconds)
+
+        # jobs are leased in order, the largest job is a lower bound of the run time
+        eta_seconds = max(estimated_seconds / max(workers, 1),
+                          max(job_seconds, default=0))
+
+        plan = {
+            "jobs": jobs,
+            "contract_addresses": [estimate["contract_address"] for estimate in estimates],
+            "estimated_logs": sum(job["estimated_logs"] for job in jobs),
+            "estimated_requests": sum(max(1, math.ceil(job["estimated_logs"] / self.max_logs_per_request)) for job in jobs),
+            "estimated_seconds": estimated_seconds,
+            "eta_seconds": eta_seconds
+        }
+
+        logging.info(
+            f"Collection planned: {len(estimates)} of {len(contracts)} contracts, {len(jobs)} jobs, {plan['estimated_logs']} transfers, "
+            f"{plan['estimated_requests']} requests, eta {eta_seconds / 3600:.1f}h with {workers} workers")
+
+        return plan
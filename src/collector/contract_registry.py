@@ -0,0 +1,152 @@
+from connectors import SqlDatabaseConnector
+from connectors.metrics import metrics
+from typing import Union
+import logging
+import os
+import socket
+import uuid
+
+
+# contract status in the registry
+PENDING = "pending"
+COLLECTING = "collecting"
+QUEUED = "queued"
+COLLECTED = "collected"
+ERROR = "error"
+
+
+def merge_contract_lists(contract_lists: dict) -> dict:
+    """
+    Merge contract lists ({source: [{"address": ..., "name": ...}, ...]}) into
+    {address (lower case): {"address", "name", "source", ...}} with one dict lookup per contract.
+    The first name and all sources of an address are kept, other keys (e.g. 'collected') are taken from the first list.
+    """
+    merged_contracts = {}
+
+    for source, contract_list in contract_lists.items():
+        for contract in contract_list:
+            key = contract["address"].lower()
+
+            if key not in merged_contracts:
+                merged_contract = dict(contract)
+                merged_contract["source"] = []
+                merged_contracts[key] = merged_contract
+            else:
+                merged_contract = merged_contracts[key]
+
+            # lists which already have a source (e.g. contract_list.json)
+            contract_sources = contract.get("source", [source])
+            if isinstance(contract_sources, str):
+                contract_sources = [contract_sources]
+
+            for contract_source in contract_sources:
+                if contract_source not in merged_contract["source"]:
+                    merged_contract["source"].append(contract_source)
+
+    return merged_contracts
+
+
+class ContractRegistry:
+    """
+    Database backed registry of all contracts and their collection state (status, last collected block, error).
+    Workers claim pending contracts atomically, so any number of collectors can share one registry.
+    """
+
+    def __init__(self, sql_db_connector: SqlDatabaseConnector, table_name: str, worker: Union[str, None] = None) -> None:
+        self.sql_db_connector = sql_db_connector
+        self.table_name = table_name
+        self.worker = worker if worker is not None else f"{socket.gethostname()}:{os.getpid()}"
+
+    def register_contracts(self, contract_lists: dict) -> int:
+        """
+        Merge the contract lists into the registry and return the number of contracts in the lists.
+        Sources of existing contracts are extended, their collection state is kept.
+        Legacy 'collected' and 'error' flags are used as initial status of new contracts.
+        """
+        merged_contracts = merge_contract_lists(contract_lists)
+
+        existing_sources = self.sql_db_connector.query_registry_sources(
+            self.table_name)
+
+        registry_contracts = []
+        for key, contract in merged_contracts.items():
+            sources = contract["source"]
+            if existing_sources.get(key):
+                registry_sources = existing_sources[key].split(",")
+                sources = registry_sources + \
+                    [source for source in sources if source not in registry_sources]
+
+            if contract.get("error", False):
+                status = ERROR
+            elif contract.get("collected", False):
+                status = COLLECTED
+            else:
+                status = PENDING
+
+            registry_contracts.append({
+                "contract_address": contract["address"],
+                "name": contract.get("name"),
+                "source": ",".join(sources),
+                "status": status
+            })
+
+        self.sql_db_connector.upsert_registry_contracts(
+            self.table_name, registry_contracts)
+
+        logging.info(
+            f"Contracts registered: {len(registry_contracts)} contracts ({len(registry_contracts) - len(existing_sources.keys() & merged_contracts.keys())} new)")
+
+        return len(registry_contracts)
+
+    def claim_contracts(self, limit: int = 1) -> list:
+        """
+        Claim up to 'limit' pending contracts for this worker.
+        """
+        return self.sql_db_connector.claim_registry_contracts(
+            self.table_name, uuid.uuid4().hex, self.worker, limit)
+
+    def update_last_block(self, contract_address: str, last_block: int):
+        self.sql_db_connector.update_registry_contract(self.table_name, contract_address, {
+            "last_block": last_block
+        })
+
+    def mark_queued(self, contract_address: str):
+        # collection jobs of the contract are in the work queue
+        self.sql_db_connector.update_registry_contract(self.table_name, contract_address, {
+            "status": QUEUED,
+            "claim_id": None
+        })
+
+    def mark_collected(self, contract_address: str, last_block: int):
+        self.sql_db_connector.update_registry_contract(self.table_name, contract_address, {
+            "status": COLLECTED,
+            "last_block": last_block,
+            "error": None,
+            "claim_id": None
+        })
+
+    def mark_error(self, contract_address: str, error: Exception):
+        self.sql_db_connector.update_registry_contract(self.table_name, contract_address, {
+            "status": ERROR,
+            "error": f"{type(error).__name__}: {error}"[:1000],
+            "claim_id": None
+        })
+
+    def reset_contracts(self, status: str) -> int:
+        """
+        Set all contracts with 'status' back to pending (e.g. contracts of crashed workers or errors).
+        """
+        return self.sql_db_connector.update_registry_status(self.table_name, status, PENDING)
+
+    def get_contract_addresses(self, status: Union[str, None] = None) -> list:
+        return [contract["contract_address"] for contract in self.sql_db_connector.query_registry_contracts(self.table_name, status)]
+
+    def get_status_counts(self) -> dict:
+        status_counts = self.sql_db_connector.count_registry_status(
+            self.table_name)
+
+        for status, count in status_counts.items():
+            metrics.set("queue_depth", count,
+                        queue=self.table_name, status=status)
+
+        return status_counts
@@ -0,0 +1,259 @@
+from connectors import SqlDatabaseConnector
+from connectors.transfer_records import TRANSFER_RECORD_FIELDS
+from collector.provenance_index import ProvenanceIndex
+from collector.transfer_deduplicator import TransferDeduplicator
+from typing import Union
+import logging
+import time
+
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+# transaction table fields used to derive balances and owners (a slice of the transfer record fields)
+TRANSFER_FIELDS = TRANSFER_RECORD_FIELDS[1:7]
+
+# inserts of a batch until its rows are not inserted concurrently by another connection (or locked by it)
+INSERT_ATTEMPTS = 3
+# seconds before a batch is run again after a lock conflict (doubled per attempt)
+LOCK_CONFLICT_DELAY = 0.1
+
+
+def aggregate_transfers(transfers: list, balance_deltas: dict, token_owners: dict, sign: int = 1):
+    """
+    Add transfers (tuples in order of TRANSFER_FIELDS) to balance deltas ({(contract_address, holder_address): delta})
+    and latest token owners ({(contract_address, token_id): (owner_address, block_number)}).
+    ERC20 transfers move 'value', ERC721 transfers move one token. The zero address (mint, burn) has no balance.
+    """
+    for contract_address, token_id, value, from_address, to_address, block_number in transfers:
+        if value is not None:
+            amount = int(value)
+        elif token_id is not None:
+            amount = 1
+
+            token_key = (contract_address, token_id)
+            if token_key not in token_owners or block_number >= token_owners[token_key][1]:
+                token_owners[token_key] = (to_address, block_number)
+        else:
+            continue
+
+        amount *= sign
+
+        if from_address != ZERO_ADDRESS:
+            from_key = (contract_address, from_address)
+            balance_deltas[from_key] = balance_deltas.get(
+                from_key, 0) - amount
+        if to_address != ZERO_ADDRESS:
+            to_key = (contract_address, to_address)
+            balance_deltas[to_key] = balance_deltas.get(to_key, 0) + amount
+
+
+class HolderBalances:
+    """
+    Holder balances and ERC721 token owners maintained incrementally from inserted transactions.
+
+    Transactions are inserted with insert_transactions, so balances only change for rows that are new in the transaction table
+    (one row per Transfer log, keyed by (transaction_hash, log_index)). Balances and rows are committed together per batch.
+    The tables can be rebuilt from the transaction table at any time (rebuild).
+    """
+
+    def __init__(self,
+                 sql_db_connector: SqlDatabaseConnector,
+                 transaction_table_name: str,
+                 holder_balance_table_name: str,
+                 token_owner_table_name: str,
+                 provenance_index: Union[ProvenanceIndex, None] = None,
+                 deduplicator: Union[TransferDeduplicator, None] = None
+                 ) -> None:
+        self.sql_db_connector = sql_db_connector
+        self.transaction_table_name = transaction_table_name
+        self.holder_balance_table_name = holder_balance_table_name
+        self.token_owner_table_name = token_owner_table_name
+        # ownership intervals are updated in the same db transaction
+        self.provenance_index = provenance_index
+        # existence checks of records only for records which may be in the table (optional)
+        self.deduplicator = deduplicator
+
+    def insert_transactions(self, transactions: list, batch_size: int = 10000) -> int:
+        """
+        Insert transfer records and update balances and owners. Return the number of new rows.
+        Records are passed to the database as they are (no per row conversion).
+        With a deduplicator only records which may be in the table are checked before inserting.
+        Balances only change for inserted rows: a batch whose inserted row count differs from its new records (unchecked rows
+        were in the table already or other connections inserted the same rows since the check) is rolled back and inserted
+        again with all records checked.
+        A batch which deadlocks (or times out waiting for row locks) with another connection is rolled back and run again.
+        """
+        new_row_count = 0
+
+        for batch_start in range(0, len(transactions), batch_size):
+            batch = transactions[batch_start:batch_start + batch_size]
+
+            checked_transactions = batch if self.deduplicator is None else self.deduplicator.get_check_candidates(
+                batch)
+            for attempt in range(INSERT_ATTEMPTS):
+                try:
+                    new_transactions = self._insert_batch(
+                        batch, checked_transactions)
+                except Exception as err:
+                    if not self.sql_db_connector.is_lock_conflict(err):
+                        raise
+                    logging.warning(
+                        f"Lock conflict, inserting blocks {batch[0].block_number}-{batch[-1].block_number} again: {err}")
+                    time.sleep(LOCK_CONFLICT_DELAY * 2 ** attempt)
+                    continue
+                if new_transactions is not None:
+                    break
+
+                if self.deduplicator is not None and len(checked_transactions) != len(batch):
+                    self.deduplicator.add_unchecked_duplicates(batch)
+                checked_transactions = batch
+            else:
+                raise RuntimeError(
+                    f"Transactions inserted or locked concurrently in {INSERT_ATTEMPTS} attempts (blocks {batch[0].block_number}-{batch[-1].block_number})")
+
+            if self.deduplicator is not None:
+                self.deduplicator.add_committed(new_transactions)
+
+            new_row_count += len(new_transactions)
+
+        return new_row_count
+
+    def _insert_batch(self, batch: list, checked_transactions: list) -> Union[list, None]:
+        # return the inserted records, None if not all new records were inserted (rolled back)
+        existing_transfer_keys = set()
+        if len(checked_transactions) != 0:
+            block_numbers = [
+                transaction.block_number for transaction in checked_transactions]
+            existing_transfer_keys = self.sql_db_connector.query_existing_transfer_keys(
+                self.transaction_table_name, [(transaction.transaction_hash, transaction.log_index) for transaction in checked_transactions],
+                min(block_numbers), max(block_numbers))
+            if self.deduplicator is not None:
+                self.deduplicator.add_checked(
+                    checked_transactions, existing_transfer_keys)
+
+        new_transactions = []
+        for transaction in batch:
+            transfer_key = (transaction.transaction_hash,
+                            transaction.log_index)
+            if transfer_key not in existing_transfer_keys:
+                # logs repeated within the batch are inserted once
+                existing_transfer_keys.add(transfer_key)
+                new_transactions.append(transaction)
+
+        if len(new_transactions) == 0:
+            return new_transactions
+
+        balance_deltas = {}
+        token_owners = {}
+        aggregate_transfers([transaction[1:7] for transaction in new_transactions],
+                            balance_deltas, token_owners)
+
+        try:
+            inserted_row_count = self.sql_db_connector.insert_many_rows(
+                self.transaction_table_name, TRANSFER_RECORD_FIELDS, new_transactions, commit=False)
+            if inserted_row_count != len(new_transactions):
+                self.sql_db_connector.rollback()
+                return None
+
+            self.sql_db_connector.update_holder_balances(
+                self.holder_balance_table_name, balance_deltas, commit=False)
+            self.sql_db_connector.upsert_token_owners(
+                self.token_owner_table_name, token_owners, commit=False)
+            if self.provenance_index is not None:
+                self.provenance_index.add_transactions(
+                    new_transactions, commit=False)
+            self.sql_db_connector.commit()
+        except Exception:
+            self.sql_db_connector.rollback()
+            raise
+
+        return new_transactions
+
+    def revert_blocks(self, from_block: int, commit: bool = True):
+        """
+        Undo all transactions from 'from_block' on (before they are deleted on a reorg).
+        Owners of affected tokens are set back to their last transfer before 'from_block'.
+        Without commit the caller commits the revert together with the deletion of the transactions.
+        """
+        balance_deltas = {}
+        token_owners = {}
+        for chunk in self.sql_db_connector.query_transaction_data_chunks(self.transaction_table_name, TRANSFER_FIELDS, from_block=from_block):
+            aggregate_transfers(chunk, balance_deltas, token_owners, sign=-1)
+
+        previous_token_owners = {}
+        for contract_address, token_id in token_owners.keys():
+            token_transactions = self.sql_db_connector.query_token_transaction_data(
+                self.transaction_table_name, contract_address, token_id, to_block=from_block - 1)
+            if len(token_transactions) != 0:
+                previous_token_owners[(contract_address, token_id)] = (
+                    token_transactions[-1]["to_address"], token_transactions[-1]["block_number"])
+
+        try:
+            self.sql_db_connector.update_holder_balances(
+                self.holder_balance_table_name, balance_deltas, commit=False)
+            self.sql_db_connector.delete_token_owners(
+                self.token_owner_table_name, list(token_owners.keys()), commit=False)
+            self.sql_db_connector.upsert_token_owners(
+                self.token_owner_table_name, previous_token_owners, commit=False)
+            if self.provenance_index is not None:
+                self.provenance_index.revert_tokens(
+                    sorted(token_owners.keys()), from_block, commit=False)
+            if commit:
+                self.sql_db_connector.commit()
+        except Exception:
+            self.sql_db_connector.rollback()
+            raise
+
+        if self.deduplicator is not None:
+            self.deduplicator.revert(from_block)
+
+        logging.info(
+            f"Holder balances reverted from block {from_block} ({len(balance_deltas)} balances, {len(token_owners)} tokens)")
+
+    def rebuild(self, contract_addresses: Union[list, None] = None):
+        """
+        Recompute balances, owners (and ownership intervals) of the contracts (default: all contracts of the transaction table) from the transaction table.
+        Collection should be stopped while rebuilding.
+        """
+        if contract_addresses is None:
+            contract_addresses = self.sql_db_connector.query_transaction_contract_addresses(
+                self.transaction_table_name)
+
+        for contract_address in contract_addresses:
+            balance_deltas = {}
+            token_owners = {}
+            for chunk in self.sql_db_connector.query_transaction_data_chunks(self.transaction_table_name, TRANSFER_FIELDS, contract_address):
+                aggregate_transfers(chunk, balance_deltas, token_owners)
+
+            try:
+                self.sql_db_connector.delete_contract_rows(
+                    self.holder_balance_table_name, contract_address, commit=False)
+                self.sql_db_connector.delete_contract_rows(
+                    self.token_owner_table_name, contract_address, commit=False)
+                self.sql_db_connector.update_holder_balances(
+                    self.holder_balance_table_name, balance_deltas, commit=False)
+                self.sql_db_connector.upsert_token_owners(
+                    self.token_owner_table_name, token_owners, commit=False)
+                if self.provenance_index is not None:
+                    self.provenance_index.rebuild(
+                        contract_address, commit=False)
+                self.sql_db_connector.commit()
+            except Exception:
+                self.sql_db_connector.rollback()
+                raise
+
+            logging.info(
+                f"Holder balances rebuilt: {contract_address} ({len(balance_deltas)} holders, {len(token_owners)} tokens)")
+
+    def get_holders(self, contract_address: str, limit: Union[int, None] = None) -> list:
+        # holders with a positive balance, largest first (top holders with limit)
+        return self.sql_db_connector.query_holders(self.holder_balance_table_name, contract_address, limit)
+
+    def get_balance(self, contract_address: str, holder_address: str) -> int:
+        return self.sql_db_connector.query_holder_balance(self.holder_balance_table_name, contract_address, holder_address)
+
+    def get_token_owner(self, contract_address: str, token_id: int) -> Union[str, None]:
+        return self.sql_db_connector.query_token_owner(self.token_owner_table_name, contract_address, token_id)
+
+    def get_owner_tokens(self, contract_address: str, owner_address: str) -> list:
+        return self.sql_db_connector.query_owner_tokens(self.token_owner_table_name, contract_address, owner_address)
@@ -0,0 +1,162 @@
+from connectors import SqlDatabaseConnector
+from typing import Union
+import pyarrow as pa
+import pyarrow.compute as pc
+import logging
+
+
+# transaction table fields used to build ownership intervals
+PROVENANCE_FIELDS = ["token_id", "block_number", "log_index", "to_address"]
+# decimal digits of the largest uint256 token id
+TOKEN_ID_DIGITS = 78
+
+
+def build_provenance_intervals(contract_address: str, token_ids: list, block_numbers: list, log_indexes: list, owner_addresses: list) -> list:
+    """
+    Build the ownership intervals of all transfers of a contract in one vectorized pass.
+    Transfers are sorted by (token_id, block_number, log_index), every interval ends at the block of the next transfer of the same token.
+    Token ids can be any uint256 (int or decimal string).
+    Return tuples of (contract_address, token_id, from_block, log_index, owner_address, to_block).
+    """
+    if len(token_ids) == 0:
+        return []
+
+    # token ids are uint256 (no arrow integer type), zero padded decimals sort like the numbers
+    transfers = pa.table({
+        "token_key": pa.array([str(int(token_id)).zfill(TOKEN_ID_DIGITS) for token_id in token_ids], pa.string()),
+        "row": pa.array(range(len(token_ids)), pa.int64()),
+        "block_number": pa.array(block_numbers, pa.int64()),
+        # rows of older versions have no log index
+        "log_index": pc.fill_null(pa.array(log_indexes, pa.int64()), 0),
+        "owner_address": pa.array(owner_addresses, pa.string())
+    }).sort_by([("token_key", "ascending"), ("block_number", "ascending"), ("log_index", "ascending")])
+
+    token_key = transfers["token_key"]
+    block_number = transfers["block_number"]
+
+    next_is_same_token = pc.equal(token_key.slice(
+        1), token_key.slice(0, len(token_key) - 1))
+    to_block = pc.if_else(next_is_same_token, block_number.slice(1),
+                          pa.scalar(None, pa.int64()))
+    # the last transfer of a token starts the open interval of its current owner
+    to_block = to_block.chunks + [pa.array([None], pa.int64())]
+    to_block = pa.chunked_array(to_block, pa.int64())
+
+    return list(zip(
+        [contract_address] * len(token_key),
+        [token_ids[row] for row in transfers["row"].to_pylist()],
+        block_number.to_pylist(),
+        transfers["log_index"].to_pylist(),
+        transfers["owner_address"].to_pylist(),
+        to_block.to_pylist()
+    ))
+
+
+class ProvenanceIndex:
+    """
+    Ownership intervals (owner, from_block, to_block) per ERC721 token.
+
+    Intervals of new transfers are added incrementally (add_transactions), out of order shards only update the to_block of
+    neighbouring intervals of the same token. rebuild recomputes the intervals of a contract in one pass over its transfers.
+    """
+
+    def __init__(self,
+                 sql_db_connector: SqlDatabaseConnector,
+                 transaction_table_name: str,
+                 token_provenance_table_name: str
+                 ) -> None:
+        self.sql_db_connector = sql_db_connector
+        self.transaction_table_name = transaction_table_name
+        self.token_provenance_table_name = token_provenance_table_name
+
+    def add_transactions(self, transactions: list, commit: bool = True):
+        """
+        Add intervals of new transfer records (ERC721 transfers only).
+        """
+        intervals = []
+        token_keys = set()
+        for transaction in transactions:
+            if transaction.token_id is None or transaction.value is not None:
+                continue
+
+            log_index = transaction.log_index if transaction.log_index is not None else 0
+            intervals.append((transaction.contract_address, transaction.token_id,
+                             transaction.block_number, log_index, transaction.to_address, None))
+            token_keys.add(
+                (transaction.contract_address, transaction.token_id))
+
+        self.sql_db_connector.upsert_token_provenance(
+            self.token_provenance_table_name, intervals, commit=False)
+        self.sql_db_connector.update_token_provenance_to_blocks(
+            self.token_provenance_table_name, sorted(token_keys), commit=False)
+
+        if commit:
+            self.sql_db_connector.commit()
+
+    def revert_tokens(self, token_keys: list, from_block: int, commit: bool = True):
+        """
+        Remove intervals of the tokens (list of (contract_address, token_id)) from 'from_block' on (reorgs).
+        """
+        self.sql_db_connector.delete_token_provenance(
+            self.token_provenance_table_name, token_keys, from_block, commit=False)
+        self.sql_db_connector.update_token_provenance_to_blocks(
+            self.token_provenance_table_name, token_keys, commit=False)
+
+        if commit:
+            self.sql_db_connector.commit()
+
+    def rebuild(self, contract_address: str, commit: bool = True) -> int:
+        """
+        Recompute all intervals of the contract from the transaction table. Return the number of intervals.
+        """
+        token_ids = []
+        block_numbers = []
+        log_indexes = []
+        owner_addresses = []
+        for chunk in self.sql_db_connector.query_transaction_data_chunks(self.transaction_table_name, PROVENANCE_FIELDS, contract_address):
+            for token_id, block_number, log_index, to_address in chunk:
+                if token_id is not None:
+                    token_ids.append(token_id)
+                    block_numbers.append(block_number)
+                    log_indexes.append(log_index)
+                    owner_addresses.append(to_address)
+
+        intervals = build_provenance_intervals(
+            contract_address, token_ids, block_numbers, log_indexes, owner_addresses)
+
+        self.sql_db_connector.delete_contract_rows(
+            self.token_provenance_table_name, contract_address, commit=False)
+        self.sql_db_connector.upsert_token_provenance(
+            self.token_provenance_table_name, intervals, commit=False)
+
+        if commit:
+            self.sql_db_connector.commit()
+
+        logging.info(
+            f"Token provenance rebuilt: {contract_address} ({len(intervals)} intervals)")
+
+        return len(intervals)
+
+    def get_provenance(self, contract_address: str, token_id: int) -> list:
+        return self.sql_db_connector.query_token_provenance(self.token_provenance_table_name, contract_address, token_id)
+
+    def get_owner_at_block(self, contract_address: str, token_id: int, block_number: int) -> Union[str, None]:
+        return self.sql_db_connector.query_token_owner_at_block(self.token_provenance_table_name, contract_address, token_id, block_number)
+
+    def get_hold_durations(self, contract_address: str, token_id: int, head_block: Union[int, None] = None) -> list:
+        """
+        Return [{"owner_address", "from_block", "to_block", "hold_blocks"}] of the token.
+        The interval of the current owner ends at 'head_block' (hold_blocks is None without it).
+        """
+        intervals = self.get_provenance(contract_address, token_id)
+
+        for interval in intervals:
+            to_block = interval["to_block"] if interval["to_block"] is not None else head_block
+            interval["hold_blocks"] = to_block - \
+                interval["from_block"] if to_block is not None else None
+
+        return intervals
+
+    def get_owner_history(self, contract_address: str, owner_address: str) -> list:
+        # all tokens the address owned with their intervals
+        return self.sql_db_connector.query_owner_provenance(self.token_provenance_table_name, contract_address, owner_address)
@@ -0,0 +1,120 @@
+from connectors import SqlDatabaseConnector
+from collector.holder_balances import HolderBalances
+from typing import TYPE_CHECKING, Union
+import logging
+
+if TYPE_CHECKING:
+    # web3 is only imported by users of the execution client
+    from connectors import ExecutionClientConnector, ConsensusClientConnector
+
+
+class ReorgTracker:
+    """
+    Track the finalized block and roll back ingested blocks above it on reorgs.
+
+    Hashes of ingested blocks above the finalized block are stored in the unfinalized block table.
+    On a reorg every transaction from the first replaced block on is deleted, so only this range has to be ingested again.
+    """
+
+    def __init__(self,
+                 execution_client: "ExecutionClientConnector",
+                 consensus_client: "ConsensusClientConnector",
+                 sql_db_connector: SqlDatabaseConnector,
+                 transaction_table_name: str,
+                 unfinalized_block_table_name: str,
+                 holder_balances: Union[HolderBalances, None] = None
+                 ) -> None:
+        self.execution_client = execution_client
+        self.consensus_client = consensus_client
+        self.sql_db_connector = sql_db_connector
+        self.transaction_table_name = transaction_table_name
+        self.unfinalized_block_table_name = unfinalized_block_table_name
+        self.holder_balances = holder_balances
+
+        self.finalized_block = None
+
+    def update_finalized_block(self) -> int:
+        """
+        Update the finalized block (consensus client, execution client as fallback) and prune finalized block hashes.
+        """
+        try:
+            finalized_block = self.consensus_client.get_finalized_block_number()
+        except Exception as e:
+            logging.warning(
+                f"Finalized block not available from consensus client, using execution client: {e}")
+            finalized_block = self.execution_client.update_finality_watermark()
+
+        # the watermark never moves backwards
+        if self.finalized_block is None or finalized_block > self.finalized_block:
+            self.finalized_block = finalized_block
+
+            if self.execution_client.rpc_cache is not None:
+                self.execution_client.rpc_cache.set_finalized_block(
+                    finalized_block)
+
+            self.sql_db_connector.delete_data_by_block_range(
+                self.unfinalized_block_table_name, to_block=finalized_block)
+
+        return self.finalized_block
+
+    def is_finalized(self, block_number: int) -> bool:
+        return self.finalized_block is not None and block_number <= self.finalized_block
+
+    def record_blocks(self, block_hashes: dict):
+        """
+        Store hashes of ingested blocks ({block_number: block_hash}) above the finalized block.
+        """
+        block_hashes = {block_number: block_hash for block_number,
+                        block_hash in block_hashes.items() if not self.is_finalized(block_number)}
+
+        self.sql_db_connector.insert_unfinalized_blocks(
+            self.unfinalized_block_table_name, block_hashes)
+
+    def check_reorg(self) -> Union[int, None]:
+        """
+        Compare stored block hashes with the node (newest first) and roll back all blocks after the newest matching block.
+        Return the first rolled back block number or None if there was no reorg.
+        """
+        reorged = False
+
+        for block_number, block_hash in self.sql_db_connector.query_unfinalized_blocks(self.unfinalized_block_table_name):
+            # a matching hash implies a matching chain up to this block
+            if self.is_finalized(block_number) or self.execution_client.get_block(block_number)["hash"] == block_hash:
+                first_reorged_block = block_number + 1
+                break
+
+            reorged = True
+            first_reorged_block = block_number
+        else:
+            # no matching block left: everything after the finalized block is suspect
+            if reorged and self.finalized_block is not None:
+                first_reorged_block = self.finalized_block + 1
+
+        if not reorged:
+            return None
+
+        self.rollback(first_reorged_block)
+
+        return first_reorged_block
+
+    def rollback(self, from_block: int):
+        if self.is_finalized(from_block):
+            raise ValueError(
+                f"Finalized blocks can not be rolled back (from_block: {from_block}, finalized_block: {self.finalized_block})")
+
+        # one transaction: balances never miss transactions that are still stored (or count deleted ones)
+        try:
+            if self.holder_balances is not None:
+                self.holder_balances.revert_blocks(from_block, commit=False)
+
+            deleted_transactions = self.sql_db_connector.delete_data_by_block_range(
+                self.transaction_table_name, from_block=from_block, commit=False)
+            self.sql_db_connector.delete_data_by_block_range(
+                self.unfinalized_block_table_name, from_block=from_block, commit=False)
+            self.sql_db_connector.commit()
+        except Exception:
+            self.sql_db_connector.rollback()
+            raise
+
+        logging.warning(
+            f"Reorg detected: rolled back blocks from {from_block} ({deleted_transactions} transactions)")
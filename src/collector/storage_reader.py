@@ -0,0 +1,135 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Union
+import logging
+import time
+
+if TYPE_CHECKING:
+    from connectors import ExecutionClientConnector
+
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+# proxy slots (keccak of the slot name - 1, EIP-1967) and the UUPS slot (keccak of "PROXIABLE", EIP-1822)
+EIP1967_IMPLEMENTATION_SLOT = 0x360894a13ba1a3210667c828492db98dca3e2076cc3735a920a3ca505d382bbc
+EIP1967_ADMIN_SLOT = 0xb53127684a568b3173ae13b9f8a6016e243e63b6e8ee1178d6a717850b5d6103
+EIP1967_BEACON_SLOT = 0xa3f0ad74e5423aebfd80d3ef4346578335a9a72aeaee59ff6cb3582b35133d50
+EIP1822_PROXIABLE_SLOT = 0xc5f16f0fcc639fa48a6947836d9850f504798523bf8c9a3a87d5876cf622bcf7
+
+PROXY_SLOTS = {
+    "implementation": EIP1967_IMPLEMENTATION_SLOT,
+    "admin": EIP1967_ADMIN_SLOT,
+    "beacon": EIP1967_BEACON_SLOT,
+    "proxiable": EIP1822_PROXIABLE_SLOT
+}
+
+
+def _to_word(value: Union[int, str, bytes]) -> bytes:
+    # addresses, hex strings and ints as 32 byte big endian words
+    if isinstance(value, int):
+        return value.to_bytes(32, "big")
+    if isinstance(value, str):
+        value = bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return value.rjust(32, b"\0")
+
+
+def get_mapping_slot(key: Union[int, str, bytes], slot: int) -> int:
+    """
+    Return the storage slot of mapping[key] of a mapping at 'slot' (keccak(key . slot), value types as keys).
+    Nested mappings: get_mapping_slot(key2, get_mapping_slot(key1, slot)).
+    """
+    # imported here, the collector is used without web3 (seconds of startup time)
+    from eth_utils import keccak
+    return int.from_bytes(keccak(_to_word(key) + _to_word(slot)), "big")
+
+
+def get_array_slot(slot: int, index: int, item_slots: int = 1) -> int:
+    # storage slot of item 'index' of a dynamic array at 'slot' (items start at keccak(slot))
+    from eth_utils import keccak
+    return int.from_bytes(keccak(_to_word(slot)), "big") + index * item_slots
+
+
+def decode_uint(word: str, offset: int = 0, size: int = 32) -> int:
+    """
+    Decode 'size' bytes at byte 'offset' (from the right, like solidity packs variables) of a storage word.
+    """
+    value = int(word, 16)
+    return (value >> (offset * 8)) & ((1 << (size * 8)) - 1)
+
+
+def decode_address(word: str, offset: int = 0) -> Union[str, None]:
+    # None for empty slots (zero address)
+    address = f"0x{decode_uint(word, offset, 20):040x}"
+    if address == ZERO_ADDRESS:
+        return None
+
+    from eth_utils import to_checksum_address
+    return to_checksum_address(address)
+
+
+def decode_bool(word: str, offset: int = 0) -> bool:
+    return decode_uint(word, offset, 1) != 0
+
+
+class StorageReader:
+    """
+    Read storage slots of (address, slot, block_number) triples in json-rpc batches.
+
+    Batches of 'batch_size' eth_getStorageAt requests are sent by 'workers' concurrent threads.
+    Slots of finalized blocks are served from and stored in the rpc cache of the execution client (if it has one).
+    """
+
+    def __init__(self,
+                 execution_client: "ExecutionClientConnector",
+                 batch_size: int = 500,
+                 workers: int = 8
+                 ) -> None:
+        self.execution_client = execution_client
+        self.batch_size = batch_size
+        self.workers = workers
+
+    def read(self, storage_slots: list) -> list:
+        """
+        Return the storage words (32 byte hex strings) of [(address, slot, block_number)] in request order.
+        """
+        start_time = time.perf_counter()
+
+        batches = [storage_slots[batch_start:batch_start + self.batch_size]
+                   for batch_start in range(0, len(storage_slots), self.batch_size)]
+
+        words = []
+        with ThreadPoolExecutor(self.workers) as executor:
+            for batch_words in executor.map(self.execution_client.get_raw_storage, batches):
+                words.extend(batch_words)
+
+        logging.info(
+            f"Storage read: {len(storage_slots)} slots in {len(batches)} batches ({time.perf_counter() - start_time:.1f}s)")
+
+        return words
+
+    def read_mapping_values(self, address: str, slot: int, keys: list, block_number: int) -> dict:
+        """
+        Return {key: word} of mapping[key] of a mapping at 'slot' (decode the words with decode_uint / decode_address).
+        """
+        words = self.read([(address, get_mapping_slot(key, slot), block_number)
+                          for key in keys])
+
+        return dict(zip(keys, words))
+
+    def get_proxy_slots(self, addresses: list, block_number: int) -> dict:
+        """
+        Return {address: {"implementation", "admin", "beacon", "proxiable"}} of the EIP-1967 / EIP-1822 proxy slots.
+        Empty slots are None, contracts without any set slot are no such proxies.
+        """
+        slot_names = list(PROXY_SLOTS.keys())
+
+        words = self.read([(address, PROXY_SLOTS[slot_name], block_number)
+                          for address in addresses for slot_name in slot_names])
+
+        proxy_slots = {}
+        for address_index, address in enumerate(addresses):
+            address_words = words[address_index *
+                                  len(slot_names):(address_index + 1) * len(slot_names)]
+            proxy_slots[address] = {slot_name: decode_address(word)
+                                    for slot_name, word in zip(slot_names, address_words)}
+
+        return proxy_slots
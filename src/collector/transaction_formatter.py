@@ -0,0 +1,3 @@
+def get_block_hashes(transactions: list):
+    # block hashes of transfer records above the finalized block
+    return {transaction.block_number: transaction.block_hash for transaction in transactions if transaction.block_hash is not None}
@@ -0,0 +1,140 @@
+from collector.holder_balances import HolderBalances
+from connectors.metrics import metrics
+import logging
+import queue
+import threading
+import time
+
+
+_FLUSH = object()
+_STOP = object()
+
+
+class TransactionWriter:
+    """
+    Write-behind writer of transfer records, so fetching and inserting overlap.
+
+    Record chunks are put into a bounded queue and written by one background thread (with its own HolderBalances and
+    db connection). Chunks are grouped into one write until 'flush_rows' rows are collected or 'flush_interval' seconds passed.
+    put blocks while the queue is full (backpressure on the fetchers). Every chunk can carry a checkpoint, the checkpoint of
+    the last written chunk is returned by pop_checkpoint. A failed write is raised by the next put or flush, chunks queued
+    after it are dropped until flush.
+    """
+
+    def __init__(self,
+                 holder_balances: HolderBalances,
+                 max_queue_chunks: int = 8,
+                 flush_rows: int = 50000,
+                 flush_interval: float = 5
+                 ) -> None:
+        self.holder_balances = holder_balances
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+
+        self.queue = queue.Queue(max_queue_chunks)
+        self.lock = threading.Lock()
+        self.error = None
+        self.checkpoint = None
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def put(self, records: list, checkpoint=None):
+        """
+        Queue records for writing, blocks while the queue is full.
+        """
+        if self.error is not None:
+            raise self.error
+
+        start_time = time.perf_counter()
+        self.queue.put((records, checkpoint))
+        metrics.inc("writer_backpressure_seconds_total",
+                    time.perf_counter() - start_time)
+        metrics.set("queue_depth", self.queue.qsize(),
+                    queue="transaction_writer", status="pending")
+
+    def flush(self):
+        """
+        Wait until all queued records are written. Raise the error of a failed write.
+        """
+        self.queue.put(_FLUSH)
+        self.queue.join()
+
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    def pop_checkpoint(self):
+        # checkpoint of the last written chunk since the last call (None if nothing was written)
+        with self.lock:
+            checkpoint = self.checkpoint
+            self.checkpoint = None
+        return checkpoint
+
+    def close(self):
+        """
+        Write all queued records and stop the writer thread.
+        """
+        self.queue.put(_STOP)
+        self.thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+    def _write(self, records: list, checkpoint):
+        try:
+            if self.error is None and len(records) != 0:
+                self.holder_balances.insert_transactions(records)
+                if checkpoint is not None:
+                    with self.lock:
+                        self.checkpoint = checkpoint
+        except Exception as e:
+            logging.error(f"Transaction writer failed: {e}")
+            self.error = e
+
+    def _run(self):
+        records = []
+        checkpoint = None
+        chunk_count = 0
+        group_start_time = None
+
+        while True:
+            timeout = None
+            if chunk_count != 0:
+                timeout = max(0, self.flush_interval -
+                              (time.perf_counter() - group_start_time))
+
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                # flush interval of the group passed
+                item = None
+
+            if item is not None and item is not _FLUSH and item is not _STOP:
+                if chunk_count == 0:
+                    group_start_time = time.perf_counter()
+
+                chunk_records, chunk_checkpoint = item
+                records.extend(chunk_records)
+                if chunk_checkpoint is not None:
+                    checkpoint = chunk_checkpoint
+                chunk_count += 1
+
+                if len(records) < self.flush_rows:
+                    continue
+
+            self._write(records, checkpoint)
+            for _ in range(chunk_count):
+                self.queue.task_done()
+            records = []
+            checkpoint = None
+            chunk_count = 0
+
+            metrics.set("queue_depth", self.queue.qsize(),
+                        queue="transaction_writer", status="pending")
+
+            if item is _FLUSH or item is _STOP:
+                self.queue.task_done()
+                if item is _STOP:
+                    break
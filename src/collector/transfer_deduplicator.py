@@ -0,0 +1,105 @@
+from connectors.metrics import metrics
+import math
+
+
+class SeenSet:
+    """
+    Bounded probabilistic set of transfer keys ((transaction_hash, log_index), bloom filter with two generations).
+
+    Hashes are keccak outputs, so their bits are used as bloom filter indexes directly (no hashing), the log index is mixed in.
+    The last 'capacity' added keys are always found, false positives occur at about 'false_positive_rate'.
+    When the current generation is full it replaces the previous one, so memory stays bounded.
+    """
+
+    def __init__(self, capacity: int = 1000000, false_positive_rate: float = 0.001) -> None:
+        self.capacity = capacity
+        self.bit_count = max(64, math.ceil(-capacity *
+                             math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+
+        self.current = bytearray((self.bit_count + 7) // 8)
+        self.previous = bytearray((self.bit_count + 7) // 8)
+        self.current_count = 0
+
+    def _bit_indexes(self, transfer_key: tuple) -> list:
+        # double hashing on two 64 bit words of the hash (the first word is offset by the log index)
+        transaction_hash, log_index = transfer_key
+        value = int(transaction_hash[2:34], 16)
+        first_hash = (value >> 64) + log_index * 0x9e3779b97f4a7c15
+        second_hash = (value & 0xffffffffffffffff) | 1
+        return [(first_hash + index * second_hash) % self.bit_count for index in range(self.hash_count)]
+
+    def add(self, transfer_key: tuple):
+        if self.current_count >= self.capacity:
+            self.previous = self.current
+            self.current = bytearray(len(self.previous))
+            self.current_count = 0
+
+        for bit_index in self._bit_indexes(transfer_key):
+            self.current[bit_index >> 3] |= 1 << (bit_index & 7)
+        self.current_count += 1
+
+    def __contains__(self, transfer_key: tuple) -> bool:
+        bit_indexes = self._bit_indexes(transfer_key)
+        for generation in (self.current, self.previous):
+            if all(generation[bit_index >> 3] & (1 << (bit_index & 7)) for bit_index in bit_indexes):
+                return True
+        return False
+
+
+class TransferDeduplicator:
+    """
+    Decide which transfer records have to be checked against the transaction table before inserting.
+
+    Per contract, the highest committed block (watermark) marks the overlap window: records above it are new to this process.
+    Records at or below it (overlapping ranges, retried shards, repeated polls) are looked up in the seen-set of committed keys,
+    only hits are checked against the table (false positives are never dropped). All other records are inserted unchecked,
+    the insert verifies the inserted row count. Contracts whose unchecked rows were in the table already (rows of earlier runs,
+    other processes or other contracts of the same transaction) are checked until a checked batch of them has no duplicates.
+    """
+
+    def __init__(self, capacity: int = 1000000, false_positive_rate: float = 0.001) -> None:
+        self.seen_set = SeenSet(capacity, false_positive_rate)
+        self.watermarks = {}
+        # contracts with rows in the table which were not written by this process
+        self.checked_contracts = set()
+
+    def get_check_candidates(self, records: list) -> list:
+        """
+        Return the records which may already be in the table.
+        """
+        candidates = []
+        for record in records:
+            if record.contract_address in self.checked_contracts:
+                candidates.append(record)
+            elif record.block_number <= self.watermarks.get(record.contract_address, -1) and (record.transaction_hash, record.log_index) in self.seen_set:
+                candidates.append(record)
+
+        metrics.inc("dedup_checked_rows_total", len(candidates))
+        metrics.inc("dedup_unchecked_rows_total",
+                    len(records) - len(candidates))
+
+        return candidates
+
+    def add_checked(self, records: list, existing_transfer_keys: set):
+        # contracts without duplicates in a checked batch leave the checked mode
+        duplicate_contracts = {record.contract_address for record in records
+                               if (record.transaction_hash, record.log_index) in existing_transfer_keys}
+        self.checked_contracts -= {record.contract_address for record in records} - duplicate_contracts
+
+    def add_unchecked_duplicates(self, records: list):
+        # unchecked rows were in the table already, the batch is inserted again with all records checked
+        metrics.inc("dedup_fallback_batches_total")
+        self.checked_contracts |= {record.contract_address for record in records}
+
+    def add_committed(self, records: list):
+        for record in records:
+            self.seen_set.add((record.transaction_hash, record.log_index))
+            if record.block_number > self.watermarks.get(record.contract_address, -1):
+                self.watermarks[record.contract_address] = record.block_number
+
+    def revert(self, from_block: int):
+        # rows from 'from_block' on were deleted (their keys stay in the seen-set, hits are checked anyway)
+        for contract_address, watermark in self.watermarks.items():
+            if watermark >= from_block:
+                self.watermarks[contract_address] = from_block - 1
@@ -0,0 +1,168 @@
+from connectors import SqlDatabaseConnector
+from connectors.metrics import metrics
+from typing import Union
+import logging
+import os
+import socket
+import time
+import uuid
+
+
+# job status in the work queue
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+ERROR = "error"
+
+
+def split_block_range(from_block: int, to_block: int, shard_size: int) -> list:
+    # return [(shard_from_block, shard_to_block), ...] covering from_block to to_block
+    return [(shard_from_block, min(shard_from_block + shard_size - 1, to_block)) for shard_from_block in range(from_block, to_block + 1, shard_size)]
+
+
+class LeaseLostError(Exception):
+    """
+    Raised while collecting a job whose lease expired and was taken over by another worker.
+    """
+
+    def __init__(self, job: dict) -> None:
+        super().__init__(
+            f"Lease lost: job {job['job_id']} ({job['contract_address']})")
+        self.job = job
+
+
+class WorkQueue:
+    """
+    Database backed queue of contract block range shards.
+
+    Workers on any process or machine lease one job at a time. A lease expires after 'lease_duration' seconds,
+    after which the job can be leased by another worker (e.g. if the first worker crashed). Workers renew the lease while
+    collecting (renew_lease_if_due per batch). Expired jobs are leased again until 'max_attempts' attempts, then they are
+    marked as error. Inserting a shard twice is harmless because transactions are inserted with INSERT IGNORE.
+    """
+
+    def __init__(self,
+                 sql_db_connector: SqlDatabaseConnector,
+                 table_name: str,
+                 lease_duration: int = 900,
+                 max_attempts: int = 3,
+                 worker: Union[str, None] = None
+                 ) -> None:
+        self.sql_db_connector = sql_db_connector
+        self.table_name = table_name
+        self.lease_duration = lease_duration
+        self.max_attempts = max_attempts
+        self.worker = worker if worker is not None else f"{socket.gethostname()}:{os.getpid()}"
+
+    def create_jobs(self, contract_address: str, from_block: int, to_block: int, shard_size: int) -> int:
+        """
+        Split the block range of the contract into shards and add them to the queue.
+        """
+        jobs = [{
+            "contract_address": contract_address,
+            "from_block": shard_from_block,
+            "to_block": shard_to_block
+        } for shard_from_block, shard_to_block in split_block_range(from_block, to_block, shard_size)]
+
+        self.sql_db_connector.insert_collection_jobs(self.table_name, jobs)
+
+        return len(jobs)
+
+    def create_planned_jobs(self, jobs: list) -> int:
+        """
+        Add jobs of a collection plan (CollectionPlanner.plan) in plan order.
+        """
+        self.sql_db_connector.insert_collection_jobs(self.table_name, jobs)
+
+        return len(jobs)
+
+    @staticmethod
+    def get_job_contract_addresses(job: dict) -> list:
+        # batched jobs collect further contracts in one query
+        if job.get("batch_addresses"):
+            return [job["contract_address"]] + job["batch_addresses"].split(",")
+        return [job["contract_address"]]
+
+    def lease_job(self) -> Union[dict, None]:
+        """
+        Lease the next job, None if the queue is empty.
+        """
+        job = self.sql_db_connector.lease_collection_job(
+            self.table_name, uuid.uuid4().hex, self.worker, self.lease_duration, self.max_attempts)
+        if job is not None:
+            job["lease_renewed_at"] = time.monotonic()
+
+        return job
+
+    def renew_lease(self, job: dict) -> bool:
+        renewed = self.sql_db_connector.renew_collection_job_lease(
+            self.table_name, job["job_id"], job["lease_id"], self.lease_duration)
+        if renewed:
+            job["lease_renewed_at"] = time.monotonic()
+
+        return renewed
+
+    def renew_lease_if_due(self, job: dict):
+        """
+        Renew the lease once a third of the lease duration has passed since the last renewal (cheap to call per batch).
+        Raise LeaseLostError if the job was taken over by another worker.
+        """
+        if time.monotonic() - job["lease_renewed_at"] < self.lease_duration / 3:
+            return
+
+        if not self.renew_lease(job):
+            raise LeaseLostError(job)
+
+    def complete_job(self, job: dict) -> bool:
+        """
+        Mark job as done. Return False if the lease expired and the job was taken over by another worker.
+        """
+        completed = self.sql_db_connector.update_leased_collection_job(self.table_name, job["job_id"], job["lease_id"], {
+            "status": DONE,
+            "lease_expires_at": None,
+            "error": None
+        })
+
+        if not completed:
+            logging.warning(
+                f"Lease lost before job was completed: job {job['job_id']} ({job['contract_address']})")
+
+        return completed
+
+    def fail_job(self, job: dict, error: Exception) -> bool:
+        """
+        Return job to the queue or mark it as error after 'max_attempts' attempts.
+        """
+        status = ERROR if job["attempts"] >= self.max_attempts else PENDING
+
+        return self.sql_db_connector.update_leased_collection_job(self.table_name, job["job_id"], job["lease_id"], {
+            "status": status,
+            "lease_expires_at": None,
+            "error": f"{type(error).__name__}: {error}"[:1000]
+        })
+
+    def get_contract_status(self, contract_address: str) -> Union[tuple, None]:
+        """
+        Return (status, last block) of the contract once all its jobs are finished, None while jobs are open.
+        """
+        job_status = self.sql_db_connector.query_contract_collection_job_status(
+            self.table_name, contract_address)
+
+        if PENDING in job_status or LEASED in job_status or len(job_status) == 0:
+            return None
+
+        last_block = max(max_to_block for _, max_to_block in job_status.values())
+
+        if ERROR in job_status:
+            return ERROR, last_block
+        return DONE, last_block
+
+    def get_status_counts(self) -> dict:
+        status_counts = self.sql_db_connector.count_collection_job_status(
+            self.table_name)
+
+        for status, count in status_counts.items():
+            metrics.set("queue_depth", count,
+                        queue=self.table_name, status=status)
+
+        return status_counts
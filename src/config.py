@@ -27,4 +27,83 @@ SQL_DATABASE_USER = "root"
 SQL_DATABASE_PASSWORD = "admin"
 SQL_DATABASE_NAME = "ethereum_api"
 SQL_DATABASE_TABLE_CONTRACT = "contract"
+SQL_DATABASE_TABLE_ABI = "abi"
 SQL_DATABASE_TABLE_TRANSACTION = "transaction"
+SQL_DATABASE_TABLE_UNFINALIZED_BLOCK = "unfinalized_block"
+SQL_DATABASE_TABLE_CONTRACT_REGISTRY = "contract_registry"
+SQL_DATABASE_TABLE_COLLECTION_JOB = "collection_job"
+SQL_DATABASE_TABLE_HOLDER_BALANCE = "holder_balance"
+SQL_DATABASE_TABLE_TOKEN_OWNER = "token_owner"
+SQL_DATABASE_TABLE_TOKEN_PROVENANCE = "token_provenance"
+SQL_DATABASE_TABLE_BLOCK = "block"
+SQL_DATABASE_TABLE_BLOCK_TRANSACTION = "block_transaction"
+SQL_DATABASE_TABLE_RECEIPT = "receipt"
+SQL_TRANSACTION_PARTITION_BLOCKS = None  # blocks per range partition of the transaction table (e.g. 1000000), None for no partitioning
+
+# rpc retry
+RPC_MAX_RETRIES = 5
+RPC_RETRY_BASE_DELAY = 0.5  # seconds, doubled on every retry (with jitter)
+RPC_RETRY_MAX_DELAY = 30
+RPC_CIRCUIT_FAILURE_THRESHOLD = 10  # consecutive unanswered requests until an endpoint is blocked (above RPC_MAX_RETRIES)
+RPC_CIRCUIT_RESET_TIMEOUT = 30  # seconds until a blocked endpoint is tried again
+
+# rpc cache (finalized results only)
+RPC_CACHE_PATH = "cache/rpc_cache.sqlite"
+RPC_CACHE_MAX_SIZE = 2 * 1024 ** 3  # bytes
+
+# epoch cache (committees, finality checkpoints and fork data of finalized epochs)
+EPOCH_CACHE_MAX_ENTRIES = 8  # in memory, committees of mainnet epochs are tens of MB each
+EPOCH_CACHE_PATH = "cache/epoch_cache.sqlite"  # None to keep entries in memory only
+EPOCH_CACHE_MAX_SIZE = 2 * 1024 ** 3  # bytes
+EPOCH_CACHE_PREFETCH = True  # request the next epoch in the background
+
+# head following
+FOLLOW_POLL_INTERVAL = 4  # seconds between block_number polls
+
+# parquet export
+EXPORT_DIR = "export/transactions"
+EXPORT_BLOCK_BUCKET_SIZE = 100000  # blocks per partition
+
+# work queue (multi-process collection)
+QUEUE_SHARD_SIZE = 250000  # blocks per job
+QUEUE_LEASE_DURATION = 900  # seconds until a job of a crashed worker is returned to the queue
+QUEUE_MAX_ATTEMPTS = 3  # failed or expired attempts until a job is marked as error
+
+# collection planner
+PLANNER_SAMPLE_COUNT = 5  # eth_getLogs samples per contract
+PLANNER_SAMPLE_BLOCKS = 2000  # blocks per sample
+PLANNER_TARGET_JOB_LOGS = 200000  # transfers per job (shards of large contracts, batches of small ones)
+PLANNER_MAX_BATCH_CONTRACTS = 50  # contracts per batched job
+PLANNER_SECONDS_PER_LOG = 0.0002  # decoding and inserting per transfer
+PLANNER_WORKERS = 8  # workers assumed for the eta
+PLAN_REPORT_PATH = "collection_plan.json"
+
+# write-behind transaction writer
+WRITER_QUEUE_CHUNKS = 8  # eth_getLogs results queued before fetching blocks
+WRITER_FLUSH_ROWS = 50000  # rows per write
+WRITER_FLUSH_INTERVAL = 5  # seconds until queued rows are written anyway
+
+# transfer deduplication (existence checks only for records which may be in the table)
+DEDUP_SEEN_CAPACITY = 1000000  # committed transaction hashes per seen-set generation (2 MB each)
+DEDUP_FALSE_POSITIVE_RATE = 0.001  # seen-set hits of new hashes (checked against the table)
+
+# balance snapshots
+SNAPSHOT_METHOD = "multicall"  # "multicall" (Multicall3 aggregate3) or "batch" (json-rpc batches)
+SNAPSHOT_BATCH_SIZE = 500  # addresses per request
+SNAPSHOT_WORKERS = 8  # concurrent requests
+
+# storage reader (proxy slots, mapping values)
+STORAGE_BATCH_SIZE = 500  # eth_getStorageAt requests per json-rpc batch
+STORAGE_WORKERS = 8  # concurrent batch requests
+
+# metrics (prometheus text format)
+METRICS_PORT = None  # http endpoint (e.g. 9464, one port per worker process on a host), None to disable
+METRICS_DUMP_PATH = None  # periodic file dump, e.g. "metrics/collector.prom"
+METRICS_DUMP_INTERVAL = 15  # seconds
+
+# block ingestion (ingest_blocks.py)
+BLOCK_INGESTION_BATCH_SIZE = 10  # blocks per json-rpc batch
+BLOCK_INGESTION_WORKERS = 8  # concurrent batch requests
+
+# profiling (--profile)
+PROFILE_DIR = "profile"  # one subdirectory per run
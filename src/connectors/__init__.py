@@ -1,4 +1,33 @@
 # __init__.py
-from .execution_client_connector import ExecutionClientConnector, TokenStandard
-from .consensus_client_connector import ConsensusClientConnector
-from .sql_database_connector import SqlDatabaseConnector
+import importlib
+
+# light modules (standard library only)
+from .metrics import metrics, MetricsRegistry
+from .profiler import profiler, CollectionProfiler
+
+# heavy modules (web3, mysql, requests) are imported on first access of their names
+_LAZY_EXPORTS = {
+    "ExecutionClientConnector": ".execution_client_connector",
+    "TokenStandard": ".token_standards",
+    "ConsensusClientConnector": ".consensus_client_connector",
+    "SqlDatabaseConnector": ".sql_database_connector",
+    "RetryHandler": ".rpc_retry",
+    "RpcErrorClass": ".rpc_retry",
+    "CircuitOpenError": ".rpc_retry",
+    "RpcCache": ".rpc_cache",
+    "EpochCache": ".epoch_cache",
+    "LogBloomFilter": ".log_bloom"
+}
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(_LAZY_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_LAZY_EXPORTS.keys()))
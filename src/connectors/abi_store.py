@@ -0,0 +1,21 @@
+import hashlib
+import json
+
+
+# table of db_params.sql_tables.ABI_TABLE (config.SQL_DATABASE_TABLE_ABI)
+ABI_TABLE_NAME = "abi"
+
+
+def canonical_abi_json(contract_abi: list) -> str:
+    """
+    Return the abi as canonical json (sorted keys and entries, no whitespace).
+    Clones and contracts compiled from the same interface get the same string, independent of entry order.
+    """
+    entries = sorted([json.dumps(entry, sort_keys=True, separators=(",", ":"))
+                     for entry in contract_abi])
+    return f"[{','.join(entries)}]"
+
+
+def get_abi_hash(contract_abi: list) -> str:
+    # sha256 of the canonical json (0x prefixed, 66 characters)
+    return "0x" + hashlib.sha256(canonical_abi_json(contract_abi).encode("utf-8")).hexdigest()
@@ -0,0 +1,148 @@
+import requests
+
+
+# beacon node api endpoints (same as web3.beacon)
+GET_GENESIS = "/eth/v1/beacon/genesis"
+GET_HASH_ROOT = "/eth/v1/beacon/states/{0}/root"
+GET_FORK_DATA = "/eth/v1/beacon/states/{0}/fork"
+GET_FINALITY_CHECKPOINT = "/eth/v1/beacon/states/{0}/finality_checkpoints"
+GET_VALIDATORS = "/eth/v1/beacon/states/{0}/validators"
+GET_VALIDATOR = "/eth/v1/beacon/states/{0}/validators/{1}"
+GET_VALIDATOR_BALANCES = "/eth/v1/beacon/states/{0}/validator_balances"
+GET_EPOCH_COMMITTEES = "/eth/v1/beacon/states/{0}/committees"
+GET_BLOCK_HEADERS = "/eth/v1/beacon/headers"
+GET_BLOCK_HEADER = "/eth/v1/beacon/headers/{0}"
+GET_BLOCK = "/eth/v2/beacon/blocks/{0}"
+GET_BLOCK_ROOT = "/eth/v1/beacon/blocks/{0}/root"
+GET_BLOCK_ATTESTATIONS = "/eth/v1/beacon/blocks/{0}/attestations"
+GET_ATTESTATIONS = "/eth/v1/beacon/pool/attestations"
+GET_ATTESTER_SLASHINGS = "/eth/v1/beacon/pool/attester_slashings"
+GET_PROPOSER_SLASHINGS = "/eth/v1/beacon/pool/proposer_slashings"
+GET_VOLUNTARY_EXITS = "/eth/v1/beacon/pool/voluntary_exits"
+
+GET_FORK_SCHEDULE = "/eth/v1/config/fork_schedule"
+GET_SPEC = "/eth/v1/config/spec"
+GET_DEPOSIT_CONTRACT = "/eth/v1/config/deposit_contract"
+
+GET_BEACON_STATE = "/eth/v1/debug/beacon/states/{0}"
+GET_BEACON_HEADS = "/eth/v1/debug/beacon/heads"
+
+GET_NODE_IDENTITY = "/eth/v1/node/identity"
+GET_PEERS = "/eth/v1/node/peers"
+GET_PEER = "/eth/v1/node/peers/{0}"
+GET_HEALTH = "/eth/v1/node/health"
+GET_VERSION = "/eth/v1/node/version"
+GET_SYNCING = "/eth/v1/node/syncing"
+
+
+class BeaconApi:
+    """
+    Minimal beacon node http client with the interface of web3.beacon.Beacon.
+    Consensus only workers do not have to import web3 (seconds of startup time).
+    """
+
+    def __init__(self, base_url: str, timeout: float = 10) -> None:
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _get(self, endpoint_url: str) -> requests.Response:
+        response = self.session.get(
+            self.base_url + endpoint_url, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def _make_get_request(self, endpoint_url: str) -> dict:
+        return self._get(endpoint_url).json()
+
+    # Beacon endpoints
+
+    def get_genesis(self) -> dict:
+        return self._make_get_request(GET_GENESIS)
+
+    def get_hash_root(self, state_id: str = "head") -> dict:
+        return self._make_get_request(GET_HASH_ROOT.format(state_id))
+
+    def get_fork_data(self, state_id: str = "head") -> dict:
+        return self._make_get_request(GET_FORK_DATA.format(state_id))
+
+    def get_finality_checkpoint(self, state_id: str = "head") -> dict:
+        return self._make_get_request(GET_FINALITY_CHECKPOINT.format(state_id))
+
+    def get_validators(self, state_id: str = "head") -> dict:
+        return self._make_get_request(GET_VALIDATORS.format(state_id))
+
+    def get_validator(self, validator_id: str, state_id: str = "head") -> dict:
+        return self._make_get_request(GET_VALIDATOR.format(state_id, validator_id))
+
+    def get_validator_balances(self, state_id: str = "head") -> dict:
+        return self._make_get_request(GET_VALIDATOR_BALANCES.format(state_id))
+
+    def get_epoch_committees(self, state_id: str = "head") -> dict:
+        return self._make_get_request(GET_EPOCH_COMMITTEES.format(state_id))
+
+    def get_block_headers(self) -> dict:
+        return self._make_get_request(GET_BLOCK_HEADERS)
+
+    def get_block_header(self, block_id: str) -> dict:
+        return self._make_get_request(GET_BLOCK_HEADER.format(block_id))
+
+    def get_block(self, block_id: str) -> dict:
+        return self._make_get_request(GET_BLOCK.format(block_id))
+
+    def get_block_root(self, block_id: str) -> dict:
+        return self._make_get_request(GET_BLOCK_ROOT.format(block_id))
+
+    def get_block_attestations(self, block_id: str) -> dict:
+        return self._make_get_request(GET_BLOCK_ATTESTATIONS.format(block_id))
+
+    def get_attestations(self) -> dict:
+        return self._make_get_request(GET_ATTESTATIONS)
+
+    def get_attester_slashings(self) -> dict:
+        return self._make_get_request(GET_ATTESTER_SLASHINGS)
+
+    def get_proposer_slashings(self) -> dict:
+        return self._make_get_request(GET_PROPOSER_SLASHINGS)
+
+    def get_voluntary_exits(self) -> dict:
+        return self._make_get_request(GET_VOLUNTARY_EXITS)
+
+    # Config endpoints
+
+    def get_fork_schedule(self) -> dict:
+        return self._make_get_request(GET_FORK_SCHEDULE)
+
+    def get_spec(self) -> dict:
+        return self._make_get_request(GET_SPEC)
+
+    def get_deposit_contract(self) -> dict:
+        return self._make_get_request(GET_DEPOSIT_CONTRACT)
+
+    # Debug endpoints
+
+    def get_beacon_state(self, state_id: str = "head") -> dict:
+        return self._make_get_request(GET_BEACON_STATE.format(state_id))
+
+    def get_beacon_heads(self) -> dict:
+        return self._make_get_request(GET_BEACON_HEADS)
+
+    # Node endpoints
+
+    def get_node_identity(self) -> dict:
+        return self._make_get_request(GET_NODE_IDENTITY)
+
+    def get_peers(self) -> dict:
+        return self._make_get_request(GET_PEERS)
+
+    def get_peer(self, peer_id: str) -> dict:
+        return self._make_get_request(GET_PEER.format(peer_id))
+
+    def get_health(self) -> int:
+        return self._get(GET_HEALTH).status_code
+
+    def get_version(self) -> dict:
+        return self._make_get_request(GET_VERSION)
+
+    def get_syncing(self) -> dict:
+        return self._make_get_request(GET_SYNCING)
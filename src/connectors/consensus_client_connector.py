@@ -1,163 +1,304 @@
-from web3 import Web3
-from web3.beacon.main import Beacon
-import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+from connectors.beacon_api import BeaconApi
+from connectors.epoch_cache import EpochCache
+from connectors.rpc_retry import RetryHandler
+from connectors.metrics import metrics
+import logging
+import threading
+import time
+
+
+SLOTS_PER_EPOCH = 32
 
 
 class ConsensusClientConnector:
 
-    def __init__(self, consensus_client_ip: str, consensus_client_port: int) -> None:
+    def __init__(self,
+                 consensus_client_ip: str,
+                 consensus_client_port: int,
+                 retry_handler: Union[RetryHandler, None] = None,
+                 epoch_cache: Union[EpochCache, None] = None,
+                 prefetch: bool = True,
+                 finality_refresh_interval: float = 60
+                 ) -> None:
         self.client_ip = consensus_client_ip
         self.client_port = consensus_client_port
+        self.client_url = f"http://{self.client_ip}:{self.client_port}"
+        # set retry handler (shared between connectors if passed in)
+        self.retry_handler = retry_handler if retry_handler is not None else RetryHandler()
         # init consensus client
-        self.consensus_client = Beacon(
-            f"http://{self.client_ip}:{self.client_port}")
+        self.consensus_client = BeaconApi(self.client_url)
+
+        # committees, finality checkpoints and fork data of finalized epochs (requested by slot)
+        self.epoch_cache = epoch_cache
+        self.prefetch = prefetch
+        self.finality_refresh_interval = finality_refresh_interval
+        self.finality_refresh_time = None
+        # background requests of the next epoch {(method, epoch): future}
+        self.prefetch_lock = threading.Lock()
+        self.prefetch_futures = {}
+        self.prefetch_executor = None
+
+    def _call(self, func, *args):
+        with metrics.time("rpc_request_duration_seconds", client="consensus", method=func.__name__):
+            return self.retry_handler.call(self.client_url, func, *args)
+
+    def get_cache_stats(self) -> Union[dict, None]:
+        return self.epoch_cache.stats() if self.epoch_cache is not None else None
+
+    # Epoch cache
+
+    @staticmethod
+    def get_state_epoch(state_id) -> Union[int, None]:
+        """
+        Return the epoch of a slot state id (None for head, finalized, justified and state roots).
+        """
+        if state_id == "genesis":
+            return 0
+        if isinstance(state_id, int) or isinstance(state_id, str) and state_id.isdigit():
+            return int(state_id) // SLOTS_PER_EPOCH
+        return None
+
+    def _refresh_finalized_epoch(self, epoch: int):
+        # the finalized epoch is looked up again (at most every finality_refresh_interval) if a newer epoch is requested
+        if self.epoch_cache.is_cacheable(epoch):
+            return
+        if self.finality_refresh_time is not None and time.monotonic() - self.finality_refresh_time < self.finality_refresh_interval:
+            return
+
+        self.finality_refresh_time = time.monotonic()
+        self.get_finality_checkpoint("head")
+
+    def _fetch_epoch_data(self, func, epoch: int):
+        result = self._call(func, str(epoch * SLOTS_PER_EPOCH))
+        self.epoch_cache.put(func.__name__, epoch, result)
+        return result
+
+    def _prefetch_epoch_data(self, func, epoch: int):
+        key = (func.__name__, epoch)
+
+        with self.prefetch_lock:
+            if key in self.prefetch_futures or not self.epoch_cache.is_cacheable(epoch) or self.epoch_cache.contains(*key):
+                return
+            if self.prefetch_executor is None:
+                self.prefetch_executor = ThreadPoolExecutor(
+                    1, thread_name_prefix="epoch_prefetch")
+            future = self.prefetch_executor.submit(
+                self._fetch_epoch_data, func, epoch)
+            self.prefetch_futures[key] = future
+
+        def remove_future(future):
+            if future.exception() is not None:
+                logging.warning(
+                    f"Epoch prefetch failed: {func.__name__} epoch {epoch}, error: {future.exception()}")
+            with self.prefetch_lock:
+                self.prefetch_futures.pop(key, None)
+
+        future.add_done_callback(remove_future)
+
+    def _get_epoch_data(self, func, state_id):
+        """
+        Return the result for a state from the epoch cache (slot states of finalized epochs) or the beacon node.
+        The state of the first slot of an epoch is requested (same result for every slot of the epoch)
+        and the next epoch is prefetched in the background.
+        """
+        epoch = self.get_state_epoch(state_id)
+        if self.epoch_cache is None or epoch is None:
+            return self._call(func, state_id)
+
+        self._refresh_finalized_epoch(epoch)
+
+        with self.prefetch_lock:
+            future = self.prefetch_futures.get((func.__name__, epoch))
+        if future is not None:
+            # wait for the running prefetch instead of requesting the epoch twice
+            try:
+                future.result()
+            except Exception:
+                pass
+
+        result = self.epoch_cache.get(func.__name__, epoch)
+        if result is None:
+            metrics.inc("epoch_cache_misses_total", method=func.__name__)
+            result = self._fetch_epoch_data(func, epoch)
+        else:
+            metrics.inc("epoch_cache_hits_total", method=func.__name__)
+
+        if self.prefetch:
+            self._prefetch_epoch_data(func, epoch + 1)
+
+        return result
+
+    def get_retry_stats(self):
+        return self.retry_handler.stats()
 
     # Beacon methods
 
     def get_genesis(self):
-        response = self.consensus_client.get_genesis()
+        response = self._call(self.consensus_client.get_genesis)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_hash_root(self, state_id="head"):
-        response = self.consensus_client.get_hash_root(state_id)
+        response = self._call(self.consensus_client.get_hash_root, state_id)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_fork_data(self, state_id="head"):
-        response = self.consensus_client.get_fork_data(state_id)
+        response = self._get_epoch_data(
+            self.consensus_client.get_fork_data, state_id)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_finality_checkpoint(self, state_id="head"):
-        response = self.consensus_client.get_finality_checkpoint(state_id)
+        response = self._get_epoch_data(
+            self.consensus_client.get_finality_checkpoint, state_id)
+
+        if self.epoch_cache is not None:
+            self.epoch_cache.set_finalized_epoch(
+                int(response["data"]["finalized"]["epoch"]))
+
+        return response
+
+    def get_finalized_block_number(self, state_id="head"):
+        """
+        Return the execution block number of the finalized checkpoint.
+        """
+        finality_checkpoint = self.get_finality_checkpoint(state_id)
+
+        block = self.get_block(finality_checkpoint["data"]["finalized"]["root"])
 
-        return json.loads(Web3.to_json(response))
+        return int(block["data"]["message"]["body"]["execution_payload"]["block_number"])
 
     def get_validators(self, state_id="head"):
-        response = self.consensus_client.get_validators(state_id)
+        response = self._call(self.consensus_client.get_validators, state_id)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_validator(self, validator_id, state_id="head"):
-        response = self.consensus_client.get_validator(validator_id, state_id)
+        response = self._call(
+            self.consensus_client.get_validator, validator_id, state_id)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_validator_balances(self, state_id="head"):
-        response = self.consensus_client.get_validator_balances(state_id)
+        response = self._call(
+            self.consensus_client.get_validator_balances, state_id)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_epoch_committees(self, state_id="head"):
-        response = self.consensus_client.get_epoch_committees(state_id)
+        response = self._get_epoch_data(
+            self.consensus_client.get_epoch_committees, state_id)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_block_headers(self):
-        response = self.consensus_client.get_block_headers()
+        response = self._call(self.consensus_client.get_block_headers)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_block_header(self, block_id):
-        response = self.consensus_client.get_block_header(block_id)
+        response = self._call(self.consensus_client.get_block_header, block_id)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_block(self, block_id):
-        response = self.consensus_client.get_block(block_id)
+        response = self._call(self.consensus_client.get_block, block_id)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_block_root(self, block_id):
-        response = self.consensus_client.get_block_root(block_id)
+        response = self._call(self.consensus_client.get_block_root, block_id)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_block_attestations(self, block_id):
-        response = self.consensus_client.get_block_attestations(block_id)
+        response = self._call(
+            self.consensus_client.get_block_attestations, block_id)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_attestations(self):
-        response = self.consensus_client.get_attestations()
+        response = self._call(self.consensus_client.get_attestations)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_attester_slashings(self):
-        response = self.consensus_client.get_attester_slashings()
+        response = self._call(self.consensus_client.get_attester_slashings)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_proposer_slashings(self):
-        response = self.consensus_client.get_proposer_slashings()
+        response = self._call(self.consensus_client.get_proposer_slashings)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_voluntary_exits(self):
-        response = self.consensus_client.get_voluntary_exits()
+        response = self._call(self.consensus_client.get_voluntary_exits)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     # Config methods
 
     def get_fork_schedule(self):
-        response = self.consensus_client.get_fork_schedule()
+        response = self._call(self.consensus_client.get_fork_schedule)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_spec(self):
-        response = self.consensus_client.get_spec()
+        response = self._call(self.consensus_client.get_spec)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_deposit_contract(self):
-        response = self.consensus_client.get_deposit_contract()
+        response = self._call(self.consensus_client.get_deposit_contract)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     # Debug methods
 
     # not working with web3 version 5.31.3
     def get_beacon_state(self, state_id="head"):
-        response = self.consensus_client.get_beacon_state(state_id)
+        response = self._call(self.consensus_client.get_beacon_state, state_id)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     # not working with web3 version 5.31.3
     def get_beacon_heads(self):
-        response = self.consensus_client.get_beacon_heads()
+        response = self._call(self.consensus_client.get_beacon_heads)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     # Node methods
 
     def get_node_identity(self):
-        response = self.consensus_client.get_node_identity()
+        response = self._call(self.consensus_client.get_node_identity)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_peers(self):
-        response = self.consensus_client.get_peers()
+        response = self._call(self.consensus_client.get_peers)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_peer(self, peer_id):
-        response = self.consensus_client.get_peer(peer_id)
+        response = self._call(self.consensus_client.get_peer, peer_id)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_health(self):
-        response = self.consensus_client.get_health()
+        response = self._call(self.consensus_client.get_health)
 
         return {"health": response}
 
     def get_version(self):
-        response = self.consensus_client.get_version()
+        response = self._call(self.consensus_client.get_version)
 
-        return json.loads(Web3.to_json(response))
+        return response
 
     def get_syncing(self):
-        response = self.consensus_client.get_syncing()
+        response = self._call(self.consensus_client.get_syncing)
 
-        return json.loads(Web3.to_json(response))
+        return response
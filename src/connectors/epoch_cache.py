@@ -0,0 +1,175 @@
+from collections import OrderedDict
+from typing import Union
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+class EpochCache:
+    """
+    Cache of beacon api results that do not change within an epoch (committees, finality checkpoints, fork data).
+
+    Entries are keyed by method and epoch and only stored for epochs at or below the finalized epoch, so they never change.
+    The 'max_entries' most recently used entries are kept in memory (committees of mainnet epochs are tens of MB each).
+    If 'path' is set, entries are also persisted in a sqlite file (least recently used evicted above max_size bytes).
+    """
+
+    def __init__(self, max_entries: int = 8, path: Union[str, None] = None, max_size: int = 2 * 1024 ** 3) -> None:
+        self.max_entries = max_entries
+        self.path = path
+        self.max_size = max_size
+        self.finalized_epoch = None
+
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+        self.connection = None
+        self.size = 0
+        if path is not None:
+            if os.path.dirname(path) != "":
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS epoch_cache ("
+                "method TEXT NOT NULL,"
+                "epoch INTEGER NOT NULL,"
+                "result TEXT NOT NULL,"
+                "size INTEGER NOT NULL,"
+                "accessed REAL NOT NULL,"
+                "PRIMARY KEY (method, epoch)"
+                ")")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS epoch_cache_accessed ON epoch_cache (accessed)")
+            self.connection.commit()
+
+            self.size = self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM epoch_cache").fetchone()[0]
+
+            logging.info(f"Epoch cache opened: {path} ({self.size} bytes)")
+
+    def __del__(self):
+        if getattr(self, "connection", None) is not None:
+            self.connection.close()
+
+    def set_finalized_epoch(self, epoch: int):
+        # the watermark never moves backwards
+        if self.finalized_epoch is None or epoch > self.finalized_epoch:
+            self.finalized_epoch = epoch
+
+    def is_cacheable(self, epoch: int) -> bool:
+        return self.finalized_epoch is not None and epoch <= self.finalized_epoch
+
+    def contains(self, method: str, epoch: int) -> bool:
+        with self.lock:
+            if (method, epoch) in self.entries:
+                return True
+            if self.connection is None:
+                return False
+            return self.connection.execute(
+                "SELECT 1 FROM epoch_cache WHERE method = ? AND epoch = ?", (method, epoch)).fetchone() is not None
+
+    def get(self, method: str, epoch: int):
+        if not self.is_cacheable(epoch):
+            return None
+
+        key = (method, epoch)
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+            row = None
+            if self.connection is not None:
+                row = self.connection.execute(
+                    "SELECT result FROM epoch_cache WHERE method = ? AND epoch = ?", key).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.connection.execute(
+                "UPDATE epoch_cache SET accessed = ? WHERE method = ? AND epoch = ?", (time.time(), method, epoch))
+            self.connection.commit()
+
+            result = json.loads(row[0])
+            self._put_entry(key, result)
+
+        return result
+
+    def put(self, method: str, epoch: int, result) -> bool:
+        if result is None or not self.is_cacheable(epoch):
+            return False
+
+        key = (method, epoch)
+
+        with self.lock:
+            self._put_entry(key, result)
+
+            if self.connection is not None:
+                value = json.dumps(result)
+                size = len(method) + len(value)
+
+                old_row = self.connection.execute(
+                    "SELECT size FROM epoch_cache WHERE method = ? AND epoch = ?", key).fetchone()
+
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO epoch_cache (method, epoch, result, size, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (method, epoch, value, size, time.time()))
+                self.size += size - (old_row[0] if old_row is not None else 0)
+
+                if self.size > self.max_size:
+                    self._evict()
+
+                self.connection.commit()
+
+        return True
+
+    def _put_entry(self, key: tuple, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _evict(self):
+        # evict least recently used entries of the file down to 90% of max size
+        target_size = int(self.max_size * 0.9)
+
+        while self.size > target_size:
+            rows = self.connection.execute(
+                "SELECT method, epoch, size FROM epoch_cache ORDER BY accessed LIMIT 100").fetchall()
+            if len(rows) == 0:
+                self.size = 0
+                break
+
+            evicted_keys = []
+            for method, epoch, size in rows:
+                evicted_keys.append((method, epoch))
+                self.size -= size
+                if self.size <= target_size:
+                    break
+
+            self.connection.executemany(
+                "DELETE FROM epoch_cache WHERE method = ? AND epoch = ?", evicted_keys)
+
+        logging.info(f"Epoch cache evicted to {self.size} bytes")
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "size": self.size,
+            "max_size": self.max_size,
+            "finalized_epoch": self.finalized_epoch,
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -1,25 +1,132 @@
-from web3 import Web3
+from web3 import Web3, HTTPProvider
+from web3._utils.request import make_post_request
 from web3._utils.empty import Empty
-from web3.exceptions import BlockNotFound, TransactionNotFound, NoABIFound, ABIFunctionNotFound, ABIEventFunctionNotFound
+from web3.exceptions import BlockNotFound, TransactionNotFound, NoABIFound, ABIFunctionNotFound, ABIEventFunctionNotFound, MismatchedABI
+from eth_abi.exceptions import DecodingError
 import json
+import logging
 import requests
-from enum import Enum
-from os import listdir
-from typing import Union
-from connectors.sql_database_connector import SqlDatabaseConnector
+from typing import TYPE_CHECKING, Union
+from connectors.abi_store import get_abi_hash
+from connectors.log_bloom import LogBloomFilter
+from connectors.transfer_records import build_transfer_layout, decode_transfer_log
+from connectors.token_standards import TokenStandard, get_token_standards, get_token_standard_function_names
+from connectors.rpc_retry import RetryHandler, CircuitOpenError, RpcErrorClass, RpcResponseError, classify_rpc_error, suggested_block_range
+from connectors.rpc_cache import RpcCache
+from connectors.metrics import metrics
+from connectors.profiler import profiler
+import time
+
+if TYPE_CHECKING:
+    # mysql is only imported by users of the sql database connector
+    from connectors.sql_database_connector import SqlDatabaseConnector
 
 
 timeout = 60
 
-# init token standards
-TokenStandard = Enum("TokenStandard", [(token_standard.replace(
-    ".json", ""), token_standard.replace(
-    ".json", "")) for token_standard in listdir(f"src/token_standard") if token_standard.endswith(".json")])
+# keccak of Transfer(address,address,uint256), same signature for ERC20 and ERC721
+TRANSFER_EVENT_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
 
-token_standards = {}
-for token_standard in TokenStandard:
-    with open(f"src/token_standard/{token_standard.name}.json", "r") as f:
-        token_standards[token_standard.name] = json.load(f)
+
+class RetryingHTTPProvider(HTTPProvider):
+    """
+    HTTPProvider which sends every request through a RetryHandler.
+    Retryable json-rpc errors are retried, all other error responses are passed on to web3 as usual.
+    Results of finalized blocks are served from and stored in the rpc cache if one is set.
+    """
+    # retries are handled by the retry handler
+    _middlewares = ()
+
+    def __init__(self, endpoint_uri: str, retry_handler: RetryHandler, request_kwargs: dict = None, rpc_cache: Union[RpcCache, None] = None) -> None:
+        super().__init__(endpoint_uri, request_kwargs=request_kwargs)
+        self.retry_handler = retry_handler
+        self.rpc_cache = rpc_cache
+
+    def make_request(self, method, params):
+        if self.rpc_cache is not None:
+            result = self.rpc_cache.get(method, params)
+            if result is not None:
+                metrics.inc("rpc_cache_hits_total", method=method)
+                return {"jsonrpc": "2.0", "id": 0, "result": result}
+
+        try:
+            with metrics.time("rpc_request_duration_seconds", client="execution", method=method):
+                if method == "eth_getLogs":
+                    with profiler.stage("log_fetch"):
+                        response = self.retry_handler.call(
+                            str(self.endpoint_uri), self._make_checked_request, method, params)
+                else:
+                    response = self.retry_handler.call(
+                        str(self.endpoint_uri), self._make_checked_request, method, params)
+        except RpcResponseError as e:
+            return e.response
+
+        if self.rpc_cache is not None and "result" in response:
+            self.rpc_cache.put(method, params, response["result"])
+
+        return response
+
+    def _make_checked_request(self, method, params):
+        response = super().make_request(method, params)
+
+        if "error" in response and isinstance(response["error"], dict):
+            if classify_rpc_error(response["error"]) is RpcErrorClass.RETRYABLE:
+                raise RpcResponseError(response)
+
+        return response
+
+    def make_batch_request(self, batch: list) -> list:
+        """
+        Send [(method, params)] as one json-rpc batch and return the raw responses in request order.
+        Error responses of single requests are returned, the caller decides how to handle them.
+        Requests with a result in the rpc cache are not sent.
+        """
+        responses = [None] * len(batch)
+        if self.rpc_cache is not None:
+            for request_id, result in enumerate(self.rpc_cache.get_many(batch)):
+                if result is not None:
+                    metrics.inc("rpc_cache_hits_total",
+                                method=batch[request_id][0])
+                    responses[request_id] = {
+                        "jsonrpc": "2.0", "id": request_id, "result": result}
+
+        missing_request_ids = [request_id for request_id,
+                               response in enumerate(responses) if response is None]
+        if len(missing_request_ids) == 0:
+            return responses
+
+        with metrics.time("rpc_request_duration_seconds", client="execution", method="batch"):
+            missing_responses = self.retry_handler.call(
+                str(self.endpoint_uri), self._make_checked_batch_request, [batch[request_id] for request_id in missing_request_ids])
+
+        for request_id, response in zip(missing_request_ids, missing_responses):
+            responses[request_id] = response
+
+        if self.rpc_cache is not None:
+            self.rpc_cache.put_many([batch[request_id] for request_id in missing_request_ids],
+                                    [response.get("result") for response in missing_responses])
+
+        return responses
+
+    def _make_checked_batch_request(self, batch: list) -> list:
+        request_data = json.dumps([{"jsonrpc": "2.0", "method": method, "params": params, "id": request_id}
+                                  for request_id, (method, params) in enumerate(batch)]).encode("utf-8")
+        responses = json.loads(make_post_request(
+            self.endpoint_uri, request_data, **self.get_request_kwargs()))
+
+        # the whole batch was rejected (e.g. rate limit or batch size)
+        if isinstance(responses, dict):
+            if classify_rpc_error(responses.get("error", {})) is RpcErrorClass.RETRYABLE:
+                raise RpcResponseError(responses)
+            raise ValueError(responses.get("error", responses))
+
+        responses = sorted(responses, key=lambda response: response["id"])
+        for response in responses:
+            if "error" in response and isinstance(response["error"], dict):
+                if classify_rpc_error(response["error"]) is RpcErrorClass.RETRYABLE:
+                    raise RpcResponseError(response)
+
+        return responses
 
 
 class ExecutionClientConnector:
@@ -28,21 +135,48 @@ class ExecutionClientConnector:
                  execution_client_url,
                  etherscan_ip: str,
                  etherscan_api_key: str,
-                 sql_db_connector: SqlDatabaseConnector,
-                 contract_table_name: str
+                 sql_db_connector: "SqlDatabaseConnector",
+                 contract_table_name: str,
+                 retry_handler: Union[RetryHandler, None] = None,
+                 rpc_cache: Union[RpcCache, None] = None,
+                 abi_table_name: str = "abi"
                  ) -> None:
         # execution client params
         self.execution_client_url = execution_client_url
-        self.token_standards = token_standards
+        self.token_standards = get_token_standards()
         # set etherscan api params
         self.etherscan_ip = etherscan_ip
         self.etherscan_api_key = etherscan_api_key
         # set sql db connector
         self.sql_db_connector = sql_db_connector
         self.contract_table_name = contract_table_name
+        self.abi_table_name = abi_table_name
+        # set retry handler (shared between connectors if passed in)
+        self.retry_handler = retry_handler if retry_handler is not None else RetryHandler()
+        # set persistent cache for finalized results (optional)
+        self.rpc_cache = rpc_cache
+        # abi hash per address and contract factory per abi hash (for decoding, shared by contracts with the same abi)
+        self.contract_abi_hashes = {}
+        self.decoders = {}
+        self.transfer_layouts = {}
         # init execution client
-        self.execution_client = Web3(Web3.HTTPProvider(
-            self.execution_client_url, request_kwargs={'timeout': timeout}))
+        self.execution_client = Web3(RetryingHTTPProvider(
+            self.execution_client_url, self.retry_handler, request_kwargs={'timeout': timeout}, rpc_cache=self.rpc_cache))
+
+    def get_retry_stats(self):
+        return self.retry_handler.stats()
+
+    def update_finality_watermark(self):
+        """
+        Set the rpc cache watermark to the latest finalized block and return its number.
+        """
+        finalized_block = self.execution_client.eth.get_block("finalized")[
+            "number"]
+
+        if self.rpc_cache is not None:
+            self.rpc_cache.set_finalized_block(finalized_block)
+
+        return finalized_block
 
     # Gossip methods
 
@@ -196,6 +330,85 @@ class ExecutionClientConnector:
 
         return json.loads(Web3.to_json(response))
 
+    def make_batch_request(self, batch: list, allow_errors: bool = False) -> list:
+        """
+        Send [(method, params)] as one json-rpc batch and return the raw (hex encoded) results in request order.
+        Raise ValueError with the error dict of the first failed request (results of failed requests are None if allow_errors).
+        """
+        responses = self.execution_client.provider.make_batch_request(batch)
+
+        for response in responses:
+            if "error" in response and not allow_errors:
+                raise ValueError(response["error"])
+
+        return [response.get("result") for response in responses]
+
+    def get_raw_blocks(self, block_numbers: list, full_transactions: bool = True) -> list:
+        # raw blocks (hex encoded fields, no web3 formatting) with one batch request
+        return self.make_batch_request([("eth_getBlockByNumber", [hex(block_number), full_transactions]) for block_number in block_numbers])
+
+    def get_raw_block_receipts(self, block_numbers: list) -> list:
+        # raw receipts of all transactions per block with one batch request (eth_getBlockReceipts)
+        return self.make_batch_request([("eth_getBlockReceipts", [hex(block_number)]) for block_number in block_numbers])
+
+    def get_raw_transaction_receipts(self, transaction_hashes: list) -> list:
+        return self.make_batch_request([("eth_getTransactionReceipt", [transaction_hash]) for transaction_hash in transaction_hashes])
+
+    def get_raw_storage(self, storage_slots: list) -> list:
+        # eth_getStorageAt of [(address, slot, block_number)] with one batch request (32 byte hex words)
+        return self.make_batch_request([("eth_getStorageAt", [address, hex(slot) if isinstance(slot, int) else slot, hex(block_number)])
+                                        for address, slot, block_number in storage_slots])
+
+    def get_raw_balances(self, addresses: list, block_number: int) -> list:
+        # eth_getBalance of all addresses at one block with one batch request
+        return self.make_batch_request([("eth_getBalance", [address, hex(block_number)]) for address in addresses])
+
+    def get_raw_calls(self, calls: list, block_number: int, allow_errors: bool = False) -> list:
+        # eth_call of [(to, data)] at one block with one batch request (reverted calls are None if allow_errors)
+        return self.make_batch_request([("eth_call", [{"to": to_address, "data": call_data}, hex(block_number)]) for to_address, call_data in calls], allow_errors)
+
+    def get_bloom_candidate_ranges(self,
+                                   bloom_filter: LogBloomFilter,
+                                   from_block: int,
+                                   to_block: int,
+                                   known_blooms: dict = {},
+                                   batch_size: int = 100,
+                                   max_gap: int = 10) -> list:
+        """
+        Return block ranges [(from_block, to_block)] of the blocks whose logsBloom matches the filter.
+        Headers are fetched in batches (blocks in 'known_blooms' ({block_number: logs_bloom}) are not fetched again).
+        Candidate blocks less than 'max_gap' blocks apart are merged into one range to save eth_getLogs requests.
+        """
+        candidate_blocks = []
+        for batch_start in range(from_block, to_block + 1, batch_size):
+            block_numbers = list(
+                range(batch_start, min(batch_start + batch_size, to_block + 1)))
+
+            blooms = {block_number: known_blooms[block_number]
+                      for block_number in block_numbers if block_number in known_blooms}
+            missing_block_numbers = [
+                block_number for block_number in block_numbers if block_number not in blooms]
+            if len(missing_block_numbers) != 0:
+                for block_number, block in zip(missing_block_numbers, self.get_raw_blocks(missing_block_numbers, full_transactions=False)):
+                    if block is None:
+                        raise ValueError(f"Block not found: {block_number}")
+                    blooms[block_number] = block["logsBloom"]
+
+            candidate_blocks.extend(
+                [block_number for block_number in block_numbers if bloom_filter.matches(blooms[block_number])])
+
+        metrics.inc("bloom_skipped_blocks_total",
+                    to_block - from_block + 1 - len(candidate_blocks))
+
+        candidate_ranges = []
+        for block_number in candidate_blocks:
+            if len(candidate_ranges) != 0 and block_number - candidate_ranges[-1][1] <= max_gap:
+                candidate_ranges[-1][1] = block_number
+            else:
+                candidate_ranges.append([block_number, block_number])
+
+        return [tuple(candidate_range) for candidate_range in candidate_ranges]
+
     def get_transaction(self, transaction_hash: str, decode_input: bool = True):
         response = self.execution_client.eth.get_transaction(
             transaction_hash)
@@ -205,10 +418,7 @@ class ExecutionClientConnector:
         if decode_input and response["input"] != "0x":
             contract_address = response["to"]
 
-            contract_abi = self.get_contract_abi(contract_address)
-
-            contract = self.execution_client.eth.contract(
-                address=contract_address, abi=contract_abi)
+            contract = self.get_contract_decoder(contract_address)
 
             func_obj, func_params = contract.decode_function_input(
                 response["input"])
@@ -253,11 +463,15 @@ class ExecutionClientConnector:
         Return contract abi.
         Query from db if in db else query from etherscan (no other way)
         """
-        if self.sql_db_connector.is_contract_in_db(self.contract_table_name, contract_address):
-            contract_data = self.sql_db_connector.query_all_contract_data(
-                self.contract_table_name, contract_address)
-            return contract_data["abi"]
-        else:
+        with profiler.stage("abi_fetch"):
+            if self.sql_db_connector.is_contract_in_db(self.contract_table_name, contract_address):
+                contract_data = self.sql_db_connector.query_all_contract_data(
+                    self.contract_table_name, contract_address, self.abi_table_name)
+                # rows of older versions are migrated on startup (migrate_contract_abis)
+                self.contract_abi_hashes[contract_address] = contract_data.get(
+                    "abi_hash") or get_abi_hash(contract_data["abi"])
+                return contract_data["abi"]
+
             # contract abi can not be retrieved from blockchain (not with get_code()) -> etherscan is needed
             params = {
                 "module": "contract",
@@ -265,48 +479,97 @@ class ExecutionClientConnector:
                 "address":  contract_address,
                 "apikey": self.etherscan_api_key
             }
-            response = requests.get(self.etherscan_ip, params=params)
+            response = self.retry_handler.call(
+                self.etherscan_ip, self._etherscan_request, params)
 
-            if response.json()["status"] == "0":
+            if response["status"] == "0":
                 raise NoABIFound
 
-            contract_abi = json.loads(response.json()["result"])
+            contract_abi = json.loads(response["result"])
 
-            contract_metadata = self.get_contract_metadata(
-                contract_address, contract_abi)
+            with profiler.stage("metadata"):
+                contract_metadata = self.get_contract_metadata(
+                    contract_address, contract_abi)
 
-            contract_implemented_token_standards = self.get_contract_implemented_token_standards(
-                contract_address, contract_abi)
+                contract_implemented_token_standards = self.get_contract_implemented_token_standards(
+                    contract_address, contract_abi)
 
             # insert data into db
-            self.sql_db_connector.insert_contract_data(
-                self.contract_table_name, contract_address, contract_metadata, contract_implemented_token_standards, contract_abi)
+            self.contract_abi_hashes[contract_address] = self.sql_db_connector.insert_contract_data(
+                self.contract_table_name, contract_address, contract_metadata, contract_implemented_token_standards, contract_abi, self.abi_table_name)
 
             return contract_abi
 
-    def get_contract_implemented_token_standards(self, contract_address: str, contract_abi=None):
-        # TODO: improve filter function with more than function name
-        if contract_abi is None:
-            contract_abi = self.get_contract_abi(contract_address)
+    def _etherscan_request(self, params: dict) -> dict:
+        response = requests.get(
+            self.etherscan_ip, params=params, timeout=timeout)
+        response.raise_for_status()
+        response = response.json()
 
-        contract_abi = [
-            contract_function_abi for contract_function_abi in contract_abi if "name" in contract_function_abi.keys()]
+        # etherscan reports rate limits as regular error results
+        if response["status"] == "0" and "rate limit" in str(response["result"]).lower():
+            raise RpcResponseError(
+                {"error": {"code": 429, "message": response["result"]}})
 
-        implemented_token_standards = {}
+        return response
 
-        for token_standard_name, token_standard_abi in self.token_standards.items():
-            # implemented flag
-            implemented = True
+    def get_contract_decoder(self, contract_address: str, contract_abi=None):
+        """
+        Return web3 contract factory (no address) of the contract abi, cached per abi hash.
+        Known abi hashes are resolved from the contract table without loading the abi again.
+        """
+        abi_hash = get_abi_hash(
+            contract_abi) if contract_abi is not None else self.contract_abi_hashes.get(contract_address)
 
-            for token_standard_function_abi in token_standard_abi:
-                contract_function_filter = [
-                    contract_function for contract_function in contract_abi if contract_function["name"] == token_standard_function_abi["name"]]
+        if abi_hash is None:
+            abi_hash = self.sql_db_connector.query_contract_abi_hash(
+                self.contract_table_name, contract_address)
+
+        if abi_hash is None or abi_hash not in self.decoders:
+            if contract_abi is None:
+                contract_abi = self.get_contract_abi(contract_address)
+                abi_hash = self.contract_abi_hashes[contract_address]
+
+            if abi_hash not in self.decoders:
+                self.decoders[abi_hash] = self.execution_client.eth.contract(
+                    abi=contract_abi)
+
+        self.contract_abi_hashes[contract_address] = abi_hash
 
-                if len(contract_function_filter) == 0:
-                    implemented = False
-                    break
+        return self.decoders[abi_hash]
+
+    def get_transfer_layout(self, contract_address: str):
+        """
+        Return the Transfer event layout of the contract abi (cached per abi hash), None if the abi has no Transfer event.
+        """
+        decoder = self.get_contract_decoder(contract_address)
+        abi_hash = self.contract_abi_hashes[contract_address]
 
-            implemented_token_standards[token_standard_name] = implemented
+        if abi_hash not in self.transfer_layouts:
+            self.transfer_layouts[abi_hash] = build_transfer_layout(
+                decoder.abi)
+
+        return self.transfer_layouts[abi_hash]
+
+    def get_contract(self, contract_address: str, contract_abi=None):
+        """
+        Return web3 contract object (built from the decoder of its abi hash).
+        """
+        contract_address = Web3.to_checksum_address(contract_address)
+
+        return self.get_contract_decoder(contract_address, contract_abi)(address=contract_address)
+
+    def get_contract_implemented_token_standards(self, contract_address: str, contract_abi=None):
+        # TODO: improve filter function with more than function name
+        if contract_abi is None:
+            contract_abi = self.get_contract_abi(contract_address)
+
+        contract_function_names = {
+            contract_function_abi["name"] for contract_function_abi in contract_abi if "name" in contract_function_abi.keys()}
+
+        # implemented if the contract has all function names of the standard
+        implemented_token_standards = {token_standard_name: token_standard_function_names <= contract_function_names
+                                       for token_standard_name, token_standard_function_names in get_token_standard_function_names().items()}
 
         return implemented_token_standards
 
@@ -368,42 +631,27 @@ class ExecutionClientConnector:
         contract = self.execution_client.eth.contract(
             Web3.to_checksum_address(contract_address), abi=contract_abi)
 
-        contract_event_list = []
-
         # create event object
         contract_event = contract.events[event_name]
 
-        batch_from_block = from_block
-        batch_to_block = to_block
-
-        more_batches = True
+        # only indexed arguments are filtered by the node
+        event_abi = [abi for abi in contract_abi if abi["type"]
+                     == "event" and abi["name"] == event_name][0]
+        data_filters = {input_abi["name"]: argument_filters[input_abi["name"]]
+                        for input_abi in event_abi["inputs"] if not input_abi["indexed"] and input_abi["name"] in argument_filters}
 
-        # get all data in batches
-        while more_batches:
-            try:
-                # try if batch size is in limits (<10000)
-                event_filter = contract_event.create_filter(
-                    fromBlock=batch_from_block, toBlock=batch_to_block, argument_filters=argument_filters)
+        def get_logs(batch_from_block, batch_to_block):
+            # eth_getLogs instead of a filter so finalized ranges can be cached
+            response = contract_event.get_logs(
+                argument_filters=argument_filters, fromBlock=batch_from_block, toBlock=batch_to_block)
 
-                response = event_filter.get_all_entries()
+            if len(data_filters) == 0:
+                return response
 
-                contract_event_list.extend(
-                    json.loads(Web3.to_json(response)))
+            return [event for event in response if all(event["args"][name] == value for name, value in data_filters.items())]
 
-                if batch_to_block == to_block:
-                    more_batches = False
-                else:
-                    batch_from_block = batch_to_block + 1
-                    batch_to_block = to_block
-
-            except ValueError as e:
-                if e.args[0]["code"] == -32603:
-                    pass
-                elif e.args[0]["code"] == -32005:
-                    # change batch intervall if intervall is bigger than limits
-                    batch_from_block = int(e.args[0]["data"]["from"], 16)
-                    batch_to_block = int(e.args[0]["data"]["to"], 16)
-                    pass
+        contract_event_list = self._get_logs_in_batches(
+            get_logs, from_block, to_block)
 
         return contract_event_list
 
@@ -417,50 +665,233 @@ class ExecutionClientConnector:
         """
         return self.get_contract_events_by_name(contract_address, "Transfer", from_block, to_block, argument_filters)
 
+    def get_token_transfers_of_contracts(self,
+                                         contract_addresses: list,
+                                         from_block: Union[int, str] = 0,
+                                         to_block: Union[int, str] = "latest"):
+        """
+        Return Transfer events of all contracts with one eth_getLogs query per block range.
+        Logs which do not match the Transfer event of their contract abi are skipped.
+        """
+        # contracts with the same abi share one decoder
+        decoders = {}
+        for contract_address in contract_addresses:
+            contract_address = Web3.to_checksum_address(contract_address)
+            decoders[contract_address] = self.get_contract_decoder(
+                contract_address)
+
+        def get_logs(batch_from_block, batch_to_block):
+            response = self.execution_client.eth.get_logs({
+                "fromBlock": batch_from_block,
+                "toBlock": batch_to_block,
+                "address": list(decoders.keys()),
+                "topics": [TRANSFER_EVENT_TOPIC]
+            })
+
+            decode_start_time = time.perf_counter()
+
+            contract_event_list = []
+            for log in response:
+                decoder = decoders[Web3.to_checksum_address(log["address"])]
+                try:
+                    contract_event_list.append(
+                        decoder.events.Transfer().process_log(log))
+                except (MismatchedABI, ABIEventFunctionNotFound, DecodingError):
+                    logging.warning(
+                        f"Transfer log not decodable: {log['address']} (transaction_hash: {log['transactionHash'].hex()})")
+
+            metrics.observe("decode_duration_seconds",
+                            time.perf_counter() - decode_start_time, step="process_log")
+
+            return contract_event_list
+
+        return self._get_logs_in_batches(get_logs, from_block, to_block)
+
+    def get_transfer_records(self,
+                             contract_addresses: list,
+                             from_block: Union[int, str] = 0,
+                             to_block: Union[int, str] = "latest",
+                             argument_filters: dict = {},
+                             finalized_block: Union[int, None] = None) -> list:
+        records = []
+        for _, batch_records in self.iter_transfer_records(contract_addresses, from_block, to_block, argument_filters, finalized_block):
+            records.extend(batch_records)
+
+        return records
+
+    def iter_transfer_records(self,
+                              contract_addresses: list,
+                              from_block: Union[int, str] = 0,
+                              to_block: Union[int, str] = "latest",
+                              argument_filters: dict = {},
+                              finalized_block: Union[int, None] = None):
+        """
+        Yield (batch_to_block, records) of the Transfer events of all contracts as TransferRecords (rows of the transaction table)
+        with one eth_getLogs query per block range (get_transfer_records returns all records).
+        Raw logs are decoded directly into records (no web3 event objects or json round trip). Logs which do not match
+        the Transfer event of their contract abi are skipped.
+
+        * argument_filters (optional): "from", "to", "value" or "tokenId", indexed arguments are filtered by the node
+        * finalized_block (optional): block hashes are only kept above the finalized block
+        """
+        layouts = {}
+        for contract_address in contract_addresses:
+            contract_address = Web3.to_checksum_address(contract_address)
+            layouts[contract_address] = self.get_transfer_layout(
+                contract_address)
+            if layouts[contract_address] is None:
+                raise ABIEventFunctionNotFound(
+                    f"No Transfer event in abi (contract_address: {contract_address})")
+
+        record_filters = {}
+        topics = [TRANSFER_EVENT_TOPIC, None, None, None]
+        for argument_index, (argument_name, record_field) in enumerate([("from", "from_address"), ("to", "to_address"), ("tokenId", "token_id")]):
+            if argument_name not in argument_filters:
+                continue
+            filter_value = argument_filters[argument_name]
+            if argument_index < 2:
+                filter_value = Web3.to_checksum_address(filter_value)
+            record_filters[record_field] = filter_value
+
+            # the node filters arguments that are indexed in all layouts
+            if all(layout.positions[argument_index] == (True, argument_index + 1) for layout in layouts.values()):
+                topics[argument_index + 1] = "0x" + (filter_value[2:].lower() if argument_index < 2 else f"{filter_value:x}").zfill(64)
+        if "value" in argument_filters:
+            record_filters["value"] = str(argument_filters["value"])
+
+        while topics[-1] is None:
+            topics.pop()
+
+        # logs are matched by lower case address (no checksum per log)
+        log_layouts = {contract_address.lower(): layout for contract_address,
+                       layout in layouts.items()}
+
+        def get_logs(batch_from_block, batch_to_block):
+            response = self.execution_client.provider.make_request("eth_getLogs", [{
+                "fromBlock": hex(batch_from_block),
+                "toBlock": hex(batch_to_block),
+                "address": list(layouts.keys()),
+                "topics": topics
+            }])
+            if "error" in response:
+                raise ValueError(response["error"])
+
+            decode_start_time = time.perf_counter()
+
+            records = []
+            for log in response["result"]:
+                record = decode_transfer_log(
+                    log, log_layouts[log["address"].lower()], finalized_block)
+                if record is None:
+                    logging.warning(
+                        f"Transfer log not decodable: {log['address']} (transaction_hash: {log['transactionHash']})")
+                elif all(getattr(record, field) == value for field, value in record_filters.items()):
+                    records.append(record)
+
+            metrics.observe("decode_duration_seconds",
+                            time.perf_counter() - decode_start_time, step="decode_transfer_log")
+
+            return records
+
+        return self._iter_logs_in_batches(get_logs, from_block, to_block, to_json=False)
+
     def get_contract_events(self,
                             contract_address: str,
                             from_block: Union[int, str] = 0,
                             to_block: Union[int, str] = "latest"):
-        contract_event_list = []
+        def get_logs(batch_from_block, batch_to_block):
+            return self.execution_client.eth.get_logs({
+                "fromBlock": batch_from_block,
+                "toBlock": batch_to_block,
+                "address": contract_address
+            })
 
-        # create event object
+        contract_event_list = self._get_logs_in_batches(
+            get_logs, from_block, to_block)
+
+        return contract_event_list
+
+    def _resolve_block_number(self, block_identifier: Union[int, str]) -> int:
+        if isinstance(block_identifier, int):
+            return block_identifier
+        if block_identifier == "earliest":
+            return 0
+        if block_identifier.startswith("0x"):
+            return int(block_identifier, 16)
+        if block_identifier.isdigit():
+            return int(block_identifier)
+
+        # block tags like 'latest', 'safe' or 'finalized'
+        return self.execution_client.eth.get_block(block_identifier)["number"]
+
+    def _get_logs_in_batches(self, get_logs, from_block: Union[int, str], to_block: Union[int, str], to_json: bool = True) -> list:
+        log_list = []
+        for _, logs in self._iter_logs_in_batches(get_logs, from_block, to_block, to_json):
+            log_list.extend(logs)
+
+        return log_list
+
+    def _iter_logs_in_batches(self, get_logs, from_block: Union[int, str], to_block: Union[int, str], to_json: bool = True):
+        """
+        Call get_logs(batch_from_block, batch_to_block) until the whole block range is covered and yield (batch_to_block, logs) per batch.
+        Web3 results are converted to json dicts, get_logs returning plain records passes to_json=False.
+        The batch range is shrunk on provider range limits (or exhausted retries) and grows again after successful batches.
+        While the circuit of the endpoint is open, the batch is retried after the reset timeout (up to max_retries times).
+        """
+        from_block = self._resolve_block_number(from_block)
+        to_block = self._resolve_block_number(to_block)
 
         batch_from_block = from_block
         batch_to_block = to_block
+        circuit_waits = 0
 
-        more_batches = True
-
-        # get all data in batches
-        while more_batches:
+        while batch_from_block <= to_block:
             try:
-                # try if batch size is in limits (<10000)
-                event_filter = self.execution_client.eth.filter({
-                    "fromBlock": batch_from_block,
-                    "toBlock": batch_to_block,
-                    "address": contract_address
-                })
+                # eth_getLogs requests are profiled as log_fetch, the rest (decoding) as decode
+                with profiler.stage("decode"):
+                    response = get_logs(batch_from_block, batch_to_block)
+            except CircuitOpenError as e:
+                if circuit_waits >= self.retry_handler.max_retries:
+                    raise
+
+                circuit_waits += 1
+                logging.warning(
+                    f"{e}, retrying blocks {batch_from_block}-{batch_to_block} in {self.retry_handler.reset_timeout}s")
+                time.sleep(self.retry_handler.reset_timeout)
+                continue
+            except (ValueError, RpcResponseError, IOError) as e:
+                error_class = self.retry_handler.classify(e)
+
+                # fatal errors and single blocks that still fail can not be resolved by resizing
+                if error_class is RpcErrorClass.FATAL or batch_from_block == batch_to_block:
+                    raise
+
+                self.retry_handler.count(
+                    self.execution_client_url, "resizes")
+
+                suggested_range = suggested_block_range(e)
+                if suggested_range is not None and suggested_range[0] == batch_from_block and batch_from_block <= suggested_range[1] < batch_to_block:
+                    batch_to_block = suggested_range[1]
+                else:
+                    batch_to_block = batch_from_block + \
+                        (batch_to_block - batch_from_block) // 2
+                continue
 
-                response = event_filter.get_all_entries()
+            metrics.observe("get_logs_window_blocks",
+                            batch_to_block - batch_from_block + 1)
+            metrics.observe("get_logs_result_logs", len(response))
 
-                contract_event_list.extend(
-                    json.loads(Web3.to_json(response)))
+            if to_json:
+                with metrics.time("decode_duration_seconds", step="to_json"), profiler.stage("decode"):
+                    response = json.loads(Web3.to_json(response))
 
-                if batch_to_block == to_block:
-                    more_batches = False
-                else:
-                    batch_from_block = batch_to_block + 1
-                    batch_to_block = to_block
-
-            except ValueError as e:
-                if e.args[0]["code"] == -32603:
-                    pass
-                elif e.args[0]["code"] == -32005:
-                    # change batch intervall if intervall is bigger than limits
-                    batch_from_block = int(e.args[0]["data"]["from"], 16)
-                    batch_to_block = int(e.args[0]["data"]["to"], 16)
-                    pass
+            circuit_waits = 0
+            yield batch_to_block, response
 
-        return contract_event_list
+            # next batch with double size of the last successful batch
+            batch_size = batch_to_block - batch_from_block + 1
+            batch_from_block = batch_to_block + 1
+            batch_to_block = min(to_block, batch_from_block + 2 * batch_size - 1)
 
     def get_contract_deploy_block(self, contract_address: str):
         try:
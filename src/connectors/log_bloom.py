@@ -0,0 +1,42 @@
+from eth_utils import keccak
+from typing import Union
+
+
+def get_bloom_mask(item: bytes) -> int:
+    """
+    Return the 3 bits an address or topic sets in a 2048 bit logsBloom (as int of the big endian bloom).
+    """
+    item_hash = keccak(item)
+
+    mask = 0
+    for index in (0, 2, 4):
+        mask |= 1 << (((item_hash[index] << 8) | item_hash[index + 1]) & 2047)
+
+    return mask
+
+
+def _to_bytes(value: str) -> bytes:
+    return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+
+
+class LogBloomFilter:
+    """
+    Test block headers (logsBloom) for logs of any of the addresses with all of the topics.
+    False positives are possible (bloom filter), false negatives are not, so blocks without a match can be skipped.
+    """
+
+    def __init__(self, addresses: list, topics: list = []) -> None:
+        self.address_masks = {get_bloom_mask(
+            _to_bytes(address)) for address in addresses}
+        self.topic_mask = 0
+        for topic in topics:
+            self.topic_mask |= get_bloom_mask(_to_bytes(topic))
+
+    def matches(self, logs_bloom: Union[str, bytes]) -> bool:
+        bloom = int.from_bytes(logs_bloom, "big") if isinstance(
+            logs_bloom, bytes) else int(logs_bloom, 16)
+
+        if bloom & self.topic_mask != self.topic_mask:
+            return False
+
+        return any(bloom & address_mask == address_mask for address_mask in self.address_masks)
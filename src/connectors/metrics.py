@@ -0,0 +1,245 @@
+from contextlib import contextmanager
+import bisect
+import logging
+import os
+import threading
+import time
+
+
+# seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1, 2.5, 5, 10, 30, 60)
+# counts (blocks, logs, rows)
+SIZE_BUCKETS = (1, 10, 100, 1000, 2000, 5000, 10000,
+                50000, 100000, 500000, 1000000)
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple) -> str:
+    if len(labels) == 0:
+        return ""
+
+    label_values = ",".join(
+        [f'{key}="{_escape_label_value(value)}"' for key, value in labels])
+    return f"{{{label_values}}}"
+
+
+class Counter:
+
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self.values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}",
+                 f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+
+    def set(self, value: float, **labels):
+        self.values[tuple(sorted(labels.items()))] = value
+
+    def render(self) -> list:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name: str, description: str, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts (non cumulative, last is +Inf), sum, count]
+        self.values = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+
+        if key not in self.values:
+            self.values[key] = [[0] * (len(self.buckets) + 1), 0, 0]
+        histogram = self.values[key]
+
+        histogram[0][bisect.bisect_left(self.buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}",
+                 f"# TYPE {self.name} histogram"]
+        for labels, (bucket_counts, value_sum, count) in self.values.items():
+            cumulative_count = 0
+            for bucket, bucket_count in zip(self.buckets + ("+Inf",), bucket_counts):
+                cumulative_count += bucket_count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(labels + (('le', bucket),))} {cumulative_count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {value_sum}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    In-process metrics (counters, gauges, histograms) rendered in prometheus text format.
+    Exposed with an http endpoint (start_http_server) or a periodic file dump (start_file_dump).
+    """
+
+    def __init__(self) -> None:
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get_metric(self, metric_class, name: str, *args):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = metric_class(name, *args)
+            return self.metrics[name]
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        return self._get_metric(Counter, name, description)
+
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        return self._get_metric(Gauge, name, description)
+
+    def histogram(self, name: str, description: str = "", buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_metric(Histogram, name, description, buckets)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        metric = self.counter(name)
+        with self.lock:
+            metric.inc(amount, **labels)
+
+    def set(self, name: str, value: float, **labels):
+        metric = self.gauge(name)
+        with self.lock:
+            metric.set(value, **labels)
+
+    def observe(self, name: str, value: float, **labels):
+        metric = self.histogram(name)
+        with self.lock:
+            metric.observe(value, **labels)
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        """
+        Observe the duration of the with block in seconds (also if it raises).
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def render(self) -> str:
+        with self.lock:
+            lines = []
+            for metric in self.metrics.values():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port: int, host: str = "0.0.0.0") -> bool:
+        """
+        Serve the metrics on http://host:port/metrics. Return True if the endpoint started,
+        False if the port is in use (the process keeps running without endpoint).
+        """
+        # imported here, most short lived workers never start the endpoint
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                response = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        except OSError as e:
+            logging.warning(
+                f"Metrics endpoint not started (port {port} in use by another process?): {e}")
+            return False
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        logging.info(f"Metrics endpoint started: http://{host}:{port}/metrics")
+
+        return True
+
+    def start_file_dump(self, path: str, interval: float = 15) -> threading.Thread:
+        def dump_metrics():
+            while True:
+                time.sleep(interval)
+                self.dump(path)
+
+        thread = threading.Thread(target=dump_metrics, daemon=True)
+        thread.start()
+
+        logging.info(f"Metrics file dump started: {path} (every {interval}s)")
+
+        return thread
+
+    def dump(self, path: str):
+        if os.path.dirname(path) != "":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(f"{path}.tmp", "w") as f:
+            f.write(self.render())
+        os.replace(f"{path}.tmp", path)
+
+
+# process wide registry used by all connectors
+metrics = MetricsRegistry()
+
+metrics.histogram("rpc_request_duration_seconds",
+                  "Duration of json-rpc and beacon api requests (incl. retries)")
+metrics.counter("rpc_cache_hits_total", "Requests served from the rpc cache")
+metrics.counter("epoch_cache_hits_total",
+                "Beacon api requests served from the epoch cache")
+metrics.counter("epoch_cache_misses_total",
+                "Beacon api requests of slot states not in the epoch cache")
+metrics.histogram("get_logs_window_blocks",
+                  "Block range size of eth_getLogs batches", SIZE_BUCKETS)
+metrics.histogram("get_logs_result_logs",
+                  "Number of logs returned by eth_getLogs batches", SIZE_BUCKETS)
+metrics.histogram("decode_duration_seconds",
+                  "Duration of log decoding and conversion per batch")
+metrics.histogram("db_insert_duration_seconds",
+                  "Duration of executemany calls per batch")
+metrics.histogram("db_commit_duration_seconds", "Duration of commits")
+metrics.counter("db_inserted_rows_total",
+                "Rows sent to the database (incl. ignored duplicates)")
+metrics.gauge("db_insert_rows_per_second",
+              "Insert throughput of the last insert_many_data call")
+metrics.gauge("queue_depth", "Number of items per queue and status")
+metrics.counter("ingested_blocks_total",
+                "Blocks written by the block ingestion")
+metrics.counter("bloom_skipped_blocks_total",
+                "Blocks skipped by the logsBloom prefilter")
+metrics.counter("dedup_checked_rows_total",
+                "Transfer rows checked against the transaction table before inserting")
+metrics.counter("dedup_unchecked_rows_total",
+                "Transfer rows inserted without existence check")
+metrics.counter("dedup_fallback_batches_total",
+                "Batches inserted again because unchecked rows were in the table already")
+metrics.counter("writer_backpressure_seconds_total",
+                "Time fetchers waited for the full write-behind queue")
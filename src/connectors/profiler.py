@@ -0,0 +1,229 @@
+from contextlib import contextmanager
+from typing import Union
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+
+class _StageFrame:
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.wall_seconds = 0
+        self.cpu_seconds = 0
+        self.memory_start = 0
+        self.profile = cProfile.Profile()
+        self.profiling = False
+        self.resumed_at = None
+
+    def resume(self):
+        self.resumed_at = (time.perf_counter(), time.process_time())
+        try:
+            self.profile.enable()
+            self.profiling = True
+        except ValueError:
+            # another profiler is active (e.g. in another thread)
+            self.profiling = False
+
+    def pause(self):
+        if self.profiling:
+            self.profile.disable()
+            self.profiling = False
+        self.wall_seconds += time.perf_counter() - self.resumed_at[0]
+        self.cpu_seconds += time.process_time() - self.resumed_at[1]
+
+
+class CollectionProfiler:
+    """
+    Opt-in profiler for collection runs.
+
+    Per contract and stage (abi_fetch, metadata, log_fetch, decode, insert) it records exclusive wall and cpu time,
+    cProfile stats and the traced memory growth. Per contract the top allocations (tracemalloc snapshot diff) are
+    written to the report directory. Stages are no-ops while the profiler is disabled.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.report_dir = None
+        self.trace_allocations = True
+
+        self.contract_address = None
+        self.contract_snapshot = None
+        # {contract_address: {stage: {"wall_seconds", "cpu_seconds", "calls", "memory_delta_max", "profiles"}}}
+        self.results = {}
+
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def enable(self, report_dir: str, trace_allocations: bool = True):
+        self.enabled = True
+        self.report_dir = os.path.join(
+            report_dir, time.strftime("%Y%m%dT%H%M%S"))
+        self.trace_allocations = trace_allocations
+
+        os.makedirs(self.report_dir, exist_ok=True)
+
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+
+        logging.info(f"Profiling enabled: {self.report_dir}")
+
+    def _get_stack(self) -> list:
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Profile the with block as stage 'name' of the current contract.
+        Nested stages are excluded from the time of the outer stage.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        stack = self._get_stack()
+        if len(stack) != 0:
+            stack[-1].pause()
+
+        frame = _StageFrame(name)
+        if self.trace_allocations:
+            frame.memory_start = tracemalloc.get_traced_memory()[0]
+        stack.append(frame)
+        frame.resume()
+
+        try:
+            yield
+        finally:
+            frame.pause()
+            stack.pop()
+
+            memory_delta = tracemalloc.get_traced_memory(
+            )[0] - frame.memory_start if self.trace_allocations else 0
+
+            self._record(frame, memory_delta)
+
+            if len(stack) != 0:
+                stack[-1].resume()
+
+    def _record(self, frame: _StageFrame, memory_delta: int):
+        contract_address = self.contract_address if self.contract_address is not None else "none"
+
+        with self.lock:
+            stages = self.results.setdefault(contract_address, {})
+            stage = stages.setdefault(frame.name, {
+                "wall_seconds": 0,
+                "cpu_seconds": 0,
+                "calls": 0,
+                "memory_delta_max": 0,
+                "profiles": []
+            })
+            stage["wall_seconds"] += frame.wall_seconds
+            stage["cpu_seconds"] += frame.cpu_seconds
+            stage["calls"] += 1
+            stage["memory_delta_max"] = max(
+                stage["memory_delta_max"], memory_delta)
+            stage["profiles"].append(frame.profile)
+
+    def start_contract(self, contract_address: str):
+        if not self.enabled:
+            return
+
+        self.contract_address = contract_address
+
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            self.contract_snapshot = tracemalloc.take_snapshot()
+
+    def finish_contract(self) -> Union[dict, None]:
+        """
+        Write the report of the current contract and return its stage summary.
+        """
+        if not self.enabled or self.contract_address is None:
+            return None
+
+        contract_dir = os.path.join(self.report_dir, self.contract_address)
+        os.makedirs(contract_dir, exist_ok=True)
+
+        with self.lock:
+            stages = self.results.get(self.contract_address, {})
+
+            summary = {"contract_address": self.contract_address, "stages": {}}
+            for stage_name, stage in stages.items():
+                summary["stages"][stage_name] = {key: value for key,
+                                                 value in stage.items() if key != "profiles"}
+
+                profile_stats = [profile for profile in stage["profiles"]
+                                 if profile.getstats()]
+                if len(profile_stats) != 0:
+                    stats = pstats.Stats(profile_stats[0])
+                    for profile in profile_stats[1:]:
+                        stats.add(profile)
+                    stats.dump_stats(os.path.join(
+                        contract_dir, f"{stage_name}.prof"))
+
+                    stats_text = io.StringIO()
+                    stats.stream = stats_text
+                    stats.sort_stats("cumulative").print_stats(30)
+                    with open(os.path.join(contract_dir, f"{stage_name}.txt"), "w") as f:
+                        f.write(stats_text.getvalue())
+
+                # profiles are written, keep memory flat over long runs
+                stage["profiles"] = []
+
+        if self.trace_allocations and self.contract_snapshot is not None:
+            summary["peak_traced_memory"] = tracemalloc.get_traced_memory()[1]
+
+            snapshot_diff = tracemalloc.take_snapshot().compare_to(
+                self.contract_snapshot, "lineno")
+            with open(os.path.join(contract_dir, "allocations.txt"), "w") as f:
+                for statistic in snapshot_diff[:30]:
+                    f.write(f"{statistic}\n")
+
+        summary["wall_seconds"] = sum(
+            stage["wall_seconds"] for stage in summary["stages"].values())
+
+        with open(os.path.join(contract_dir, "summary.json"), "w") as f:
+            json.dump(summary, f, indent=4)
+
+        self.contract_address = None
+        self.contract_snapshot = None
+
+        return summary
+
+    def write_run_summary(self):
+        """
+        Write summary.json of the run with all contracts sorted by profiled wall time.
+        """
+        if not self.enabled:
+            return
+
+        with self.lock:
+            contracts = []
+            for contract_address, stages in self.results.items():
+                contracts.append({
+                    "contract_address": contract_address,
+                    "wall_seconds": sum(stage["wall_seconds"] for stage in stages.values()),
+                    "cpu_seconds": sum(stage["cpu_seconds"] for stage in stages.values()),
+                    "stages": {stage_name: {key: value for key, value in stage.items() if key != "profiles"} for stage_name, stage in stages.items()}
+                })
+
+        contracts = sorted(
+            contracts, key=lambda contract: contract["wall_seconds"], reverse=True)
+
+        with open(os.path.join(self.report_dir, "summary.json"), "w") as f:
+            json.dump(contracts, f, indent=4)
+
+        logging.info(
+            f"Profiling report written: {self.report_dir}")
+
+
+# process wide profiler used by all connectors (disabled by default)
+profiler = CollectionProfiler()
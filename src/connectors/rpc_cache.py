@@ -0,0 +1,256 @@
+from typing import Union
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+# methods whose results never change once their block is finalized
+CACHEABLE_METHODS = (
+    "eth_getBlockByNumber",
+    "eth_getBlockByHash",
+    "eth_getTransactionByHash",
+    "eth_getTransactionReceipt",
+    "eth_getLogs",
+    "eth_getStorageAt"
+)
+
+
+def _to_int(value) -> Union[int, None]:
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.startswith("0x"):
+        return int(value, 16)
+    return None
+
+
+class RpcCache:
+    """
+    Persistent sqlite cache for json-rpc results of finalized blocks.
+
+    Entries are keyed by method and params and only stored if all blocks they depend on are at or below
+    the finality watermark. The least recently used entries are evicted when the cache exceeds max_size bytes.
+    """
+
+    def __init__(self, path: str, max_size: int = 2 * 1024 ** 3) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.finalized_block = None
+
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path) != "":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS rpc_cache ("
+            "key TEXT PRIMARY KEY NOT NULL,"
+            "result TEXT NOT NULL,"
+            "size INTEGER NOT NULL,"
+            "accessed REAL NOT NULL"
+            ")")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS rpc_cache_accessed ON rpc_cache (accessed)")
+        self.connection.commit()
+
+        self.size = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM rpc_cache").fetchone()[0]
+
+        logging.info(
+            f"RPC cache opened: {path} ({self.size} bytes)")
+
+    def __del__(self):
+        if getattr(self, "connection", None) is not None:
+            self.connection.close()
+
+    def set_finalized_block(self, block_number: int):
+        # the watermark never moves backwards
+        if self.finalized_block is None or block_number > self.finalized_block:
+            self.finalized_block = block_number
+
+    def make_key(self, method: str, params) -> str:
+        return f"{method}:{json.dumps(params, sort_keys=True, default=str)}"
+
+    def is_cacheable_request(self, method: str, params) -> bool:
+        if method not in CACHEABLE_METHODS or self.finalized_block is None:
+            return False
+
+        if method == "eth_getBlockByNumber":
+            block_number = _to_int(params[0])
+            return block_number is not None and block_number <= self.finalized_block
+
+        if method == "eth_getStorageAt":
+            block_number = _to_int(params[2]) if len(params) > 2 else None
+            return block_number is not None and block_number <= self.finalized_block
+
+        if method == "eth_getLogs":
+            log_filter = params[0]
+            # block hash filters are checked on the result
+            if "blockHash" in log_filter:
+                return True
+            to_block = _to_int(log_filter.get("toBlock"))
+            return to_block is not None and to_block <= self.finalized_block
+
+        # hash based requests are checked on the result
+        return True
+
+    def is_cacheable_result(self, method: str, result) -> bool:
+        if result is None:
+            return False
+
+        # the block was checked on the request
+        if method == "eth_getStorageAt":
+            return True
+
+        if method == "eth_getLogs":
+            return all(_to_int(log.get("blockNumber")) is not None and _to_int(log["blockNumber"]) <= self.finalized_block for log in result)
+
+        if method in ("eth_getBlockByNumber", "eth_getBlockByHash"):
+            block_number = _to_int(result.get("number"))
+        else:
+            block_number = _to_int(result.get("blockNumber"))
+
+        return block_number is not None and block_number <= self.finalized_block
+
+    def get(self, method: str, params):
+        if not self.is_cacheable_request(method, params):
+            return None
+
+        key = self.make_key(method, params)
+
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT result FROM rpc_cache WHERE key = ?", (key,)).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.connection.execute(
+                "UPDATE rpc_cache SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.connection.commit()
+
+        return json.loads(row[0])
+
+    def put(self, method: str, params, result) -> bool:
+        if not self.is_cacheable_request(method, params) or not self.is_cacheable_result(method, result):
+            return False
+
+        key = self.make_key(method, params)
+        value = json.dumps(result)
+        size = len(key) + len(value)
+
+        with self.lock:
+            old_row = self.connection.execute(
+                "SELECT size FROM rpc_cache WHERE key = ?", (key,)).fetchone()
+
+            self.connection.execute(
+                "INSERT OR REPLACE INTO rpc_cache (key, result, size, accessed) VALUES (?, ?, ?, ?)", (key, value, size, time.time()))
+            self.size += size - (old_row[0] if old_row is not None else 0)
+
+            if self.size > self.max_size:
+                self._evict()
+
+            self.connection.commit()
+
+        return True
+
+    def get_many(self, requests: list) -> list:
+        """
+        Return the cached results of [(method, params)] in request order (None if not cached), in one sqlite transaction.
+        """
+        keys = {request_index: self.make_key(method, params) for request_index, (method, params) in enumerate(requests)
+                if self.is_cacheable_request(method, params)}
+
+        results = [None] * len(requests)
+        if len(keys) == 0:
+            return results
+
+        with self.lock:
+            hit_keys = []
+            for request_index, key in keys.items():
+                row = self.connection.execute(
+                    "SELECT result FROM rpc_cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    continue
+                results[request_index] = json.loads(row[0])
+                hit_keys.append((time.time(), key))
+
+            self.hits += len(hit_keys)
+            self.misses += len(keys) - len(hit_keys)
+            if len(hit_keys) != 0:
+                self.connection.executemany(
+                    "UPDATE rpc_cache SET accessed = ? WHERE key = ?", hit_keys)
+                self.connection.commit()
+
+        return results
+
+    def put_many(self, requests: list, results: list) -> int:
+        """
+        Store the results of [(method, params)] in one sqlite transaction and return the number of stored results.
+        """
+        rows = {}
+        for (method, params), result in zip(requests, results):
+            if self.is_cacheable_request(method, params) and self.is_cacheable_result(method, result):
+                key = self.make_key(method, params)
+                value = json.dumps(result)
+                rows[key] = (key, value, len(key) + len(value), time.time())
+        rows = list(rows.values())
+
+        if len(rows) == 0:
+            return 0
+
+        with self.lock:
+            for key, _, size, _ in rows:
+                old_row = self.connection.execute(
+                    "SELECT size FROM rpc_cache WHERE key = ?", (key,)).fetchone()
+                self.size += size - (old_row[0] if old_row is not None else 0)
+
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO rpc_cache (key, result, size, accessed) VALUES (?, ?, ?, ?)", rows)
+
+            if self.size > self.max_size:
+                self._evict()
+
+            self.connection.commit()
+
+        return len(rows)
+
+    def _evict(self):
+        # evict least recently used entries down to 90% of max size
+        target_size = int(self.max_size * 0.9)
+
+        while self.size > target_size:
+            rows = self.connection.execute(
+                "SELECT key, size FROM rpc_cache ORDER BY accessed LIMIT 1000").fetchall()
+            if len(rows) == 0:
+                self.size = 0
+                break
+
+            evicted_keys = []
+            for key, size in rows:
+                evicted_keys.append((key,))
+                self.size -= size
+                if self.size <= target_size:
+                    break
+
+            self.connection.executemany(
+                "DELETE FROM rpc_cache WHERE key = ?", evicted_keys)
+
+        logging.info(f"RPC cache evicted to {self.size} bytes")
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "max_size": self.max_size,
+            "finalized_block": self.finalized_block,
+            "hits": self.hits,
+            "misses": self.misses
+        }
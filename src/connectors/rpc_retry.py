@@ -0,0 +1,261 @@
+import requests
+from enum import Enum
+from typing import Callable, Union
+import logging
+import random
+import threading
+import time
+
+
+# markers in json-rpc error messages (lower case)
+RESIZABLE_ERROR_MARKERS = (
+    "query returned more than",
+    "block range",
+    "range too large",
+    "too many results",
+    "response size",
+    "exceed maximum block range",
+    "log response size exceeded"
+)
+RETRYABLE_ERROR_MARKERS = (
+    "rate limit",
+    "request rate",
+    "too many requests",
+    "timeout",
+    "timed out",
+    "busy",
+    "try again",
+    "header not found",
+    "internal error"
+)
+RETRYABLE_ERROR_CODES = (-32603, 429)
+
+
+class RpcErrorClass(Enum):
+    RETRYABLE = "retryable"
+    RESIZABLE = "resizable"
+    FATAL = "fatal"
+
+
+class RpcResponseError(Exception):
+    """
+    Json-rpc error response raised so it can pass through the retry handler.
+    args[0] is the error dict ({"code": ..., "message": ..., "data": ...}) like web3 ValueErrors.
+    """
+
+    def __init__(self, response: dict) -> None:
+        super().__init__(response["error"])
+        self.response = response
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised without calling the endpoint while its circuit breaker is open.
+    """
+
+    def __init__(self, endpoint: str) -> None:
+        super().__init__(f"Circuit open for endpoint: {endpoint}")
+        self.endpoint = endpoint
+
+
+def classify_rpc_error(error: dict) -> RpcErrorClass:
+    code = error.get("code")
+    message = str(error.get("message", "")).lower()
+    data = error.get("data")
+
+    # provider suggests a smaller range (e.g. infura -32005)
+    if isinstance(data, dict) and "from" in data and "to" in data:
+        return RpcErrorClass.RESIZABLE
+    if any(marker in message for marker in RESIZABLE_ERROR_MARKERS):
+        return RpcErrorClass.RESIZABLE
+    if code in RETRYABLE_ERROR_CODES or any(marker in message for marker in RETRYABLE_ERROR_MARKERS):
+        return RpcErrorClass.RETRYABLE
+
+    return RpcErrorClass.FATAL
+
+
+def classify_error(error: Exception) -> RpcErrorClass:
+    if isinstance(error, CircuitOpenError):
+        return RpcErrorClass.FATAL
+
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, ConnectionError, TimeoutError)):
+        return RpcErrorClass.RETRYABLE
+
+    if isinstance(error, requests.exceptions.HTTPError):
+        if error.response is not None and (error.response.status_code == 429 or error.response.status_code >= 500):
+            return RpcErrorClass.RETRYABLE
+        return RpcErrorClass.FATAL
+
+    # web3 raises json-rpc errors as ValueError with the error dict as first arg
+    if isinstance(error, (ValueError, RpcResponseError)) and len(error.args) > 0 and isinstance(error.args[0], dict):
+        return classify_rpc_error(error.args[0])
+
+    return RpcErrorClass.FATAL
+
+
+def is_endpoint_failure(error: Exception) -> bool:
+    """
+    Return True if the endpoint did not answer (connection errors, timeouts, http errors).
+    Json-rpc error responses were answered by the endpoint, they are retried but do not count as circuit failures.
+    """
+    if isinstance(error, (ValueError, RpcResponseError)) and len(error.args) > 0 and isinstance(error.args[0], dict):
+        return False
+    return True
+
+
+def suggested_block_range(error: Exception) -> Union[tuple, None]:
+    """
+    Return (from_block, to_block) if the provider suggested a smaller range in the error data.
+    """
+    if len(error.args) == 0 or not isinstance(error.args[0], dict):
+        return None
+
+    data = error.args[0].get("data")
+    if not isinstance(data, dict) or "from" not in data or "to" not in data:
+        return None
+
+    try:
+        return int(data["from"], 16), int(data["to"], 16)
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold: int = 10, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+
+    def allow_request(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            # let a single trial request through
+            self.state = "half_open"
+        return True
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class RetryHandler:
+    """
+    Shared retry layer for connector calls.
+
+    Retryable errors are retried with jittered exponential backoff, resizable and fatal errors are raised
+    immediately so the caller can shrink the request or give up. Every endpoint has its own circuit breaker,
+    only errors without an answer of the endpoint count as its failures.
+    """
+
+    def __init__(self,
+                 max_retries: int = 5,
+                 base_delay: float = 0.5,
+                 max_delay: float = 30.0,
+                 failure_threshold: int = 10,
+                 reset_timeout: float = 30.0
+                 ) -> None:
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.circuit_breakers = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def classify(self, error: Exception) -> RpcErrorClass:
+        return classify_error(error)
+
+    def get_backoff_delay(self, attempt: int) -> float:
+        # full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, endpoint: str, func: Callable, *args, **kwargs):
+        circuit_breaker = self._get_circuit_breaker(endpoint)
+
+        attempt = 0
+        while True:
+            with self.lock:
+                allowed = circuit_breaker.allow_request()
+            if not allowed:
+                self.count(endpoint, "rejected")
+                raise CircuitOpenError(endpoint)
+
+            self.count(endpoint, "calls")
+            try:
+                response = func(*args, **kwargs)
+            except Exception as e:
+                error_class = self.classify(e)
+
+                if error_class is not RpcErrorClass.RETRYABLE:
+                    # endpoint answered, the request itself is the problem
+                    with self.lock:
+                        circuit_breaker.record_success()
+                    raise
+
+                with self.lock:
+                    if is_endpoint_failure(e):
+                        circuit_breaker.record_failure()
+                    else:
+                        # rate limits and internal errors are answers, the endpoint is reachable
+                        circuit_breaker.record_success()
+
+                if attempt >= self.max_retries:
+                    self.count(endpoint, "failures")
+                    logging.error(
+                        f"RPC call failed after {attempt} retries: {endpoint}, error: {e}")
+                    raise
+
+                delay = self.get_backoff_delay(attempt)
+                attempt += 1
+                self.count(endpoint, "retries")
+                logging.warning(
+                    f"RPC call failed, retry {attempt}/{self.max_retries} in {delay:.2f}s: {endpoint}, error: {e}")
+                time.sleep(delay)
+                continue
+
+            with self.lock:
+                circuit_breaker.record_success()
+            return response
+
+    def count(self, endpoint: str, counter: str, amount: int = 1):
+        with self.lock:
+            endpoint_counters = self.counters.setdefault(endpoint, {
+                "calls": 0,
+                "retries": 0,
+                "resizes": 0,
+                "failures": 0,
+                "rejected": 0
+            })
+            endpoint_counters[counter] += amount
+
+    def stats(self) -> dict:
+        with self.lock:
+            stats = {endpoint: dict(counters)
+                     for endpoint, counters in self.counters.items()}
+            for endpoint, circuit_breaker in self.circuit_breakers.items():
+                stats.setdefault(endpoint, {})[
+                    "circuit_state"] = circuit_breaker.state
+
+        return stats
+
+    def _get_circuit_breaker(self, endpoint: str) -> CircuitBreaker:
+        with self.lock:
+            if endpoint not in self.circuit_breakers:
+                self.circuit_breakers[endpoint] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout)
+            return self.circuit_breakers[endpoint]
@@ -3,7 +3,19 @@ from mysql.connector import errorcode
 from mysql.connector.errors import DatabaseError
 import json
 from typing import Union
+from connectors.abi_store import ABI_TABLE_NAME, canonical_abi_json, get_abi_hash
+from connectors.metrics import metrics
+from connectors.profiler import profiler
 import logging
+import time
+
+
+# offset so signed uint256 balances sort correctly as fixed width strings
+BALANCE_SORT_OFFSET = 10 ** 78
+
+
+def balance_sort_key(balance: int) -> str:
+    return str(balance + BALANCE_SORT_OFFSET).zfill(79)
 
 
 class SqlDatabaseConnector:
@@ -22,6 +34,8 @@ class SqlDatabaseConnector:
             'port': port
         }
         self.db_name = db_name
+        # {table_name: (partition_blocks, upper bound of the last partition)} of tables extended on inserts
+        self.block_partitions = {}
 
         self.connection = None
         try:
@@ -113,6 +127,166 @@ class SqlDatabaseConnector:
 
         cursor.close()
 
+    def add_column(self, table_name: str, column_description: str):
+        """
+        Add column to an existing table (tables created by older versions).
+        """
+        self.use_database(self.db_name)
+
+        column_name = column_description.split(" ", 1)[0]
+
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(
+                f"ALTER TABLE {table_name} ADD COLUMN {column_description}")
+            logging.info(f"Added column: {table_name}.{column_name}")
+        except mysql.connector.Error as err:
+            if err.errno != errorcode.ER_DUP_FIELDNAME:
+                logging.error(
+                    f"Failed adding column: {table_name}.{column_name}, error: {err.msg}")
+
+        cursor.close()
+
+    def add_index(self, table_name: str, index_name: str, columns: list):
+        """
+        Add index to an existing table (tables created by older versions).
+        """
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(
+                f"CREATE INDEX {index_name} ON {table_name} ({', '.join(columns)})")
+            logging.info(f"Added index: {table_name}.{index_name}")
+        except mysql.connector.Error as err:
+            if err.errno != errorcode.ER_DUP_KEYNAME:
+                logging.error(
+                    f"Failed adding index: {table_name}.{index_name}, error: {err.msg}")
+
+        cursor.close()
+
+    # Partition Functions
+
+    def query_block_partition_bounds(self, table_name: str) -> Union[list, None]:
+        """
+        Return the sorted upper bounds (exclusive) of the block_number range partitions or None if the table is not range partitioned.
+        """
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            "SELECT PARTITION_METHOD, PARTITION_DESCRIPTION FROM INFORMATION_SCHEMA.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL", (table_name,))
+        partitions = cursor.fetchall()
+        cursor.close()
+
+        if len(partitions) == 0 or partitions[0][0] != "RANGE":
+            return None
+
+        return sorted(int(description) for _, description in partitions)
+
+    def partition_by_block_range(self, table_name: str, partition_blocks: int):
+        """
+        Rebuild a table as range partitioned by block_number ('partition_blocks' blocks per partition).
+        Every unique key of a partitioned table must contain block_number, so the primary key becomes (transaction_hash, log_index, block_number)
+        and other unique indexes are dropped. Copies all rows (can take long on large tables).
+        """
+        if self.query_block_partition_bounds(table_name) is not None:
+            return
+
+        cursor = self.connection.cursor(dictionary=True)
+        cursor.execute(f"SHOW INDEX FROM {table_name}")
+        unique_index_names = {index["Key_name"] for index in cursor.fetchall()
+                              if index["Non_unique"] == 0 and index["Key_name"] != "PRIMARY"}
+        cursor.execute(f"SELECT MAX(block_number) AS max_block FROM {table_name}")
+        max_block = cursor.fetchone()["max_block"] or 0
+
+        partitions = [f"PARTITION p{upper_bound} VALUES LESS THAN ({upper_bound})"
+                      for upper_bound in range(partition_blocks, max_block + partition_blocks + 1, partition_blocks)]
+        alter_query = (
+            f"ALTER TABLE {table_name} DROP PRIMARY KEY, "
+            f"{''.join([f'DROP INDEX {index_name}, ' for index_name in unique_index_names])}"
+            f"ADD PRIMARY KEY (transaction_hash, log_index, block_number) "
+            f"PARTITION BY RANGE (block_number) ({', '.join(partitions)})")
+
+        logging.info(
+            f"Partitioning table: {table_name} ({len(partitions)} partitions of {partition_blocks} blocks)")
+        start_time = time.perf_counter()
+        cursor.execute(alter_query)
+        cursor.close()
+        logging.info(
+            f"Partitioned table: {table_name} in {time.perf_counter() - start_time:.1f}s")
+
+    def enable_block_partitions(self, table_name: str, partition_blocks: int) -> bool:
+        """
+        Extend the block_number range partitions of the table automatically on inserts (rows above the last partition).
+        Empty tables are partitioned right away, tables with rows have to be rebuilt with partition_by_block_range.
+        Return whether the table is partitioned.
+        """
+        upper_bounds = self.query_block_partition_bounds(table_name)
+
+        if upper_bounds is None:
+            cursor = self.connection.cursor()
+            cursor.execute(f"SELECT 1 FROM {table_name} LIMIT 1")
+            is_empty = cursor.fetchone() is None
+            cursor.close()
+
+            if not is_empty:
+                logging.warning(
+                    f"Table not partitioned: {table_name} (rebuild it with partition_by_block_range)")
+                return False
+
+            self.partition_by_block_range(table_name, partition_blocks)
+            upper_bounds = self.query_block_partition_bounds(table_name)
+
+        self.block_partitions[table_name] = (partition_blocks, upper_bounds[-1])
+        return True
+
+    def extend_block_partitions(self, table_name: str, block_number: int):
+        """
+        Add partitions until 'block_number' fits into the last partition (partitioned tables have no catch-all partition).
+        ALTER TABLE commits the open db transaction, so it is called before the first insert of a transaction.
+        """
+        partition_blocks, upper_bound = self.block_partitions[table_name]
+        if block_number < upper_bound:
+            return
+
+        new_upper_bounds = range(upper_bound + partition_blocks,
+                                 block_number + partition_blocks + 1, partition_blocks)
+        partitions = [f"PARTITION p{new_upper_bound} VALUES LESS THAN ({new_upper_bound})"
+                      for new_upper_bound in new_upper_bounds]
+
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(
+                f"ALTER TABLE {table_name} ADD PARTITION ({', '.join(partitions)})")
+            logging.info(
+                f"Added partitions: {table_name} up to block {new_upper_bounds[-1]}")
+        except mysql.connector.Error as err:
+            # added by another connection in the meantime
+            if err.errno not in (errorcode.ER_SAME_NAME_PARTITION, errorcode.ER_RANGE_NOT_INCREASING_ERROR):
+                raise
+        cursor.close()
+
+        self.block_partitions[table_name] = (
+            partition_blocks, self.query_block_partition_bounds(table_name)[-1])
+        self.extend_block_partitions(table_name, block_number)
+
+    def commit(self):
+        with metrics.time("db_commit_duration_seconds", table="all"):
+            self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    @staticmethod
+    def is_lock_conflict(err: Exception) -> bool:
+        """
+        Return True if a statement failed on row locks of a concurrent connection (deadlock, lock wait timeout).
+        The transaction is rolled back by the caller and can be run again.
+        """
+        return isinstance(err, DatabaseError) and err.errno in (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
     def insert_data(self, table_name: str, data: dict):
         self.use_database(self.db_name)
 
@@ -121,12 +295,20 @@ class SqlDatabaseConnector:
 
         insert_query = f"INSERT INTO {table_name} ({data_fields}) VALUES ({data_value_slots})"
 
+        if table_name in self.block_partitions:
+            self.extend_block_partitions(table_name, data["block_number"])
+
         cursor = self.connection.cursor()
         cursor.execute(insert_query, data)
         self.connection.commit()
         cursor.close()
 
-    def insert_many_data(self, table_name: str, many_data: list[dict], batch_size: int = 10000):
+    def insert_many_data(self, table_name: str, many_data: list[dict], batch_size: int = 10000, commit: bool = True):
+        with profiler.stage("insert"):
+            self._insert_many_data(
+                table_name, many_data, batch_size, commit)
+
+    def _insert_many_data(self, table_name: str, many_data: list[dict], batch_size: int, commit: bool):
         self.use_database(self.db_name)
 
         field_names = many_data[0].keys()
@@ -135,31 +317,63 @@ class SqlDatabaseConnector:
 
         insert_query = f"INSERT IGNORE INTO {table_name} ({data_fields}) VALUES ({data_value_slots})"
 
-        cursor = self.connection.cursor()
+        if table_name in self.block_partitions:
+            self.extend_block_partitions(
+                table_name, max(data["block_number"] for data in many_data))
+
+        start_time = time.perf_counter()
 
-        if len(many_data) > batch_size:
-            batch_start = 0
-            batch_end = batch_size
+        cursor = self.connection.cursor()
 
-            while batch_end <= len(many_data)+1:
-                batch = many_data[batch_start:batch_end]
+        for batch_start in range(0, len(many_data), batch_size):
+            batch = many_data[batch_start:batch_start + batch_size]
 
+            with metrics.time("db_insert_duration_seconds", table=table_name):
                 cursor.executemany(insert_query, batch)
+            if commit:
+                with metrics.time("db_commit_duration_seconds", table=table_name):
+                    self.connection.commit()
+
+        cursor.close()
+
+        duration = time.perf_counter() - start_time
+        metrics.inc("db_inserted_rows_total", len(many_data), table=table_name)
+        if duration > 0:
+            metrics.set("db_insert_rows_per_second",
+                        len(many_data) / duration, table=table_name)
+
+    def insert_many_rows(self, table_name: str, fields: list, rows: list, batch_size: int = 10000, commit: bool = True) -> int:
+        """
+        Insert tuples (values in order of 'fields'), rows with an existing primary key are ignored.
+        Return the number of inserted rows (without ignored rows).
+        """
+        if len(rows) == 0:
+            return 0
+
+        self.use_database(self.db_name)
+
+        insert_query = f"INSERT IGNORE INTO {table_name} ({', '.join(fields)}) VALUES ({', '.join(['%s'] * len(fields))})"
+
+        if table_name in self.block_partitions:
+            block_number_index = fields.index("block_number")
+            self.extend_block_partitions(
+                table_name, max(row[block_number_index] for row in rows))
+
+        inserted_row_count = 0
+        with profiler.stage("insert"):
+            cursor = self.connection.cursor()
+            for batch_start in range(0, len(rows), batch_size):
+                with metrics.time("db_insert_duration_seconds", table=table_name):
+                    cursor.executemany(
+                        insert_query, rows[batch_start:batch_start + batch_size])
+                inserted_row_count += cursor.rowcount
+            if commit:
                 self.connection.commit()
+            cursor.close()
 
-                # calc new batch
-                batch_start = batch_end
-                if batch_start >= len(many_data):
-                    break
-                elif batch_start + batch_start <= len(many_data):
-                    batch_end = batch_start + batch_size
-                else:
-                    batch_end = len(many_data)+1
-        else:
-            cursor.executemany(insert_query, many_data)
-            self.connection.commit()
+        metrics.inc("db_inserted_rows_total", len(rows), table=table_name)
 
-        cursor.close()
+        return inserted_row_count
 
     def query_data(self, table_name: str, fields: Union[list, str] = "*", equal_filter: dict = None, limit: int = 1000) -> list:
         self.use_database(self.db_name)
@@ -197,9 +411,39 @@ class SqlDatabaseConnector:
 
         return data_type_dict
 
+    def delete_data_by_block_range(self, table_name: str, from_block: Union[int, None] = None, to_block: Union[int, None] = None, commit: bool = True) -> int:
+        """
+        Delete all rows with from_block <= block_number <= to_block (bounds optional) and return the number of deleted rows.
+        """
+        self.use_database(self.db_name)
+
+        block_filters = []
+        if from_block is not None:
+            block_filters.append(f"block_number >= {int(from_block)}")
+        if to_block is not None:
+            block_filters.append(f"block_number <= {int(to_block)}")
+
+        delete_query = f"DELETE FROM {table_name}"
+        if len(block_filters) != 0:
+            delete_query += f" WHERE {' and '.join(block_filters)}"
+
+        cursor = self.connection.cursor()
+        cursor.execute(delete_query)
+        row_count = cursor.rowcount
+        if commit:
+            self.connection.commit()
+        cursor.close()
+
+        return row_count
+
     # Contract Functions
 
-    def insert_contract_data(self, table_name: str, contract_address: str, contract_metadata: dict, contract_implemented_token_standards: dict, contract_abi):
+    def insert_contract_data(self, table_name: str, contract_address: str, contract_metadata: dict, contract_implemented_token_standards: dict, contract_abi, abi_table_name: str) -> str:
+        """
+        Insert contract row and its abi (once per abi hash). Return the abi hash.
+        """
+        abi_hash = self.insert_abi(abi_table_name, contract_abi)
+
         data = {
             "contract_address": contract_address,
             "name": contract_metadata["name"],
@@ -210,11 +454,86 @@ class SqlDatabaseConnector:
 
         data.update(contract_implemented_token_standards)
 
-        data["abi"] = json.dumps(contract_abi)
+        data["abi_hash"] = abi_hash
 
         self.insert_data(table_name, data)
 
-    def query_all_contract_data(self, table_name: str, contract_address: str) -> dict:
+        return abi_hash
+
+    def insert_abi(self, table_name: str, contract_abi: list) -> str:
+        abi_hash = get_abi_hash(contract_abi)
+
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"INSERT IGNORE INTO {table_name} (abi_hash, abi) VALUES (%s, %s)", (abi_hash, canonical_abi_json(contract_abi)))
+        self.connection.commit()
+        cursor.close()
+
+        return abi_hash
+
+    def query_abi(self, table_name: str, abi_hash: str) -> Union[list, None]:
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT abi FROM {table_name} WHERE abi_hash = %s", (abi_hash,))
+        row = cursor.fetchone()
+        cursor.close()
+
+        return None if row is None else json.loads(row[0])
+
+    def query_contract_abi_hash(self, table_name: str, contract_address: str) -> Union[str, None]:
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT abi_hash FROM {table_name} WHERE contract_address = %s", (contract_address,))
+        row = cursor.fetchone()
+        cursor.close()
+
+        return None if row is None else row[0]
+
+    def migrate_contract_abis(self, table_name: str, abi_table_name: str) -> int:
+        """
+        Move abis of contract rows written by older versions (abi column) into the abi table. Return the number of moved abis.
+        """
+        if "abi" not in self.query_data_type(table_name):
+            return 0
+
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT contract_address, abi FROM {table_name} WHERE abi IS NOT NULL AND abi_hash IS NULL")
+        contracts = cursor.fetchall()
+
+        abis = {}
+        contract_abi_hashes = []
+        for contract_address, contract_abi in contracts:
+            contract_abi = json.loads(contract_abi)
+            abi_hash = get_abi_hash(contract_abi)
+            abis[abi_hash] = canonical_abi_json(contract_abi)
+            contract_abi_hashes.append((abi_hash, contract_address))
+
+        cursor.executemany(
+            f"INSERT IGNORE INTO {abi_table_name} (abi_hash, abi) VALUES (%s, %s)", list(abis.items()))
+        cursor.executemany(
+            f"UPDATE {table_name} SET abi_hash = %s, abi = NULL WHERE contract_address = %s", contract_abi_hashes)
+        self.connection.commit()
+        cursor.close()
+
+        if len(contracts) != 0:
+            logging.info(
+                f"Moved contract abis into {abi_table_name}: {len(contracts)} contracts, {len(abis)} distinct abis")
+
+        return len(contracts)
+
+    def query_all_contract_data(self, table_name: str, contract_address: str, abi_table_name: Union[str, None] = None) -> dict:
+        """
+        Return contract row. With 'abi_table_name' the abi is resolved from the abi table ("abi").
+        """
         data = self.query_data(table_name, equal_filter={
                                "contract_address": contract_address})[0]
 
@@ -232,6 +551,9 @@ class SqlDatabaseConnector:
                 if data_type == "varchar" and data[column].isdigit():
                     data[column] = int(data[column])
 
+        if abi_table_name is not None and data.get("abi_hash") is not None:
+            data["abi"] = self.query_abi(abi_table_name, data["abi_hash"])
+
         return data
 
     def query_contract_data(self,
@@ -242,7 +564,10 @@ class SqlDatabaseConnector:
                             with_block_deployed: bool = False,
                             with_total_supply: bool = False,
                             with_abi: bool = False,
-                            limit: int = 1000) -> list:
+                            limit: int = 1000,
+                            abi_table_name: str = ABI_TABLE_NAME,
+                            with_abi_hash: bool = False) -> list:
+        # with_abi returns the abi (resolved from the abi table), with_abi_hash the abi hash
         fields = ["contract_address"]
         if with_name:
             fields.append("name")
@@ -252,8 +577,8 @@ class SqlDatabaseConnector:
             fields.append("block_deployed")
         if with_total_supply:
             fields.append("total_supply")
-        if with_abi:
-            fields.append("abi")
+        if with_abi or with_abi_hash:
+            fields.append("abi_hash")
 
         if token_standard is None:
             data = self.query_data(
@@ -273,6 +598,16 @@ class SqlDatabaseConnector:
                     if data_types[key] == "varchar" and value.isdigit():
                         d[key] = int(value)
 
+        if with_abi:
+            abis = {}
+            for d in data:
+                if d["abi_hash"] is not None and d["abi_hash"] not in abis:
+                    abis[d["abi_hash"]] = self.query_abi(
+                        abi_table_name, d["abi_hash"])
+                d["abi"] = abis.get(d["abi_hash"])
+                if not with_abi_hash:
+                    del d["abi_hash"]
+
         return data
 
     def is_contract_in_db(self, table_name: str, contract_address: str) -> bool:
@@ -286,18 +621,19 @@ class SqlDatabaseConnector:
 
     # Transaction Functions
 
-    def insert_transaction_data(self, table_name: str, transaction_hash: str, contract_address: str, token_id: int, from_address: str, to_address: str, block_number: int):
-        if not self.is_transaction_in_db(table_name, transaction_hash):
-            data = {
-                "transaction_hash": transaction_hash,
-                "contract_address": contract_address,
-                "token_id": token_id,
-                "from_address": from_address,
-                "to_address": to_address,
-                "block_number": block_number
-            }
+    def insert_transaction_data(self, table_name: str, transaction_hash: str, contract_address: str, token_id: int, from_address: str, to_address: str, block_number: int, log_index: int):
+        # an existing (transaction_hash, log_index) is ignored by the insert (no existence query before)
+        data = {
+            "transaction_hash": transaction_hash,
+            "contract_address": contract_address,
+            "token_id": token_id,
+            "from_address": from_address,
+            "to_address": to_address,
+            "block_number": block_number,
+            "log_index": log_index
+        }
 
-            self.insert_data(table_name, data)
+        self.insert_many_data(table_name, [data])
 
     def insert_many_transaction_data(self, table_name: str, transaction_data: list[dict]):
         self.insert_many_data(table_name, transaction_data)
@@ -316,17 +652,264 @@ class SqlDatabaseConnector:
 
         return contract_transactions
 
-    def query_token_transaction_data(self, table_name: str, contract_address: str, token_id: int):
-        # return list of transactions sorted by block_number
-        fields = ["from_address", "to_address", "block_number"]
+    def query_token_transaction_data(self, table_name: str, contract_address: str, token_id: int, to_block: Union[int, None] = None):
+        # return list of transactions sorted by (block_number, log_index) (up to to_block, partitions above are pruned)
+        self.use_database(self.db_name)
+
+        select_query = f"SELECT from_address, to_address, block_number FROM {table_name} WHERE contract_address = %s AND token_id = %s"
+        filter_params = [contract_address, token_id]
+        if to_block is not None:
+            select_query += " AND block_number <= %s"
+            filter_params.append(to_block)
 
-        token_transactions = self.query_contract_transaction_data(
-            table_name, contract_address, token_id, fields)
-        token_transactions = sorted(
-            token_transactions, key=lambda x: x["block_number"])
+        cursor = self.connection.cursor(dictionary=True)
+        cursor.execute(select_query + " ORDER BY block_number, log_index", filter_params)
+        token_transactions = cursor.fetchall()
+        cursor.close()
 
         return token_transactions
 
+    def query_transaction_contract_addresses(self, table_name: str) -> list:
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(f"SELECT DISTINCT contract_address FROM {table_name}")
+        contract_addresses = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+
+        return contract_addresses
+
+    def query_transaction_data_chunks(self,
+                                      table_name: str,
+                                      fields: list,
+                                      contract_address: Union[str, None] = None,
+                                      from_block: Union[int, None] = None,
+                                      to_block: Union[int, None] = None,
+                                      chunk_size: int = 100000):
+        """
+        Yield transactions as lists of tuples (values in order of 'fields') without loading the whole result.
+        The connection can not be used for other queries until the generator is exhausted.
+        """
+        self.use_database(self.db_name)
+
+        filters = []
+        filter_params = {}
+        if contract_address is not None:
+            filters.append("contract_address = %(contract_address)s")
+            filter_params["contract_address"] = contract_address
+        if from_block is not None:
+            filters.append("block_number >= %(from_block)s")
+            filter_params["from_block"] = from_block
+        if to_block is not None:
+            filters.append("block_number <= %(to_block)s")
+            filter_params["to_block"] = to_block
+
+        select_query = f"SELECT {', '.join(fields)} FROM {table_name}"
+        if len(filters) != 0:
+            select_query += f" WHERE {' and '.join(filters)}"
+
+        # unbuffered cursor -> rows are streamed from the server
+        cursor = self.connection.cursor(buffered=False)
+        try:
+            cursor.execute(select_query, filter_params)
+
+            while True:
+                chunk = cursor.fetchmany(chunk_size)
+                if len(chunk) == 0:
+                    break
+                yield chunk
+        finally:
+            # drop unread rows if the consumer stopped early
+            if self.connection.unread_result:
+                self.connection.consume_results()
+            cursor.close()
+
+    def query_contract_transfer_stats(self, table_name: str, contract_address: str) -> tuple:
+        # return (transfer count, first block, last block) of the contract in the transaction table
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT COUNT(*), MIN(block_number), MAX(block_number) FROM {table_name} WHERE contract_address = %s", (contract_address,))
+        transfer_stats = cursor.fetchone()
+        cursor.close()
+
+        return transfer_stats
+
+    def query_existing_transfer_keys(self,
+                                     table_name: str,
+                                     transfer_keys: list,
+                                     from_block: Union[int, None] = None,
+                                     to_block: Union[int, None] = None) -> set:
+        """
+        Return the keys ((transaction_hash, log_index)) of 'transfer_keys' already in the table.
+        The block bounds (of the keys) are only applied to block partitioned tables: their primary key is (transaction_hash, log_index, block_number),
+        so a key is only a duplicate in its block and only the partitions of the blocks are searched.
+        """
+        if len(transfer_keys) == 0:
+            return set()
+
+        self.use_database(self.db_name)
+
+        # the primary key prefix selects all logs of the transactions, the log indexes are matched here
+        transaction_hashes = list({transaction_hash for transaction_hash, _ in transfer_keys})
+        value_slots = ", ".join(["%s"] * len(transaction_hashes))
+        select_query = f"SELECT transaction_hash, log_index FROM {table_name} WHERE transaction_hash IN ({value_slots})"
+        filter_params = transaction_hashes
+        if table_name in self.block_partitions and from_block is not None and to_block is not None:
+            select_query += " AND block_number BETWEEN %s AND %s"
+            filter_params.extend([from_block, to_block])
+
+        cursor = self.connection.cursor()
+        cursor.execute(select_query, filter_params)
+        existing_transfer_keys = set(cursor.fetchall()) & set(transfer_keys)
+        cursor.close()
+
+        return existing_transfer_keys
+
+    def query_primary_key_columns(self, table_name: str) -> list:
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = 'PRIMARY' ORDER BY SEQ_IN_INDEX", (table_name,))
+        columns = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+
+        return columns
+
+    def query_transactions_without_log_index(self, table_name: str, limit: int = 1000) -> list:
+        # rows of older versions (one row per transaction hash, no log index)
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor(dictionary=True)
+        cursor.execute(
+            f"SELECT transaction_hash, contract_address, token_id, value, from_address, to_address, block_number FROM {table_name} "
+            f"WHERE log_index IS NULL LIMIT {int(limit)}")
+        transactions = cursor.fetchall()
+        cursor.close()
+
+        return transactions
+
+    def update_transaction_log_indexes(self, table_name: str, log_indexes: list):
+        # set [(transaction_hash, log_index)] of rows without log index
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.executemany(
+            f"UPDATE {table_name} SET log_index = %s WHERE transaction_hash = %s AND log_index IS NULL",
+            [(log_index, transaction_hash) for transaction_hash, log_index in log_indexes])
+        self.connection.commit()
+        cursor.close()
+
+    def migrate_transaction_key(self, table_name: str):
+        """
+        Change the primary key of a transaction table of older versions (transaction_hash) to (transaction_hash, log_index)
+        ((transaction_hash, log_index, block_number) on block partitioned tables). All rows need a log index.
+        """
+        primary_key_columns = self.query_primary_key_columns(table_name)
+        if "log_index" in primary_key_columns:
+            return
+
+        cursor = self.connection.cursor(dictionary=True)
+        cursor.execute(f"SHOW INDEX FROM {table_name}")
+        unique_index_names = {index["Key_name"] for index in cursor.fetchall()
+                              if index["Non_unique"] == 0 and index["Key_name"] != "PRIMARY"}
+
+        key_columns = ["transaction_hash", "log_index"]
+        if "block_number" in primary_key_columns:
+            key_columns.append("block_number")
+
+        alter_query = (
+            f"ALTER TABLE {table_name} MODIFY log_index int NOT NULL, DROP PRIMARY KEY, "
+            f"{''.join([f'DROP INDEX {index_name}, ' for index_name in unique_index_names])}"
+            f"ADD PRIMARY KEY ({', '.join(key_columns)})")
+
+        logging.info(
+            f"Changing primary key: {table_name} ({', '.join(key_columns)})")
+        start_time = time.perf_counter()
+        cursor.execute(alter_query)
+        cursor.close()
+        logging.info(
+            f"Changed primary key: {table_name} in {time.perf_counter() - start_time:.1f}s")
+
+    def query_address_transfers(self,
+                                table_name: str,
+                                address: str,
+                                direction: str = "both",
+                                contract_addresses: Union[list, None] = None,
+                                from_block: Union[int, None] = None,
+                                to_block: Union[int, None] = None,
+                                after: Union[tuple, None] = None,
+                                limit: int = 100,
+                                descending: bool = False) -> list:
+        """
+        Return one page of transfers of 'address' ordered by (block_number, contract_address, transaction_hash, log_index).
+
+        * direction: "in" (to_address), "out" (from_address) or "both"
+        * after: (block_number, contract_address, transaction_hash, log_index) of the last row of the previous page (keyset paging)
+
+        The page is selected on the from_activity / to_activity indexes only in index order (the primary key is part of every index, no filesort),
+        rows are read by primary key and block afterwards (one partition of block partitioned tables). Every row has a "direction" ("in", "out" or "self").
+        """
+        if direction not in ("in", "out", "both"):
+            raise ValueError(
+                f"Unknown direction: {direction} (expected 'in', 'out' or 'both')")
+
+        self.use_database(self.db_name)
+
+        order = "DESC" if descending else "ASC"
+        comparison = "<" if descending else ">"
+
+        filters = []
+        filter_params = []
+        if contract_addresses is not None:
+            filters.append(
+                f"contract_address IN ({', '.join(['%s'] * len(contract_addresses))})")
+            filter_params.extend(contract_addresses)
+        if from_block is not None:
+            filters.append("block_number >= %s")
+            filter_params.append(from_block)
+        if to_block is not None:
+            filters.append("block_number <= %s")
+            filter_params.append(to_block)
+        if after is not None:
+            filters.append(
+                f"(block_number {comparison} %s OR (block_number = %s AND (contract_address {comparison} %s OR "
+                f"(contract_address = %s AND (transaction_hash {comparison} %s OR "
+                f"(transaction_hash = %s AND log_index {comparison} %s))))))")
+            filter_params.extend(
+                [after[0], after[0], after[1], after[1], after[2], after[2], after[3]])
+
+        page_queries = []
+        page_params = []
+        for address_field, index_name in (("from_address", "from_activity"), ("to_address", "to_activity")):
+            if direction == "in" and address_field == "from_address" or direction == "out" and address_field == "to_address":
+                continue
+
+            page_queries.append(
+                f"(SELECT transaction_hash, log_index, block_number, contract_address FROM {table_name} FORCE INDEX ({index_name}) "
+                f"WHERE {' AND '.join([f'{address_field} = %s'] + filters)} "
+                f"ORDER BY block_number {order}, contract_address {order}, transaction_hash {order}, log_index {order} LIMIT {int(limit)})")
+            page_params.extend([address] + filter_params)
+
+        select_query = (
+            "SELECT transfer.transaction_hash, transfer.contract_address, transfer.token_id, transfer.value, "
+            "transfer.from_address, transfer.to_address, transfer.block_number, transfer.log_index, "
+            "CASE WHEN transfer.from_address = %s AND transfer.to_address = %s THEN 'self' WHEN transfer.from_address = %s THEN 'out' ELSE 'in' END AS direction "
+            f"FROM ({' UNION '.join(page_queries)}) AS page "
+            f"JOIN {table_name} AS transfer ON transfer.transaction_hash = page.transaction_hash AND transfer.log_index = page.log_index "
+            f"AND transfer.block_number = page.block_number "
+            f"ORDER BY page.block_number {order}, page.contract_address {order}, page.transaction_hash {order}, page.log_index {order} LIMIT {int(limit)}")
+
+        cursor = self.connection.cursor(dictionary=True)
+        cursor.execute(select_query, [address, address, address] + page_params)
+        transfers = cursor.fetchall()
+        cursor.close()
+
+        return transfers
+
     def is_transaction_in_db(self, table_name: str, transaction_hash: str) -> bool:
         contract = self.query_data(table_name, equal_filter={
                                    "transaction_hash": transaction_hash})
@@ -345,3 +928,506 @@ class SqlDatabaseConnector:
         cursor.execute(insert_query)
         self.connection.commit()
         cursor.close()
+
+    # Contract Registry Functions
+
+    def query_registry_sources(self, table_name: str) -> dict:
+        # return {contract_address (lower case): source}
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(f"SELECT contract_address, source FROM {table_name}")
+        sources = {contract_address.lower(): source for contract_address,
+                   source in cursor.fetchall()}
+        cursor.close()
+
+        return sources
+
+    def upsert_registry_contracts(self, table_name: str, contracts: list[dict], batch_size: int = 10000):
+        """
+        Insert contracts (contract_address, name, source, status) or update name and source of existing contracts.
+        The status of existing contracts is not changed.
+        """
+        self.use_database(self.db_name)
+
+        insert_query = (
+            f"INSERT INTO {table_name} (contract_address, name, source, status) "
+            "VALUES (%(contract_address)s, %(name)s, %(source)s, %(status)s) "
+            "ON DUPLICATE KEY UPDATE name = COALESCE(VALUES(name), name), source = VALUES(source)"
+        )
+
+        cursor = self.connection.cursor()
+        for batch_start in range(0, len(contracts), batch_size):
+            cursor.executemany(
+                insert_query, contracts[batch_start:batch_start + batch_size])
+            self.connection.commit()
+        cursor.close()
+
+    def claim_registry_contracts(self, table_name: str, claim_id: str, worker: str, limit: int = 1) -> list:
+        """
+        Atomically set up to 'limit' pending contracts to 'collecting' and return them.
+        """
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor(dictionary=True)
+        cursor.execute(
+            f"UPDATE {table_name} SET status = 'collecting', claim_id = %s, worker = %s WHERE status = 'pending' ORDER BY contract_address LIMIT {int(limit)}", (claim_id, worker))
+        self.connection.commit()
+
+        cursor.execute(
+            f"SELECT contract_address, name, source, last_block FROM {table_name} WHERE claim_id = %s AND status = 'collecting'", (claim_id,))
+        contracts = cursor.fetchall()
+        cursor.close()
+
+        return contracts
+
+    def update_registry_contract(self, table_name: str, contract_address: str, data: dict):
+        self.use_database(self.db_name)
+
+        data_slots = ", ".join([f"{key} = %({key})s" for key in data.keys()])
+
+        update_query = f"UPDATE {table_name} SET {data_slots} WHERE contract_address = %(contract_address)s"
+
+        cursor = self.connection.cursor()
+        cursor.execute(update_query, {
+                       **data, "contract_address": contract_address})
+        self.connection.commit()
+        cursor.close()
+
+    def update_registry_status(self, table_name: str, from_status: str, to_status: str) -> int:
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"UPDATE {table_name} SET status = %s, claim_id = NULL, worker = NULL WHERE status = %s", (to_status, from_status))
+        row_count = cursor.rowcount
+        self.connection.commit()
+        cursor.close()
+
+        return row_count
+
+    def query_registry_contracts(self, table_name: str, status: Union[str, None] = None) -> list:
+        self.use_database(self.db_name)
+
+        select_query = f"SELECT contract_address, name, source, status, last_block, error FROM {table_name}"
+
+        cursor = self.connection.cursor(dictionary=True)
+        if status is None:
+            cursor.execute(select_query)
+        else:
+            cursor.execute(f"{select_query} WHERE status = %s", (status,))
+        contracts = cursor.fetchall()
+        cursor.close()
+
+        return contracts
+
+    def count_registry_status(self, table_name: str) -> dict:
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT status, COUNT(*) FROM {table_name} GROUP BY status")
+        status_counts = dict(cursor.fetchall())
+        cursor.close()
+
+        return status_counts
+
+    # Collection Job Functions
+
+    def insert_collection_jobs(self, table_name: str, jobs: list[dict]):
+        """
+        Insert jobs (contract_address, from_block, to_block, optional batch_addresses and estimated_logs), existing shards are ignored.
+        """
+        if len(jobs) == 0:
+            return
+
+        self.insert_many_data(table_name, jobs)
+
+    def lease_collection_job(self, table_name: str, lease_id: str, worker: str, lease_duration: int, max_attempts: int) -> Union[dict, None]:
+        """
+        Atomically lease the oldest pending job (or a job with an expired lease) and return it.
+        Expired jobs with 'max_attempts' attempts (e.g. their workers crashed every time) are marked as error instead.
+        """
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor(dictionary=True)
+        cursor.execute(
+            f"UPDATE {table_name} SET status = 'error', lease_expires_at = NULL, error = 'Lease expired after the last attempt' "
+            "WHERE status = 'leased' AND lease_expires_at < NOW() AND attempts >= %s", (max_attempts,))
+        cursor.execute(
+            f"UPDATE {table_name} SET status = 'leased', lease_id = %s, worker = %s, "
+            f"lease_expires_at = NOW() + INTERVAL {int(lease_duration)} SECOND, attempts = attempts + 1 "
+            "WHERE status = 'pending' OR (status = 'leased' AND lease_expires_at < NOW() AND attempts < %s) "
+            "ORDER BY job_id LIMIT 1", (lease_id, worker, max_attempts))
+        self.connection.commit()
+
+        cursor.execute(
+            f"SELECT job_id, contract_address, from_block, to_block, batch_addresses, attempts, lease_id FROM {table_name} WHERE lease_id = %s", (lease_id,))
+        job = cursor.fetchone()
+        cursor.close()
+
+        return job
+
+    def update_leased_collection_job(self, table_name: str, job_id: int, lease_id: str, data: dict) -> bool:
+        """
+        Update job only if it is still leased with lease_id. Return False if the lease was lost.
+        """
+        self.use_database(self.db_name)
+
+        data_slots = ", ".join([f"{key} = %({key})s" for key in data.keys()])
+
+        update_query = f"UPDATE {table_name} SET {data_slots} WHERE job_id = %(job_id)s AND lease_id = %(lease_id)s AND status = 'leased'"
+
+        cursor = self.connection.cursor()
+        cursor.execute(update_query, {
+                       **data, "job_id": job_id, "lease_id": lease_id})
+        row_count = cursor.rowcount
+        self.connection.commit()
+        cursor.close()
+
+        return row_count == 1
+
+    def renew_collection_job_lease(self, table_name: str, job_id: int, lease_id: str, lease_duration: int) -> bool:
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"UPDATE {table_name} SET lease_expires_at = NOW() + INTERVAL {int(lease_duration)} SECOND "
+            "WHERE job_id = %s AND lease_id = %s AND status = 'leased'", (job_id, lease_id))
+        row_count = cursor.rowcount
+        self.connection.commit()
+        cursor.close()
+
+        return row_count == 1
+
+    def query_contract_collection_job_status(self, table_name: str, contract_address: str) -> dict:
+        # return {status: (job count, max to_block)} of all jobs of the contract (incl. batched jobs)
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT status, COUNT(*), MAX(to_block) FROM {table_name} WHERE contract_address = %s OR FIND_IN_SET(%s, batch_addresses) GROUP BY status", (contract_address, contract_address))
+        job_status = {status: (count, max_to_block)
+                      for status, count, max_to_block in cursor.fetchall()}
+        cursor.close()
+
+        return job_status
+
+    def query_open_collection_job_from_block(self, table_name: str, contract_address: str) -> Union[int, None]:
+        # return the first block of the unfinished jobs (pending, leased or error) of the contract, None if all jobs are done
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT MIN(from_block) FROM {table_name} WHERE status != 'done' AND (contract_address = %s OR FIND_IN_SET(%s, batch_addresses))", (contract_address, contract_address))
+        from_block = cursor.fetchone()[0]
+        cursor.close()
+
+        return from_block
+
+    def count_collection_job_status(self, table_name: str) -> dict:
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT status, COUNT(*) FROM {table_name} GROUP BY status")
+        status_counts = dict(cursor.fetchall())
+        cursor.close()
+
+        return status_counts
+
+    # Holder Balance Functions
+
+    def update_holder_balances(self, table_name: str, balance_deltas: dict, batch_size: int = 1000, commit: bool = True):
+        """
+        Add balance deltas ({(contract_address, holder_address): delta}) to the stored balances.
+        Balances are summed as python ints (uint256 safe) and stored as decimal strings.
+        """
+        if len(balance_deltas) == 0:
+            return
+
+        self.use_database(self.db_name)
+
+        insert_query = (
+            f"INSERT INTO {table_name} (contract_address, holder_address, balance, balance_sort) VALUES (%s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE balance = VALUES(balance), balance_sort = VALUES(balance_sort)")
+
+        cursor = self.connection.cursor()
+
+        # same lock order in all workers (no deadlocks between concurrent updates)
+        balance_keys = sorted(balance_deltas.keys())
+        for batch_start in range(0, len(balance_keys), batch_size):
+            batch = balance_keys[batch_start:batch_start + batch_size]
+
+            # lock the rows until commit, concurrent workers add their deltas after this one
+            # (gap locks of new holders can still deadlock with inserting workers, HolderBalances runs the batch again)
+            key_slots = ", ".join(["(%s, %s)"] * len(batch))
+            cursor.execute(
+                f"SELECT contract_address, holder_address, balance FROM {table_name} WHERE (contract_address, holder_address) IN ({key_slots}) FOR UPDATE",
+                [value for key in batch for value in key])
+            balances = {(contract_address, holder_address): int(balance)
+                        for contract_address, holder_address, balance in cursor.fetchall()}
+
+            rows = []
+            for key in batch:
+                balance = balances.get(key, 0) + balance_deltas[key]
+                rows.append((key[0], key[1], str(balance),
+                            balance_sort_key(balance)))
+            cursor.executemany(insert_query, rows)
+
+        if commit:
+            self.connection.commit()
+        cursor.close()
+
+    def upsert_token_owners(self, table_name: str, token_owners: dict, commit: bool = True):
+        """
+        Set token owners ({(contract_address, token_id): (owner_address, block_number)}).
+        A stored owner is only replaced by transfers of the same or a later block (shards can be collected in any order).
+        """
+        if len(token_owners) == 0:
+            return
+
+        self.use_database(self.db_name)
+
+        # owner_address is updated first, it compares against the old block_number
+        insert_query = (
+            f"INSERT INTO {table_name} (contract_address, token_id, owner_address, block_number) VALUES (%s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE "
+            "owner_address = IF(VALUES(block_number) >= block_number, VALUES(owner_address), owner_address), "
+            "block_number = GREATEST(block_number, VALUES(block_number))")
+
+        rows = [(contract_address, str(token_id), owner_address, block_number)
+                for (contract_address, token_id), (owner_address, block_number) in token_owners.items()]
+
+        cursor = self.connection.cursor()
+        cursor.executemany(insert_query, rows)
+        if commit:
+            self.connection.commit()
+        cursor.close()
+
+    def delete_token_owners(self, table_name: str, token_keys: list, commit: bool = True):
+        # token_keys: list of (contract_address, token_id)
+        if len(token_keys) == 0:
+            return
+
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.executemany(f"DELETE FROM {table_name} WHERE contract_address = %s AND token_id = %s", [
+                           (contract_address, str(token_id)) for contract_address, token_id in token_keys])
+        if commit:
+            self.connection.commit()
+        cursor.close()
+
+    def delete_contract_rows(self, table_name: str, contract_address: str, commit: bool = True) -> int:
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"DELETE FROM {table_name} WHERE contract_address = %s", (contract_address,))
+        row_count = cursor.rowcount
+        if commit:
+            self.connection.commit()
+        cursor.close()
+
+        return row_count
+
+    def query_holders(self, table_name: str, contract_address: str, limit: Union[int, None] = None) -> list:
+        """
+        Return [{"holder_address", "balance"}] of all holders with a positive balance, largest balance first.
+        """
+        self.use_database(self.db_name)
+
+        select_query = (
+            f"SELECT holder_address, balance FROM {table_name} "
+            "WHERE contract_address = %s AND balance_sort > %s ORDER BY balance_sort DESC")
+        if limit is not None:
+            select_query += f" LIMIT {int(limit)}"
+
+        cursor = self.connection.cursor(dictionary=True)
+        cursor.execute(select_query, (contract_address, balance_sort_key(0)))
+        holders = cursor.fetchall()
+        cursor.close()
+
+        for holder in holders:
+            holder["balance"] = int(holder["balance"])
+
+        return holders
+
+    def query_holder_balance(self, table_name: str, contract_address: str, holder_address: str) -> int:
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT balance FROM {table_name} WHERE contract_address = %s AND holder_address = %s", (contract_address, holder_address))
+        row = cursor.fetchone()
+        cursor.close()
+
+        return 0 if row is None else int(row[0])
+
+    def query_token_owner(self, table_name: str, contract_address: str, token_id: int) -> Union[str, None]:
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT owner_address FROM {table_name} WHERE contract_address = %s AND token_id = %s", (contract_address, str(token_id)))
+        row = cursor.fetchone()
+        cursor.close()
+
+        return None if row is None else row[0]
+
+    def query_owner_tokens(self, table_name: str, contract_address: str, owner_address: str) -> list:
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT token_id FROM {table_name} WHERE contract_address = %s AND owner_address = %s", (contract_address, owner_address))
+        token_ids = [int(row[0]) for row in cursor.fetchall()]
+        cursor.close()
+
+        return token_ids
+
+    # Token Provenance Functions
+
+    def upsert_token_provenance(self, table_name: str, intervals: list, batch_size: int = 10000, commit: bool = True):
+        """
+        Insert or replace ownership intervals (tuples of contract_address, token_id, from_block, log_index, owner_address, to_block).
+        """
+        if len(intervals) == 0:
+            return
+
+        self.use_database(self.db_name)
+
+        insert_query = (
+            f"INSERT INTO {table_name} (contract_address, token_id, from_block, log_index, owner_address, to_block) VALUES (%s, %s, %s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE owner_address = VALUES(owner_address), to_block = VALUES(to_block)")
+
+        cursor = self.connection.cursor()
+        for batch_start in range(0, len(intervals), batch_size):
+            cursor.executemany(insert_query, [(contract_address, str(token_id), from_block, log_index, owner_address, to_block)
+                                              for contract_address, token_id, from_block, log_index, owner_address, to_block in intervals[batch_start:batch_start + batch_size]])
+        if commit:
+            self.connection.commit()
+        cursor.close()
+
+    def update_token_provenance_to_blocks(self, table_name: str, token_keys: list, batch_size: int = 1000, commit: bool = True):
+        """
+        Set to_block of all intervals of the tokens (list of (contract_address, token_id)) to the from_block of the next interval.
+        """
+        if len(token_keys) == 0:
+            return
+
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        for batch_start in range(0, len(token_keys), batch_size):
+            batch = token_keys[batch_start:batch_start + batch_size]
+
+            key_slots = ", ".join(["(%s, %s)"] * len(batch))
+            cursor.execute(
+                f"UPDATE {table_name} AS interval_row JOIN ("
+                "SELECT contract_address, token_id, from_block, log_index, "
+                "LEAD(from_block) OVER (PARTITION BY contract_address, token_id ORDER BY from_block, log_index) AS next_from_block "
+                f"FROM {table_name} WHERE (contract_address, token_id) IN ({key_slots})"
+                ") AS next_interval USING (contract_address, token_id, from_block, log_index) "
+                "SET interval_row.to_block = next_interval.next_from_block",
+                [value for contract_address, token_id in batch for value in (contract_address, str(token_id))])
+        if commit:
+            self.connection.commit()
+        cursor.close()
+
+    def delete_token_provenance(self, table_name: str, token_keys: list, from_block: int, commit: bool = True):
+        # delete intervals of the tokens (list of (contract_address, token_id)) starting at or after from_block
+        if len(token_keys) == 0:
+            return
+
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.executemany(f"DELETE FROM {table_name} WHERE contract_address = %s AND token_id = %s AND from_block >= %s", [
+                           (contract_address, str(token_id), from_block) for contract_address, token_id in token_keys])
+        if commit:
+            self.connection.commit()
+        cursor.close()
+
+    def query_token_provenance(self, table_name: str, contract_address: str, token_id: int) -> list:
+        # return list of {owner_address, from_block, log_index, to_block} sorted by from_block
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor(dictionary=True)
+        cursor.execute(
+            f"SELECT owner_address, from_block, log_index, to_block FROM {table_name} WHERE contract_address = %s AND token_id = %s ORDER BY from_block, log_index", (contract_address, str(token_id)))
+        intervals = cursor.fetchall()
+        cursor.close()
+
+        return intervals
+
+    def query_owner_provenance(self, table_name: str, contract_address: str, owner_address: str) -> list:
+        # return list of {token_id, from_block, to_block} of all tokens the address owned
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor(dictionary=True)
+        cursor.execute(
+            f"SELECT token_id, from_block, to_block FROM {table_name} WHERE contract_address = %s AND owner_address = %s", (contract_address, owner_address))
+        intervals = cursor.fetchall()
+        cursor.close()
+
+        for interval in intervals:
+            interval["token_id"] = int(interval["token_id"])
+
+        return intervals
+
+    def query_token_owner_at_block(self, table_name: str, contract_address: str, token_id: int, block_number: int) -> Union[str, None]:
+        # owner after all transfers of block_number (None if the token did not exist yet)
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT owner_address FROM {table_name} WHERE contract_address = %s AND token_id = %s AND from_block <= %s ORDER BY from_block DESC, log_index DESC LIMIT 1",
+            (contract_address, str(token_id), block_number))
+        row = cursor.fetchone()
+        cursor.close()
+
+        return None if row is None else row[0]
+
+    # Block Functions
+
+    def insert_unfinalized_blocks(self, table_name: str, block_hashes: dict):
+        """
+        Insert or replace block hashes ({block_number: block_hash}).
+        """
+        if len(block_hashes) == 0:
+            return
+
+        self.use_database(self.db_name)
+
+        insert_query = f"REPLACE INTO {table_name} (block_number, block_hash) VALUES (%s, %s)"
+
+        cursor = self.connection.cursor()
+        cursor.executemany(insert_query, list(block_hashes.items()))
+        self.connection.commit()
+        cursor.close()
+
+    def query_block_numbers(self, table_name: str, from_block: int, to_block: int) -> set:
+        # block numbers in the table with from_block <= block_number <= to_block
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT block_number FROM {table_name} WHERE block_number >= %s AND block_number <= %s", (from_block, to_block))
+        block_numbers = {row[0] for row in cursor.fetchall()}
+        cursor.close()
+
+        return block_numbers
+
+    def query_unfinalized_blocks(self, table_name: str) -> list:
+        # return list of (block_number, block_hash) sorted by block_number descending
+        self.use_database(self.db_name)
+
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT block_number, block_hash FROM {table_name} ORDER BY block_number DESC")
+        blocks = cursor.fetchall()
+        cursor.close()
+
+        return blocks
@@ -0,0 +1,45 @@
+from enum import Enum
+from functools import lru_cache
+import json
+import os
+
+
+# token_standard directory next to the connectors package (independent of the working directory)
+TOKEN_STANDARD_DIR = os.path.join(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))), "token_standard")
+
+# one abi file per standard in TOKEN_STANDARD_DIR (same order as the contract table columns)
+TOKEN_STANDARD_NAMES = (
+    "ERC20",
+    "ERC20Metadata",
+    "ERC165",
+    "ERC721",
+    "ERC721Enumerable",
+    "ERC721Metadata",
+    "ERC777Token",
+    "ERC1155",
+    "ERC1155TokenReceiver"
+)
+
+TokenStandard = Enum("TokenStandard", [(token_standard_name, token_standard_name)
+                     for token_standard_name in TOKEN_STANDARD_NAMES])
+
+
+@lru_cache(maxsize=None)
+def load_token_standard_abi(token_standard_name: str) -> list:
+    # abi files are read on first use only
+    with open(os.path.join(TOKEN_STANDARD_DIR, f"{token_standard_name}.json"), "r") as f:
+        return json.load(f)
+
+
+def get_token_standards() -> dict:
+    return {token_standard.name: load_token_standard_abi(token_standard.name) for token_standard in TokenStandard}
+
+
+@lru_cache(maxsize=None)
+def get_token_standard_function_names() -> dict:
+    """
+    Return {token standard name: frozenset of function names} for implemented standard checks.
+    """
+    return {token_standard_name: frozenset(function_abi["name"] for function_abi in token_standard_abi)
+            for token_standard_name, token_standard_abi in get_token_standards().items()}
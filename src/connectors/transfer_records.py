@@ -0,0 +1,122 @@
+from functools import lru_cache
+from typing import NamedTuple, Union
+
+
+# columns of the transaction table in order of the record fields
+TRANSFER_RECORD_FIELDS = ["transaction_hash", "contract_address", "token_id", "value",
+                          "from_address", "to_address", "block_number", "block_hash", "log_index"]
+
+
+class TransferRecord(NamedTuple):
+    """
+    Decoded Transfer log (one row of the transaction table).
+    Records are plain tuples, so they are passed to executemany without conversion.
+    """
+    transaction_hash: str
+    contract_address: str
+    token_id: Union[int, None]
+    value: Union[str, None]
+    from_address: str
+    to_address: str
+    block_number: int
+    block_hash: Union[str, None]
+    log_index: int
+
+
+class TransferLayout(NamedTuple):
+    """
+    Position of the Transfer event arguments (from, to, amount) in a raw log, derived from the event abi.
+    Every position is (in_topics, index), index is the topic index or the hex offset in the data.
+    The amount is stored in 'amount_field' ("token_id" or "value").
+    """
+    argument_names: tuple
+    amount_field: str
+    positions: tuple
+    topic_count: int
+    data_length: int
+
+
+@lru_cache(maxsize=65536)
+def _checksum_address(address: str) -> str:
+    # holders and contracts repeat a lot, keccak hashing is the most expensive part of decoding
+    # (imported here, the record type is used without web3 by the collector)
+    from eth_utils import to_checksum_address
+    return to_checksum_address(address)
+
+
+# amount argument names (lower case, without leading underscores) of the EIP-20 / EIP-721 interfaces and common copies
+TOKEN_ID_ARGUMENT_NAMES = {"tokenid", "id"}
+VALUE_ARGUMENT_NAMES = {"value", "amount", "wad", "tokens"}
+
+
+def get_amount_field(argument_name: str, in_topics: bool) -> str:
+    """
+    Return the record field of the amount argument of a Transfer event.
+    Known names decide (like the abi decoded events), otherwise the position: an indexed amount is a token id (EIP-721),
+    an amount in the data is a value (EIP-20).
+    """
+    normalized_name = argument_name.lstrip("_").lower()
+    if normalized_name in TOKEN_ID_ARGUMENT_NAMES:
+        return "token_id"
+    if normalized_name in VALUE_ARGUMENT_NAMES:
+        return "value"
+    return "token_id" if in_topics else "value"
+
+
+def build_transfer_layout(contract_abi: list) -> Union[TransferLayout, None]:
+    """
+    Return the layout of the Transfer(address, address, uint256) event of the abi or None if it has no such event.
+    """
+    for entry in contract_abi:
+        if entry.get("type") != "event" or entry.get("name") != "Transfer":
+            continue
+
+        inputs = entry.get("inputs", [])
+        if [event_input["type"] for event_input in inputs] != ["address", "address", "uint256"]:
+            continue
+
+        positions = []
+        topic_index = 1
+        data_offset = 2
+        for event_input in inputs:
+            if event_input.get("indexed", False):
+                positions.append((True, topic_index))
+                topic_index += 1
+            else:
+                positions.append((False, data_offset))
+                data_offset += 64
+
+        argument_names = tuple(event_input.get("name", "") for event_input in inputs)
+        return TransferLayout(argument_names, get_amount_field(argument_names[2], positions[2][0]), tuple(positions), topic_index, data_offset)
+
+    return None
+
+
+def decode_transfer_log(log: dict, layout: TransferLayout, finalized_block: Union[int, None] = None) -> Union[TransferRecord, None]:
+    """
+    Decode a raw eth_getLogs result (hex strings) into a record, None if the log does not match the layout.
+    The amount is the token_id or the value depending on the amount field of the layout.
+    The block hash is only kept for blocks above the finalized block (all blocks if it is unknown).
+    """
+    topics = log["topics"]
+    data = log["data"]
+    if len(topics) != layout.topic_count or len(data) != layout.data_length:
+        return None
+
+    words = [topics[index][2:] if in_topics else data[index:index + 64]
+             for in_topics, index in layout.positions]
+
+    amount = int(words[2], 16)
+    block_number = int(log["blockNumber"], 16)
+
+    return TransferRecord(
+        log["transactionHash"],
+        _checksum_address(log["address"]),
+        amount if layout.amount_field == "token_id" else None,
+        str(amount) if layout.amount_field == "value" else None,
+        _checksum_address("0x" + words[0][24:]),
+        _checksum_address("0x" + words[1][24:]),
+        block_number,
+        log["blockHash"] if finalized_block is None or block_number > finalized_block else None,
+        int(log["logIndex"], 16)
+    )
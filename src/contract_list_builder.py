@@ -1,41 +1,51 @@
+from connectors import SqlDatabaseConnector
+from collector import ContractRegistry
+import db_params.sql_tables as tables
+import config
+import argparse
 import json
+import logging
 import os
 
+logging.basicConfig(level=logging.INFO)
+
 if __name__ == "__main__":
-    with open("src/process_data/contract_list_etherscan.json", "r") as f:
-        contract_list_etherscan: list = json.load(f)
-    with open("src/process_data/contract_list_opensea.json", "r") as f:
-        contract_list_opensea: list = json.load(f)
+    parser = argparse.ArgumentParser(
+        description="Merge contract lists into the contract registry.")
+    parser.add_argument("--source", action="append", default=[],
+                        help="additional contract list as <source name>=<json file> (can be repeated)")
+    args = parser.parse_args()
 
-    contract_list = []
+    contract_lists = {}
+
+    # legacy list with collection state of earlier runs
     if os.path.isfile("src/process_data/contract_list.json"):
         with open("src/process_data/contract_list.json", "r") as f:
-            contract_list: list = json.load(f)
-
-    contract_address_list = []
-    if len(contract_list) != 0:
-        contract_address_list = [c["address"] for c in contract_list]
+            contract_lists["contract_list"] = json.load(f)
 
-    etherscan_only_contract_list = [i for i in contract_list_etherscan if i["address"]
-                                    not in [i2["address"] for i2 in contract_list_opensea]]
-
-    new_contract_list = contract_list_opensea.copy()
-    new_contract_list.extend(etherscan_only_contract_list)
-
-    for contract in new_contract_list:
-        if contract["address"] not in contract_address_list:
-            contract["source"] = []
+    with open("src/process_data/contract_list_opensea.json", "r") as f:
+        contract_lists["opensea"] = json.load(f)
+    with open("src/process_data/contract_list_etherscan.json", "r") as f:
+        contract_lists["etherscan"] = json.load(f)
 
-            if contract["address"] in [i["address"] for i in contract_list_etherscan]:
-                contract["source"].append("etherscan")
+    for source in args.source:
+        source_name, source_path = source.split("=", 1)
+        with open(source_path, "r") as f:
+            contract_lists[source_name] = json.load(f)
 
-            if contract["address"] in [i["address"] for i in contract_list_opensea]:
-                contract["source"].append("opensea")
+    sql_db_connector = SqlDatabaseConnector(
+        config.SQL_DATABASE_HOST,
+        config.SQL_DATABASE_PORT,
+        config.SQL_DATABASE_USER,
+        config.SQL_DATABASE_PASSWORD,
+        config.SQL_DATABASE_NAME,
+        [tables.CONTRACT_REGISTRY_TABLE]
+    )
 
-            contract["collected"] = False
-            contract["error"] = False
+    contract_registry = ContractRegistry(
+        sql_db_connector, config.SQL_DATABASE_TABLE_CONTRACT_REGISTRY)
 
-            contract_list.append(contract)
+    contract_registry.register_contracts(contract_lists)
 
-    with open("src/process_data/contract_list.json", "w") as f:
-        json.dump(contract_list, f, indent=4)
+    logging.info(
+        f"Contract registry status: {contract_registry.get_status_counts()}")
@@ -14,18 +14,172 @@ CONTRACT_TABLE = (
     "ERC777Token bool NOT NULL DEFAULT FALSE,"
     "ERC1155 bool NOT NULL DEFAULT FALSE,"
     "ERC1155TokenReceiver bool NOT NULL DEFAULT FALSE,"
-    "abi json DEFAULT NULL"
+    "abi_hash char(66) DEFAULT NULL,"
+    "INDEX (abi_hash)"
     ")"
 )
 
+# abis stored once per canonical hash (contract.abi_hash)
+ABI_TABLE = (
+    "abi ("
+    "abi_hash char(66) PRIMARY KEY NOT NULL,"
+    "abi json NOT NULL"
+    ")"
+)
+
+# one row per Transfer log, a transaction can emit many (batch mints, airdrops, swaps)
 TRANSACTION_TABLE = (
     "transaction ("
-    "transaction_hash char(66) PRIMARY KEY UNIQUE NOT NULL,"
+    "transaction_hash char(66) NOT NULL,"
     "contract_address char(42) NOT NULL,"
     "token_id int DEFAULT NULL,"
     "value varchar(100) DEFAULT NULL,"
     "from_address char(42) NOT NULL,"
     "to_address char(42) NOT NULL,"
-    "block_number int NOT NULL"
+    "block_number int NOT NULL,"
+    "block_hash char(66) DEFAULT NULL,"
+    "log_index int NOT NULL,"
+    "PRIMARY KEY (transaction_hash, log_index),"
+    "INDEX (block_number),"
+    "INDEX contract_block (contract_address, block_number),"
+    "INDEX from_activity (from_address, block_number, contract_address),"
+    "INDEX to_activity (to_address, block_number, contract_address)"
+    ")"
+)
+
+# hashes of ingested blocks above the finalized block (for reorg detection)
+UNFINALIZED_BLOCK_TABLE = (
+    "unfinalized_block ("
+    "block_number int PRIMARY KEY NOT NULL,"
+    "block_hash char(66) NOT NULL"
+    ")"
+)
+
+# collection state of all known contracts
+CONTRACT_REGISTRY_TABLE = (
+    "contract_registry ("
+    "contract_address char(42) PRIMARY KEY NOT NULL,"
+    "name varchar(200) DEFAULT NULL,"
+    "source varchar(200) DEFAULT NULL,"
+    "status varchar(20) NOT NULL DEFAULT 'pending',"
+    "last_block int DEFAULT NULL,"
+    "error varchar(1000) DEFAULT NULL,"
+    "claim_id char(32) DEFAULT NULL,"
+    "worker varchar(100) DEFAULT NULL,"
+    "updated_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,"
+    "INDEX (status),"
+    "INDEX (claim_id)"
+    ")"
+)
+
+# block range shards of contracts, claimed by workers with expiring leases
+COLLECTION_JOB_TABLE = (
+    "collection_job ("
+    "job_id bigint AUTO_INCREMENT PRIMARY KEY,"
+    "contract_address char(42) NOT NULL,"
+    "from_block int NOT NULL,"
+    "to_block int NOT NULL,"
+    "status varchar(20) NOT NULL DEFAULT 'pending',"
+    "lease_id char(32) DEFAULT NULL,"
+    "worker varchar(100) DEFAULT NULL,"
+    "lease_expires_at datetime DEFAULT NULL,"
+    "attempts int NOT NULL DEFAULT 0,"
+    "error varchar(1000) DEFAULT NULL,"
+    "batch_addresses text DEFAULT NULL,"
+    "estimated_logs int DEFAULT NULL,"
+    "UNIQUE (contract_address, from_block),"
+    "INDEX (status, lease_expires_at),"
+    "INDEX (lease_id)"
+    ")"
+)
+
+# current balance per holder (ERC20 value, ERC721 token count), maintained from the transaction table
+# balance_sort is the balance as fixed width string (offset by 10^78) for indexed ordering
+HOLDER_BALANCE_TABLE = (
+    "holder_balance ("
+    "contract_address char(42) NOT NULL,"
+    "holder_address char(42) NOT NULL,"
+    "balance varchar(80) NOT NULL,"
+    "balance_sort char(79) NOT NULL,"
+    "PRIMARY KEY (contract_address, holder_address),"
+    "INDEX contract_balance (contract_address, balance_sort)"
+    ")"
+)
+
+# current owner per ERC721 token, maintained from the transaction table
+TOKEN_OWNER_TABLE = (
+    "token_owner ("
+    "contract_address char(42) NOT NULL,"
+    "token_id varchar(78) NOT NULL,"
+    "owner_address char(42) NOT NULL,"
+    "block_number int NOT NULL,"
+    "PRIMARY KEY (contract_address, token_id),"
+    "INDEX contract_owner (contract_address, owner_address)"
+    ")"
+)
+
+# ownership intervals per ERC721 token: owner_address owned the token from the transfer at (from_block, log_index)
+# until the next transfer in to_block (NULL for the current owner)
+TOKEN_PROVENANCE_TABLE = (
+    "token_provenance ("
+    "contract_address char(42) NOT NULL,"
+    "token_id varchar(78) NOT NULL,"
+    "from_block int NOT NULL,"
+    "log_index int NOT NULL,"
+    "owner_address char(42) NOT NULL,"
+    "to_block int DEFAULT NULL,"
+    "PRIMARY KEY (contract_address, token_id, from_block, log_index),"
+    "INDEX contract_owner (contract_address, owner_address)"
+    ")"
+)
+
+# chain wide tables of the block ingestion (ingest_blocks.py)
+# fee and value columns are decimal(38,0): wei amounts are bounded by the ether supply
+BLOCK_TABLE = (
+    "block ("
+    "block_number int PRIMARY KEY NOT NULL,"
+    "block_hash char(66) NOT NULL,"
+    "parent_hash char(66) NOT NULL,"
+    "timestamp int NOT NULL,"
+    "miner char(42) NOT NULL,"
+    "gas_used bigint unsigned NOT NULL,"
+    "gas_limit bigint unsigned NOT NULL,"
+    "base_fee_per_gas decimal(38,0) DEFAULT NULL,"
+    "transaction_count int NOT NULL,"
+    "size int NOT NULL"
+    ")"
+)
+
+BLOCK_TRANSACTION_TABLE = (
+    "block_transaction ("
+    "transaction_hash char(66) PRIMARY KEY NOT NULL,"
+    "block_number int NOT NULL,"
+    "transaction_index int NOT NULL,"
+    "transaction_type tinyint NOT NULL,"
+    "from_address char(42) NOT NULL,"
+    "to_address char(42) DEFAULT NULL,"
+    "value decimal(38,0) NOT NULL,"
+    "nonce bigint unsigned NOT NULL,"
+    "gas bigint unsigned NOT NULL,"
+    "gas_price decimal(38,0) DEFAULT NULL,"
+    "max_fee_per_gas decimal(38,0) DEFAULT NULL,"
+    "max_priority_fee_per_gas decimal(38,0) DEFAULT NULL,"
+    "method_id char(10) DEFAULT NULL,"
+    "input_size int NOT NULL,"
+    "INDEX (block_number)"
+    ")"
+)
+
+RECEIPT_TABLE = (
+    "receipt ("
+    "transaction_hash char(66) PRIMARY KEY NOT NULL,"
+    "block_number int NOT NULL,"
+    "status tinyint DEFAULT NULL,"
+    "gas_used bigint unsigned NOT NULL,"
+    "cumulative_gas_used bigint unsigned NOT NULL,"
+    "effective_gas_price decimal(38,0) DEFAULT NULL,"
+    "contract_address char(42) DEFAULT NULL,"
+    "log_count int NOT NULL,"
+    "INDEX (block_number)"
     ")"
 )
@@ -0,0 +1,47 @@
+from connectors import SqlDatabaseConnector
+from exporters import ParquetExporter
+import config
+import db_params.sql_tables as tables
+import argparse
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export the transaction table into a parquet dataset.")
+    parser.add_argument("--contract", action="append", default=None,
+                        help="contract address to export (can be repeated, default: all contracts)")
+    parser.add_argument("--from-block", type=int, default=None,
+                        help="first block to export")
+    parser.add_argument("--to-block", type=int, default=None,
+                        help="last block to export (capped at the finalized block)")
+    parser.add_argument("--export-dir", default=config.EXPORT_DIR,
+                        help="directory of the parquet dataset")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the last exported blocks of previous runs")
+    args = parser.parse_args()
+
+    sql_db_connector = SqlDatabaseConnector(
+        config.SQL_DATABASE_HOST,
+        config.SQL_DATABASE_PORT,
+        config.SQL_DATABASE_USER,
+        config.SQL_DATABASE_PASSWORD,
+        config.SQL_DATABASE_NAME,
+        [tables.COLLECTION_JOB_TABLE]
+    )
+
+    parquet_exporter = ParquetExporter(
+        sql_db_connector,
+        config.SQL_DATABASE_TABLE_TRANSACTION,
+        config.SQL_DATABASE_TABLE_UNFINALIZED_BLOCK,
+        args.export_dir,
+        config.EXPORT_BLOCK_BUCKET_SIZE,
+        collection_job_table_name=config.SQL_DATABASE_TABLE_COLLECTION_JOB
+    )
+
+    exported_rows = parquet_exporter.export(
+        args.contract, args.from_block, args.to_block, not args.full)
+
+    logging.info(
+        f"Export done: {sum(exported_rows.values())} rows of {len(exported_rows)} contracts")
@@ -0,0 +1,2 @@
+# __init__.py
+from .parquet_exporter import ParquetExporter
@@ -0,0 +1,218 @@
+from connectors import SqlDatabaseConnector
+from decimal import Decimal
+from typing import Union
+import pyarrow as pa
+import pyarrow.dataset as ds
+import json
+import logging
+import os
+import time
+
+
+# transaction table fields in export order
+EXPORT_FIELDS = ["transaction_hash", "contract_address", "token_id",
+                 "value", "from_address", "to_address", "block_number"]
+
+# uint256 does not fit into decimal256 in every case (>= 10^76 is exported as null)
+MAX_EXPORT_VALUE = 10 ** 76
+
+TRANSACTION_SCHEMA = pa.schema([
+    ("transaction_hash", pa.binary(32)),
+    ("token_id", pa.int64()),
+    ("value", pa.decimal256(76, 0)),
+    ("from_address", pa.binary(20)),
+    ("to_address", pa.binary(20)),
+    ("block_number", pa.uint32()),
+    # partition columns
+    ("contract_address", pa.string()),
+    ("block_bucket", pa.uint32())
+])
+
+
+def _hex_to_bytes(value: str) -> bytes:
+    return bytes.fromhex(value[2:])
+
+
+def _to_decimal(value: Union[str, None]) -> Union[Decimal, None]:
+    if value is None:
+        return None
+    value = int(value)
+    if value >= MAX_EXPORT_VALUE:
+        return None
+    return Decimal(value)
+
+
+class ParquetExporter:
+    """
+    Stream the transaction table into a parquet dataset partitioned by contract address and block bucket
+    (<export_dir>/contract_address=<address>/block_bucket=<first block>/part-<run>-<n>.parquet).
+
+    Every run appends new files. The last exported block of every contract is kept in _export_state.json,
+    so the next run only exports newer blocks. Blocks above the finalized block (still in the unfinalized block table)
+    are never exported, which keeps appended files free of rows that can be rolled back. With a collection job table,
+    blocks of a contract are only exported below its first unfinished job (shards of the work queue finish out of order).
+    """
+
+    def __init__(self,
+                 sql_db_connector: SqlDatabaseConnector,
+                 transaction_table_name: str,
+                 unfinalized_block_table_name: str,
+                 export_dir: str,
+                 block_bucket_size: int = 100000,
+                 chunk_size: int = 100000,
+                 collection_job_table_name: Union[str, None] = None
+                 ) -> None:
+        self.sql_db_connector = sql_db_connector
+        self.transaction_table_name = transaction_table_name
+        self.unfinalized_block_table_name = unfinalized_block_table_name
+        self.export_dir = export_dir
+        self.block_bucket_size = block_bucket_size
+        self.chunk_size = chunk_size
+        self.collection_job_table_name = collection_job_table_name
+
+        self.state_path = os.path.join(export_dir, "_export_state.json")
+
+    def load_state(self) -> dict:
+        if not os.path.isfile(self.state_path):
+            return {"last_block": {}}
+
+        with open(self.state_path, "r") as f:
+            return json.load(f)
+
+    def save_state(self, state: dict):
+        os.makedirs(self.export_dir, exist_ok=True)
+
+        # write to temp file first, a crash must not corrupt the state
+        with open(f"{self.state_path}.tmp", "w") as f:
+            json.dump(state, f, indent=4)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+
+    def get_export_to_block(self, to_block: Union[int, None] = None) -> Union[int, None]:
+        unfinalized_blocks = self.sql_db_connector.query_unfinalized_blocks(
+            self.unfinalized_block_table_name)
+
+        if len(unfinalized_blocks) == 0:
+            return to_block
+
+        # blocks are sorted descending
+        last_safe_block = unfinalized_blocks[-1][0] - 1
+
+        if to_block is None:
+            return last_safe_block
+        return min(to_block, last_safe_block)
+
+    def get_contract_export_to_block(self, contract_address: str, to_block: Union[int, None]) -> Union[int, None]:
+        # blocks from the first unfinished job on may still get rows (lower shards can finish after higher ones)
+        if self.collection_job_table_name is None:
+            return to_block
+
+        open_from_block = self.sql_db_connector.query_open_collection_job_from_block(
+            self.collection_job_table_name, contract_address)
+
+        if open_from_block is None:
+            return to_block
+        if to_block is None:
+            return open_from_block - 1
+        return min(to_block, open_from_block - 1)
+
+    def export(self,
+               contract_addresses: Union[list, None] = None,
+               from_block: Union[int, None] = None,
+               to_block: Union[int, None] = None,
+               incremental: bool = True) -> dict:
+        """
+        Export transactions of the given contracts (all contracts if None) and return the number of exported rows per contract.
+
+        * from_block (optional): first block to export, with 'incremental' the block after the last exported block is used if higher
+        * to_block (optional): last block to export, capped at the last finalized block (and the first unfinished job of every contract)
+        """
+        if contract_addresses is None:
+            contract_addresses = self.sql_db_connector.query_transaction_contract_addresses(
+                self.transaction_table_name)
+
+        to_block = self.get_export_to_block(to_block)
+
+        state = self.load_state()
+        run_id = time.strftime("%Y%m%dT%H%M%S")
+
+        exported_rows = {}
+
+        for contract_address in contract_addresses:
+            contract_from_block = from_block
+            contract_to_block = self.get_contract_export_to_block(
+                contract_address, to_block)
+            last_exported_block = state["last_block"].get(contract_address)
+
+            if incremental and last_exported_block is not None:
+                if contract_from_block is None or contract_from_block <= last_exported_block:
+                    contract_from_block = last_exported_block + 1
+
+            if contract_to_block is not None and contract_from_block is not None and contract_from_block > contract_to_block:
+                exported_rows[contract_address] = 0
+                continue
+
+            exported_rows[contract_address] = 0
+            max_block = {"block_number": None}
+
+            def record_batches():
+                chunks = self.sql_db_connector.query_transaction_data_chunks(
+                    self.transaction_table_name, EXPORT_FIELDS, contract_address, contract_from_block, contract_to_block, self.chunk_size)
+
+                for chunk in chunks:
+                    exported_rows[contract_address] += len(chunk)
+                    record_batch = self.to_record_batch(chunk)
+
+                    chunk_max_block = max(row[6] for row in chunk)
+                    if max_block["block_number"] is None or chunk_max_block > max_block["block_number"]:
+                        max_block["block_number"] = chunk_max_block
+
+                    yield record_batch
+
+            ds.write_dataset(
+                pa.RecordBatchReader.from_batches(
+                    TRANSACTION_SCHEMA, record_batches()),
+                self.export_dir,
+                format="parquet",
+                partitioning=ds.partitioning(pa.schema([
+                    ("contract_address", pa.string()),
+                    ("block_bucket", pa.uint32())
+                ]), flavor="hive"),
+                basename_template=f"part-{run_id}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore"
+            )
+
+            # with an explicit to_block everything up to it is exported even without rows
+            if contract_to_block is not None:
+                max_block["block_number"] = contract_to_block if max_block["block_number"] is None else max(
+                    max_block["block_number"], contract_to_block)
+
+            if max_block["block_number"] is not None:
+                state["last_block"][contract_address] = max(
+                    max_block["block_number"], last_exported_block if last_exported_block is not None else -1)
+                self.save_state(state)
+
+            logging.info(
+                f"Transactions exported: {contract_address} ({exported_rows[contract_address]} rows)")
+
+        return exported_rows
+
+    def to_record_batch(self, chunk: list) -> pa.RecordBatch:
+        """
+        Convert rows (in order of EXPORT_FIELDS) into a typed record batch.
+        """
+        transaction_hashes, contract_addresses, token_ids, values, from_addresses, to_addresses, block_numbers = zip(
+            *chunk)
+
+        return pa.RecordBatch.from_arrays([
+            pa.array([_hex_to_bytes(h)
+                     for h in transaction_hashes], pa.binary(32)),
+            pa.array(token_ids, pa.int64()),
+            pa.array([_to_decimal(v)
+                     for v in values], pa.decimal256(76, 0)),
+            pa.array([_hex_to_bytes(a)
+                     for a in from_addresses], pa.binary(20)),
+            pa.array([_hex_to_bytes(a) for a in to_addresses], pa.binary(20)),
+            pa.array(block_numbers, pa.uint32()),
+            pa.array(contract_addresses, pa.string()),
+            pa.array([block_number - block_number % self.block_bucket_size for block_number in block_numbers], pa.uint32())
+        ], schema=TRANSACTION_SCHEMA)
@@ -0,0 +1,60 @@
+from connectors import SqlDatabaseConnector, ExecutionClientConnector, RetryHandler
+from collector import BlockIngester
+import config
+import db_params.sql_tables as tables
+import argparse
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Ingest blocks, transactions and receipts of a block range (blocks already ingested are skipped).")
+    parser.add_argument("--from-block", type=int, required=True,
+                        help="first block to ingest")
+    parser.add_argument("--to-block", type=int, default=None,
+                        help="last block to ingest (default: finalized block)")
+    parser.add_argument("--batch-size", type=int, default=config.BLOCK_INGESTION_BATCH_SIZE,
+                        help="blocks per json-rpc batch")
+    parser.add_argument("--workers", type=int, default=config.BLOCK_INGESTION_WORKERS,
+                        help="concurrent batch requests")
+    args = parser.parse_args()
+
+    sql_db_connector = SqlDatabaseConnector(
+        config.SQL_DATABASE_HOST,
+        config.SQL_DATABASE_PORT,
+        config.SQL_DATABASE_USER,
+        config.SQL_DATABASE_PASSWORD,
+        config.SQL_DATABASE_NAME,
+        [tables.BLOCK_TABLE, tables.BLOCK_TRANSACTION_TABLE, tables.RECEIPT_TABLE]
+    )
+
+    retry_handler = RetryHandler(
+        config.RPC_MAX_RETRIES,
+        config.RPC_RETRY_BASE_DELAY,
+        config.RPC_RETRY_MAX_DELAY,
+        config.RPC_CIRCUIT_FAILURE_THRESHOLD,
+        config.RPC_CIRCUIT_RESET_TIMEOUT
+    )
+
+    # local node, full blocks are not cached
+    execution_client_url = f"http://{config.EXECUTION_CLIENT_IP}:{config.EXECUTION_CLIENT_PORT}"
+    execution_client = ExecutionClientConnector(
+        execution_client_url, config.ETHERSCAN_URL, config.ETHERSCAN_API_KEY, sql_db_connector, config.SQL_DATABASE_TABLE_CONTRACT, retry_handler, abi_table_name=config.SQL_DATABASE_TABLE_ABI)
+
+    # only finalized blocks are ingested by default (no reorg handling for the block tables)
+    to_block = args.to_block if args.to_block is not None else execution_client.update_finality_watermark()
+
+    block_ingester = BlockIngester(
+        execution_client,
+        sql_db_connector,
+        config.SQL_DATABASE_TABLE_BLOCK,
+        config.SQL_DATABASE_TABLE_BLOCK_TRANSACTION,
+        config.SQL_DATABASE_TABLE_RECEIPT,
+        args.batch_size,
+        args.workers
+    )
+
+    block_ingester.ingest(args.from_block, to_block)
+
+    logging.info(f"RPC retry stats: {retry_handler.stats()}")
@@ -1,13 +1,18 @@
-from connectors import SqlDatabaseConnector, ExecutionClientConnector, ConsensusClientConnector
+from connectors import SqlDatabaseConnector, ExecutionClientConnector, ConsensusClientConnector, RetryHandler, RpcCache, EpochCache, LogBloomFilter, metrics, profiler
+from connectors.execution_client_connector import TRANSFER_EVENT_TOPIC
+from connectors.transfer_records import decode_transfer_log
+from collector import HolderBalances, ProvenanceIndex, TransferDeduplicator, ReorgTracker, ContractRegistry, WorkQueue, LeaseLostError, CollectionPlanner, TransactionWriter, get_block_hashes
 import config
 import db_params.sql_tables as tables
-from web3.exceptions import NoABIFound, ABIFunctionNotFound
+from web3.exceptions import NoABIFound, ABIFunctionNotFound, ABIEventFunctionNotFound
+import argparse
 import json
 from typing import Union
 import config
 import logging
-
-filter_coontract_list = True
+import os
+import sys
+import time
 
 logging.basicConfig(level=logging.INFO)
 
@@ -18,23 +23,118 @@ sql_db_connector = SqlDatabaseConnector(
     config.SQL_DATABASE_USER,
     config.SQL_DATABASE_PASSWORD,
     config.SQL_DATABASE_NAME,
-    [tables.CONTRACT_TABLE, tables.TRANSACTION_TABLE]
+    [tables.CONTRACT_TABLE, tables.TRANSACTION_TABLE,
+        tables.UNFINALIZED_BLOCK_TABLE, tables.CONTRACT_REGISTRY_TABLE, tables.COLLECTION_JOB_TABLE,
+        tables.HOLDER_BALANCE_TABLE, tables.TOKEN_OWNER_TABLE, tables.TOKEN_PROVENANCE_TABLE, tables.ABI_TABLE]
+)
+# contract tables created by older versions (abi per row)
+sql_db_connector.add_column(
+    config.SQL_DATABASE_TABLE_CONTRACT, "abi_hash char(66) DEFAULT NULL")
+sql_db_connector.add_index(
+    config.SQL_DATABASE_TABLE_CONTRACT, "abi_hash", ["abi_hash"])
+sql_db_connector.migrate_contract_abis(
+    config.SQL_DATABASE_TABLE_CONTRACT, config.SQL_DATABASE_TABLE_ABI)
+# job tables created by older versions
+sql_db_connector.add_column(
+    config.SQL_DATABASE_TABLE_COLLECTION_JOB, "batch_addresses text DEFAULT NULL")
+sql_db_connector.add_column(
+    config.SQL_DATABASE_TABLE_COLLECTION_JOB, "estimated_logs int DEFAULT NULL")
+# transaction tables created by older versions
+sql_db_connector.add_column(
+    config.SQL_DATABASE_TABLE_TRANSACTION, "block_hash char(66) DEFAULT NULL")
+sql_db_connector.add_column(
+    config.SQL_DATABASE_TABLE_TRANSACTION, "log_index int DEFAULT NULL")
+sql_db_connector.add_index(
+    config.SQL_DATABASE_TABLE_TRANSACTION, "block_number", ["block_number"])
+sql_db_connector.add_index(
+    config.SQL_DATABASE_TABLE_TRANSACTION, "contract_block", ["contract_address", "block_number"])
+sql_db_connector.add_index(
+    config.SQL_DATABASE_TABLE_TRANSACTION, "from_activity", ["from_address", "block_number", "contract_address"])
+sql_db_connector.add_index(
+    config.SQL_DATABASE_TABLE_TRANSACTION, "to_activity", ["to_address", "block_number", "contract_address"])
+# partitions of the transaction table are extended on inserts
+if config.SQL_TRANSACTION_PARTITION_BLOCKS is not None:
+    sql_db_connector.enable_block_partitions(
+        config.SQL_DATABASE_TABLE_TRANSACTION, config.SQL_TRANSACTION_PARTITION_BLOCKS)
+
+# init retry handler (shared by all connectors)
+retry_handler = RetryHandler(
+    config.RPC_MAX_RETRIES,
+    config.RPC_RETRY_BASE_DELAY,
+    config.RPC_RETRY_MAX_DELAY,
+    config.RPC_CIRCUIT_FAILURE_THRESHOLD,
+    config.RPC_CIRCUIT_RESET_TIMEOUT
 )
 
+# init rpc cache (shared by all execution clients)
+rpc_cache = RpcCache(config.RPC_CACHE_PATH, config.RPC_CACHE_MAX_SIZE)
+
 # init execution client
 execution_client_url = f"http://{config.EXECUTION_CLIENT_IP}:{config.EXECUTION_CLIENT_PORT}"
 execution_client = ExecutionClientConnector(
-    execution_client_url, config.ETHERSCAN_URL, config.ETHERSCAN_API_KEY, sql_db_connector, config.SQL_DATABASE_TABLE_CONTRACT)
+    execution_client_url, config.ETHERSCAN_URL, config.ETHERSCAN_API_KEY, sql_db_connector, config.SQL_DATABASE_TABLE_CONTRACT, retry_handler, rpc_cache, config.SQL_DATABASE_TABLE_ABI)
 
 # TODO: remove when node is fully synced -> currently used for contract endpoints only
 # init infura execution client
 infura_execution_client_url = f"{config.INFURA_URL}/{config.INFURA_API_KEY}"
 infura_execution_client = ExecutionClientConnector(
-    infura_execution_client_url, config.ETHERSCAN_URL, config.ETHERSCAN_API_KEY, sql_db_connector, config.SQL_DATABASE_TABLE_CONTRACT)
+    infura_execution_client_url, config.ETHERSCAN_URL, config.ETHERSCAN_API_KEY, sql_db_connector, config.SQL_DATABASE_TABLE_CONTRACT, retry_handler, rpc_cache, config.SQL_DATABASE_TABLE_ABI)
 
-# init conensus client
+# init conensus client (slot states of finalized epochs are cached)
+epoch_cache = EpochCache(config.EPOCH_CACHE_MAX_ENTRIES,
+                         config.EPOCH_CACHE_PATH, config.EPOCH_CACHE_MAX_SIZE)
 consensus_client = ConsensusClientConnector(
-    config.CONSENCUS_CLIENT_IP, config.CONSENSUS_CLIENT_PORT)
+    config.CONSENCUS_CLIENT_IP, config.CONSENSUS_CLIENT_PORT, retry_handler, epoch_cache, config.EPOCH_CACHE_PREFETCH)
+
+# init provenance index and holder balances (updated with every transaction insert)
+provenance_index = ProvenanceIndex(
+    sql_db_connector, config.SQL_DATABASE_TABLE_TRANSACTION, config.SQL_DATABASE_TABLE_TOKEN_PROVENANCE)
+holder_balances = HolderBalances(
+    sql_db_connector, config.SQL_DATABASE_TABLE_TRANSACTION, config.SQL_DATABASE_TABLE_HOLDER_BALANCE, config.SQL_DATABASE_TABLE_TOKEN_OWNER, provenance_index,
+    TransferDeduplicator(config.DEDUP_SEEN_CAPACITY, config.DEDUP_FALSE_POSITIVE_RATE))
+
+# init write-behind writer (own db connection, inserts run while the next logs are fetched)
+writer_sql_db_connector = SqlDatabaseConnector(
+    config.SQL_DATABASE_HOST,
+    config.SQL_DATABASE_PORT,
+    config.SQL_DATABASE_USER,
+    config.SQL_DATABASE_PASSWORD,
+    config.SQL_DATABASE_NAME,
+    []
+)
+if config.SQL_TRANSACTION_PARTITION_BLOCKS is not None:
+    writer_sql_db_connector.enable_block_partitions(
+        config.SQL_DATABASE_TABLE_TRANSACTION, config.SQL_TRANSACTION_PARTITION_BLOCKS)
+writer_holder_balances = HolderBalances(
+    writer_sql_db_connector, config.SQL_DATABASE_TABLE_TRANSACTION, config.SQL_DATABASE_TABLE_HOLDER_BALANCE, config.SQL_DATABASE_TABLE_TOKEN_OWNER,
+    ProvenanceIndex(writer_sql_db_connector, config.SQL_DATABASE_TABLE_TRANSACTION, config.SQL_DATABASE_TABLE_TOKEN_PROVENANCE),
+    TransferDeduplicator(config.DEDUP_SEEN_CAPACITY, config.DEDUP_FALSE_POSITIVE_RATE))
+transaction_writer = TransactionWriter(
+    writer_holder_balances, config.WRITER_QUEUE_CHUNKS, config.WRITER_FLUSH_ROWS, config.WRITER_FLUSH_INTERVAL)
+
+# init reorg tracker (finalized block from consensus client)
+reorg_tracker = ReorgTracker(
+    infura_execution_client, consensus_client, sql_db_connector, config.SQL_DATABASE_TABLE_TRANSACTION, config.SQL_DATABASE_TABLE_UNFINALIZED_BLOCK, holder_balances)
+
+# init contract registry (collection state of all contracts)
+contract_registry = ContractRegistry(
+    sql_db_connector, config.SQL_DATABASE_TABLE_CONTRACT_REGISTRY)
+
+# init work queue (block range shards for multiple workers)
+work_queue = WorkQueue(
+    sql_db_connector, config.SQL_DATABASE_TABLE_COLLECTION_JOB, config.QUEUE_LEASE_DURATION, config.QUEUE_MAX_ATTEMPTS)
+
+# init collection planner (job sizes and order by estimated transfers)
+collection_planner = CollectionPlanner(
+    infura_execution_client,
+    sql_db_connector,
+    config.SQL_DATABASE_TABLE_TRANSACTION,
+    config.PLANNER_SAMPLE_COUNT,
+    config.PLANNER_SAMPLE_BLOCKS,
+    config.PLANNER_TARGET_JOB_LOGS,
+    config.PLANNER_MAX_BATCH_CONTRACTS,
+    seconds_per_log=config.PLANNER_SECONDS_PER_LOG
+)
 
 
 def insert_contract_transactions(contract_address: str,
@@ -45,6 +145,8 @@ def insert_contract_transactions(contract_address: str,
                                  to_address: Union[str, None] = None,
                                  value: Union[int, None] = None,
                                  token_id: Union[int, None] = None,
+                                 on_checkpoint=None,
+                                 on_batch=None
                                  ):
     """
     Insert contract transactions into sql database.
@@ -55,6 +157,8 @@ def insert_contract_transactions(contract_address: str,
     * to_address (optional): to address of the transfer
     * value (optional): value of the transfer
     * token_id (optional): ID of the token
+    * on_checkpoint (optional): called with the last block whose transfers are committed (while inserting and at the end)
+    * on_batch (optional): called with the last block of every fetched batch (e.g. to renew a job lease)
 
     Transfers can be filtered either by 'value' or 'token_id' depending on the token standard (ERC20, ERC721, ...) of the contract. It is not possible to provide both values at the same time.
     """
@@ -74,65 +178,466 @@ def insert_contract_transactions(contract_address: str,
 
     # TODO: remove infura when syced
     try:
-        transactions = infura_execution_client.get_token_transfers(
-            contract_address,
+        record_batches = infura_execution_client.iter_transfer_records(
+            [contract_address],
             from_block,
             to_block,
-            argument_filters
+            argument_filters,
+            reorg_tracker.finalized_block
         )
     except NoABIFound:
         raise ValueError(
             f"Contract not found (contract_address: {contract_address})")
-    except ABIFunctionNotFound:
+    except (ABIFunctionNotFound, ABIEventFunctionNotFound):
         raise ValueError(
             f"Contract or ABI function not found (contract_address: {contract_address})")
 
-    logging.info(f"Contract transactions collected")
+    write_transfer_batches(record_batches, on_checkpoint, on_batch)
 
-    for index, transaction in enumerate(transactions):
-        transactions[index] = {
-            "transaction_hash": transaction["transactionHash"],
-            "contract_address": transaction["address"],
-            "from_address": transaction["args"]["from"],
-            "to_address": transaction["args"]["to"],
-            "block_number": transaction["blockNumber"]
-        }
-        if "tokenId" in transaction["args"]:
-            transactions[index]["token_id"] = transaction["args"]["tokenId"]
-        if "value" in transaction["args"]:
-            transactions[index]["value"] = transaction["args"]["value"]
+    logging.info(f"Contract transactions inserted in db")
 
-    sql_db_connector.insert_many_transaction_data(
-        config.SQL_DATABASE_TABLE_TRANSACTION, transactions)
 
-    logging.info(f"Contract transactions inserted in db")
+def write_transfer_batches(record_batches, on_checkpoint=None, on_batch=None) -> int:
+    """
+    Pass (batch_to_block, records) batches to the write-behind writer while the next batch is fetched.
+    All batches are committed when it returns (also if fetching fails). Return the number of records.
+    """
+    record_count = 0
+    try:
+        for batch_to_block, records in record_batches:
+            transaction_writer.put(records, batch_to_block)
+            reorg_tracker.record_blocks(get_block_hashes(records))
+            record_count += len(records)
 
+            if on_batch is not None:
+                on_batch(batch_to_block)
 
-if __name__ == "__main__":
-    # load contract list
-    with open("src/process_data/dao_contract_list.json", "r") as f:
-        contract_list = json.load(f)
+            checkpoint = transaction_writer.pop_checkpoint()
+            if checkpoint is not None and on_checkpoint is not None:
+                on_checkpoint(checkpoint)
+    except BaseException:
+        # commit the fetched batches, the fetch error is raised (not a failing flush)
+        try:
+            flush_transfer_batches(on_checkpoint)
+        except Exception as flush_error:
+            logging.error(
+                f"Error while flushing transfers after a failed fetch, error: {flush_error}")
+        raise
+
+    flush_transfer_batches(on_checkpoint)
+
+    return record_count
+
+
+def flush_transfer_batches(on_checkpoint=None):
+    transaction_writer.flush()
+
+    checkpoint = transaction_writer.pop_checkpoint()
+    if checkpoint is not None and on_checkpoint is not None:
+        on_checkpoint(checkpoint)
+
+
+def insert_transfers_of_contracts(contract_addresses: list, from_block: int, to_block: int, on_batch=None):
+    """
+    Insert transfers of all contracts with one eth_getLogs query per block range (batched jobs of small contracts).
+    """
+    write_transfer_batches(infura_execution_client.iter_transfer_records(
+        contract_addresses, from_block, to_block, finalized_block=reorg_tracker.finalized_block), on_batch=on_batch)
 
-    logging.info(f"Contracts loaded: {len(contract_list)} contracts")
+    logging.info(
+        f"Transactions of {len(contract_addresses)} contracts inserted in db")
 
-    for index, contract in enumerate([contract for contract in contract_list]):
+
+def follow_contract_transactions(contract_addresses: list,
+                                 from_block: Union[int, None] = None,
+                                 poll_interval: float = config.FOLLOW_POLL_INTERVAL
+                                 ):
+    """
+    Insert new transfers of all contracts while following the chain head (runs until stopped).
+
+    * from_block (optional): first block to follow from, defaults to the current head
+
+    New blocks are polled every 'poll_interval' seconds and the transfers of all contracts are fetched with one query per block range.
+    Blocks whose logsBloom contains no Transfer of a tracked contract are skipped without eth_getLogs request.
+    Errors of a poll (rpc, circuit open or db errors) are logged and the same blocks are polled again after 'poll_interval'.
+    The historical backfill runs separately (without --follow).
+    """
+    # skip contracts without abi or Transfer event
+    tracked_contract_addresses = []
+    for contract_address in contract_addresses:
         try:
+            if infura_execution_client.get_transfer_layout(contract_address) is None:
+                raise ValueError("No Transfer event")
+            tracked_contract_addresses.append(contract_address)
+        except Exception:
+            logging.warning(
+                f"Contract not followed (no abi or Transfer event): {contract_address}")
+
+    transfer_bloom_filter = LogBloomFilter(
+        tracked_contract_addresses, [TRANSFER_EVENT_TOPIC])
+
+    if from_block is None:
+        last_block = infura_execution_client.block_number()["block_number"]
+    else:
+        last_block = from_block - 1
+
+    logging.info(
+        f"Following chain head: {len(tracked_contract_addresses)} contracts from block {last_block + 1}")
+
+    while True:
+        try:
+            reorg_tracker.update_finalized_block()
+
+            # re-ingest rolled back blocks
+            first_reorged_block = reorg_tracker.check_reorg()
+            if first_reorged_block is not None:
+                last_block = min(last_block, first_reorged_block - 1)
+
+            head_block = infura_execution_client.get_block("latest")
+
+            if head_block["number"] > last_block:
+                profiler.start_contract("follow")
+
+                # only blocks whose logsBloom may contain a Transfer of a tracked contract are queried
+                candidate_ranges = infura_execution_client.get_bloom_candidate_ranges(
+                    transfer_bloom_filter, last_block + 1, head_block["number"], {head_block["number"]: head_block["logsBloom"]})
+
+                transactions = []
+                for candidate_from_block, candidate_to_block in candidate_ranges:
+                    transactions.extend(infura_execution_client.get_transfer_records(
+                        tracked_contract_addresses, candidate_from_block, candidate_to_block, finalized_block=reorg_tracker.finalized_block))
+
+                holder_balances.insert_transactions(transactions)
+
+                # the head block hash is needed to detect reorgs of blocks without transactions
+                block_hashes = get_block_hashes(transactions)
+                block_hashes[head_block["number"]] = head_block["hash"]
+                reorg_tracker.record_blocks(block_hashes)
+
+                logging.info(
+                    f"Blocks {last_block + 1}-{head_block['number']} followed: {len(transactions)} transactions inserted in db")
+
+                profiler.finish_contract()
+
+                last_block = head_block["number"]
+        except Exception as e:
+            # rpc or db errors do not stop following, the same blocks are polled again (last_block is unchanged)
+            profiler.finish_contract()
+            logging.error(
+                f"Error while following blocks from {last_block + 1}, retrying in {poll_interval}s, error: {e}")
+
+        time.sleep(poll_interval)
+
+
+def collect_registry_contracts():
+    """
+    Claim pending contracts from the contract registry and insert their transactions until no pending contract is left.
+    Contracts with a last block are continued from the block after it.
+    """
+    while True:
+        contracts = contract_registry.claim_contracts()
+        if len(contracts) == 0:
+            break
+
+        contract = contracts[0]
+        profiler.start_contract(contract["contract_address"])
+        try:
+            logging.info(
+                f"Contract transaction collection started: {contract['contract_address']} ({contract_registry.get_status_counts()})")
+
+            # results up to the finalized block can be cached
+            reorg_tracker.update_finalized_block()
+
+            from_block = 0 if contract["last_block"] is None else contract["last_block"] + 1
+            to_block = infura_execution_client.block_number()["block_number"]
+
+            # the last committed block is kept while inserting, so an interrupted contract is continued from there
+            insert_contract_transactions(
+                contract["contract_address"], from_block, to_block,
+                on_checkpoint=lambda block: contract_registry.update_last_block(contract["contract_address"], block))
+
+            contract_registry.mark_collected(
+                contract["contract_address"], to_block)
+
             logging.info(
-                f"Contract transaction collection started: {contract['address']} [{index+1}/{len(contract_list)}]")
+                f"Contract transaction collection done: {contract['contract_address']}")
+        except Exception as e:
+            contract_registry.mark_error(contract["contract_address"], e)
+            logging.error(
+                f"Error while collecting contract transactions: {contract['contract_address']}, error: {e}")
+
+        profiler.finish_contract()
+
+
+def get_contract_deploy_block(contract_address: str) -> int:
+    # contract metadata (incl. deploy block) is stored in the contract table with the abi
+    infura_execution_client.get_contract_abi(contract_address)
+
+    contract_data = sql_db_connector.query_all_contract_data(
+        config.SQL_DATABASE_TABLE_CONTRACT, contract_address)
+
+    return contract_data["block_deployed"] if contract_data["block_deployed"] is not None else 0
+
+
+def enqueue_registry_contracts(shard_size: int = config.QUEUE_SHARD_SIZE, plan: bool = False):
+    """
+    Split the remaining block range of all pending registry contracts into shards in the work queue.
+    Contracts are collected from the block after their last block or from their deploy block.
+
+    With 'plan' the transfers of every contract are estimated first (CollectionPlanner): large contracts are split,
+    small ones batched and jobs are enqueued largest first. The plan with its eta is written to config.PLAN_REPORT_PATH.
+    """
+    to_block = infura_execution_client.block_number()["block_number"]
+
+    planned_contracts = []
+
+    while True:
+        contracts = contract_registry.claim_contracts(100)
+        if len(contracts) == 0:
+            break
 
-            # filter contract list
-            if filter_coontract_list:
-                if not contract["collected"] and not contract["error"]:
-                    insert_contract_transactions(contract['address'])
+        for contract in contracts:
+            try:
+                if contract["last_block"] is not None:
+                    from_block = contract["last_block"] + 1
                 else:
-                    logging.info(
-                        f"Contract transactions already collected and in db")
-            else:
-                insert_contract_transactions(contract['address'])
+                    from_block = get_contract_deploy_block(
+                        contract["contract_address"])
+
+                if from_block > to_block:
+                    contract_registry.mark_collected(
+                        contract["contract_address"], contract["last_block"])
+                    continue
+
+                if plan:
+                    planned_contracts.append(
+                        (contract["contract_address"], from_block, to_block))
+                    continue
+
+                job_count = work_queue.create_jobs(
+                    contract["contract_address"], from_block, to_block, shard_size)
+                contract_registry.mark_queued(contract["contract_address"])
+
+                logging.info(
+                    f"Contract enqueued: {contract['contract_address']} ({job_count} jobs)")
+            except Exception as e:
+                contract_registry.mark_error(contract["contract_address"], e)
+                logging.error(
+                    f"Error while enqueuing contract: {contract['contract_address']}, error: {e}")
+
+    if plan and len(planned_contracts) != 0:
+        # contracts that can not be estimated are marked as error (all others stay claimed until queued)
+        collection_plan = collection_planner.plan(
+            planned_contracts, config.PLANNER_WORKERS, contract_registry.mark_error)
+
+        work_queue.create_planned_jobs(collection_plan["jobs"])
+        for contract_address in collection_plan["contract_addresses"]:
+            contract_registry.mark_queued(contract_address)
+
+        with open(config.PLAN_REPORT_PATH, "w") as f:
+            json.dump(collection_plan, f, indent=4)
+
+    logging.info(f"Work queue status: {work_queue.get_status_counts()}")
 
+
+def run_collection_worker():
+    """
+    Lease jobs from the work queue and insert their transactions until the queue is empty.
+    Any number of workers (processes or machines) can run at the same time.
+    """
+    while True:
+        job = work_queue.lease_job()
+        if job is None:
+            break
+
+        profiler.start_contract(job["contract_address"])
+        try:
             logging.info(
-                f"Contract transaction collection done: {contract['address']} [{index+1}/{len(contract_list)}]")
+                f"Job started: {job['contract_address']} blocks {job['from_block']}-{job['to_block']}")
+
+            reorg_tracker.update_finalized_block()
+
+            # jobs can take longer than the lease duration
+            def renew_lease(batch_to_block):
+                work_queue.renew_lease_if_due(job)
+
+            contract_addresses = WorkQueue.get_job_contract_addresses(job)
+            if len(contract_addresses) == 1:
+                insert_contract_transactions(
+                    job["contract_address"], job["from_block"], job["to_block"], on_batch=renew_lease)
+            else:
+                insert_transfers_of_contracts(
+                    contract_addresses, job["from_block"], job["to_block"], on_batch=renew_lease)
+
+            work_queue.complete_job(job)
+        except LeaseLostError as e:
+            # the job is collected by another worker now
+            logging.warning(f"{e}, job abandoned")
         except Exception as e:
+            work_queue.fail_job(job, e)
             logging.error(
-                f"Error while collecting contract transactions: {contract['address']} [{index+1}/{len(contract_list)}]")
-            # raise e
+                f"Error while collecting job: {job['contract_address']} blocks {job['from_block']}-{job['to_block']}, error: {e}")
+
+        profiler.finish_contract()
+
+        # update registry once all jobs of the contract are finished
+        for contract_address in WorkQueue.get_job_contract_addresses(job):
+            contract_status = work_queue.get_contract_status(contract_address)
+            if contract_status is not None:
+                status, last_block = contract_status
+                if status == "done":
+                    contract_registry.mark_collected(
+                        contract_address, last_block)
+                else:
+                    contract_registry.mark_error(contract_address, RuntimeError(
+                        "Collection jobs failed"))
+
+    logging.info(f"Work queue empty: {work_queue.get_status_counts()}")
+
+
+def migrate_transaction_key(batch_size: int = 1000):
+    """
+    Key the transaction table by (transaction_hash, log_index) (tables of older versions are keyed by transaction_hash).
+    Rows without log index get the index of their Transfer log from the transaction receipt first.
+    Older versions kept only the first Transfer of a transaction: contracts have to be collected again afterwards,
+    the skipped transfers are inserted (and added to the balances) then.
+    """
+    table_name = config.SQL_DATABASE_TABLE_TRANSACTION
+
+    while True:
+        transactions = sql_db_connector.query_transactions_without_log_index(
+            table_name, batch_size)
+        if len(transactions) == 0:
+            break
+
+        receipts = infura_execution_client.get_raw_transaction_receipts(
+            [transaction["transaction_hash"] for transaction in transactions])
+
+        log_indexes = []
+        for transaction, receipt in zip(transactions, receipts):
+            layout = infura_execution_client.get_transfer_layout(
+                transaction["contract_address"])
+
+            matching_log_indexes = []
+            for log in receipt["logs"] if receipt is not None and layout is not None else []:
+                if log["address"].lower() != transaction["contract_address"].lower() or log["topics"][:1] != [TRANSFER_EVENT_TOPIC]:
+                    continue
+                record = decode_transfer_log(log, layout)
+                if record is not None and (record.from_address, record.to_address) == (transaction["from_address"], transaction["to_address"]):
+                    exact = (record.token_id, record.value) == (
+                        transaction["token_id"], transaction["value"])
+                    matching_log_indexes.append((not exact, record.log_index))
+
+            if len(matching_log_indexes) == 0:
+                # -1 never collides with a collected log
+                logging.warning(
+                    f"Transfer log not found in receipt: {transaction['transaction_hash']} ({transaction['contract_address']})")
+                log_indexes.append((transaction["transaction_hash"], -1))
+            else:
+                # exact matches first, then the first log of the same addresses
+                log_indexes.append(
+                    (transaction["transaction_hash"], min(matching_log_indexes)[1]))
+
+        sql_db_connector.update_transaction_log_indexes(
+            table_name, log_indexes)
+        logging.info(f"Log indexes set: {len(log_indexes)} transactions")
+
+    sql_db_connector.migrate_transaction_key(table_name)
+    logging.info(
+        "Transaction table keyed by (transaction_hash, log_index), collect the contracts again to add transfers skipped by older versions")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Collect contract transactions into the sql database.")
+    parser.add_argument("--contract-list", default=None,
+                        help="json file with contracts to add to the contract registry before collecting")
+    parser.add_argument("--retry-errors", action="store_true",
+                        help="set contracts with errors back to pending")
+    parser.add_argument("--reset-claims", action="store_true",
+                        help="set contracts claimed by crashed workers back to pending (no other worker may run)")
+    parser.add_argument("--enqueue", action="store_true",
+                        help="split pending contracts into jobs of the work queue")
+    parser.add_argument("--plan", action="store_true",
+                        help="estimate the transfers of every contract before enqueuing (job sizes, order and eta)")
+    parser.add_argument("--worker", action="store_true",
+                        help="collect jobs of the work queue (can run in many processes)")
+    parser.add_argument("--follow", action="store_true",
+                        help="follow the chain head instead of the historical backfill")
+    parser.add_argument("--from-block", type=int, default=None,
+                        help="first block to follow from (default: current head)")
+    parser.add_argument("--partition-transactions", action="store_true",
+                        help="rebuild the transaction table with block range partitions (SQL_TRANSACTION_PARTITION_BLOCKS blocks each) and exit")
+    parser.add_argument("--migrate-transaction-key", action="store_true",
+                        help="key the transaction table of older versions by (transaction_hash, log_index) and exit")
+    parser.add_argument("--metrics-port", type=int, default=config.METRICS_PORT,
+                        help="port of the prometheus metrics endpoint (default: disabled, use one port per worker process)")
+    parser.add_argument("--metrics-file", default=config.METRICS_DUMP_PATH,
+                        help="file for periodic metrics dumps")
+    parser.add_argument("--profile", action="store_true",
+                        help="write per stage and contract timings, cProfile stats and allocations to --profile-dir")
+    parser.add_argument("--profile-dir", default=config.PROFILE_DIR,
+                        help="directory of the profiling reports")
+    args = parser.parse_args()
+
+    # tables of older versions keep one Transfer per transaction (later logs would be dropped by the inserts)
+    if args.migrate_transaction_key:
+        migrate_transaction_key()
+        sys.exit()
+    if "log_index" not in sql_db_connector.query_primary_key_columns(config.SQL_DATABASE_TABLE_TRANSACTION):
+        logging.error(
+            "Transaction table keyed by transaction_hash only, run with --migrate-transaction-key first")
+        sys.exit(1)
+
+    if args.partition_transactions:
+        if config.SQL_TRANSACTION_PARTITION_BLOCKS is None:
+            parser.error("SQL_TRANSACTION_PARTITION_BLOCKS is not set")
+        sql_db_connector.partition_by_block_range(
+            config.SQL_DATABASE_TABLE_TRANSACTION, config.SQL_TRANSACTION_PARTITION_BLOCKS)
+        sys.exit()
+
+    if args.profile:
+        profiler.enable(args.profile_dir)
+
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+    if args.metrics_file is not None:
+        metrics.start_file_dump(args.metrics_file,
+                                config.METRICS_DUMP_INTERVAL)
+
+    if args.contract_list is not None:
+        with open(args.contract_list, "r") as f:
+            contract_registry.register_contracts(
+                {os.path.basename(args.contract_list).replace(".json", ""): json.load(f)})
+
+    if args.retry_errors:
+        contract_registry.reset_contracts("error")
+    if args.reset_claims:
+        contract_registry.reset_contracts("collecting")
+
+    logging.info(
+        f"Contract registry status: {contract_registry.get_status_counts()}")
+
+    try:
+        if args.follow:
+            follow_contract_transactions(
+                contract_registry.get_contract_addresses(), args.from_block)
+        elif args.enqueue or args.worker:
+            if args.enqueue:
+                enqueue_registry_contracts(plan=args.plan)
+            if args.worker:
+                run_collection_worker()
+        else:
+            collect_registry_contracts()
+    finally:
+        # queued transfers are written before exiting (also on KeyboardInterrupt)
+        transaction_writer.close()
+
+    profiler.write_run_summary()
+
+    logging.info(f"RPC retry stats: {retry_handler.stats()}")
+    logging.info(f"RPC cache stats: {rpc_cache.stats()}")
+    logging.info(f"Epoch cache stats: {epoch_cache.stats()}")
+
+    if args.metrics_file is not None:
+        metrics.dump(args.metrics_file)
@@ -0,0 +1,43 @@
+from connectors import SqlDatabaseConnector
+from collector import HolderBalances, ProvenanceIndex
+import config
+import db_params.sql_tables as tables
+import argparse
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild holder balances, token owners and token provenance from the transaction table (stop collection first).")
+    parser.add_argument("--contract", action="append", default=None,
+                        help="contract address to rebuild (can be repeated, default: all contracts)")
+    args = parser.parse_args()
+
+    sql_db_connector = SqlDatabaseConnector(
+        config.SQL_DATABASE_HOST,
+        config.SQL_DATABASE_PORT,
+        config.SQL_DATABASE_USER,
+        config.SQL_DATABASE_PASSWORD,
+        config.SQL_DATABASE_NAME,
+        [tables.HOLDER_BALANCE_TABLE, tables.TOKEN_OWNER_TABLE,
+            tables.TOKEN_PROVENANCE_TABLE]
+    )
+
+    provenance_index = ProvenanceIndex(
+        sql_db_connector,
+        config.SQL_DATABASE_TABLE_TRANSACTION,
+        config.SQL_DATABASE_TABLE_TOKEN_PROVENANCE
+    )
+
+    holder_balances = HolderBalances(
+        sql_db_connector,
+        config.SQL_DATABASE_TABLE_TRANSACTION,
+        config.SQL_DATABASE_TABLE_HOLDER_BALANCE,
+        config.SQL_DATABASE_TABLE_TOKEN_OWNER,
+        provenance_index
+    )
+
+    holder_balances.rebuild(args.contract)
+
+    logging.info(f"Holder balances rebuilt")
@@ -0,0 +1,74 @@
+from connectors import SqlDatabaseConnector, ExecutionClientConnector, RetryHandler, RpcCache
+from collector import ContractRegistry, StorageReader
+import config
+import argparse
+import csv
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Read the EIP-1967 / EIP-1822 proxy slots of many contracts into a csv file.")
+    parser.add_argument("--block", type=int, default=None,
+                        help="block of the slots (default: finalized block)")
+    parser.add_argument("--address-file", default=None,
+                        help="file with one contract address per line (default: all contracts of the contract registry)")
+    parser.add_argument("--output", required=True,
+                        help="csv file (contract_address, implementation, admin, beacon, proxiable)")
+    parser.add_argument("--batch-size", type=int, default=config.STORAGE_BATCH_SIZE,
+                        help="eth_getStorageAt requests per json-rpc batch")
+    parser.add_argument("--workers", type=int, default=config.STORAGE_WORKERS,
+                        help="concurrent batch requests")
+    args = parser.parse_args()
+
+    sql_db_connector = SqlDatabaseConnector(
+        config.SQL_DATABASE_HOST,
+        config.SQL_DATABASE_PORT,
+        config.SQL_DATABASE_USER,
+        config.SQL_DATABASE_PASSWORD,
+        config.SQL_DATABASE_NAME,
+        []
+    )
+
+    if args.address_file is not None:
+        with open(args.address_file, "r") as f:
+            addresses = [line.strip() for line in f if line.strip() != ""]
+    else:
+        addresses = ContractRegistry(
+            sql_db_connector, config.SQL_DATABASE_TABLE_CONTRACT_REGISTRY).get_contract_addresses()
+
+    retry_handler = RetryHandler(
+        config.RPC_MAX_RETRIES,
+        config.RPC_RETRY_BASE_DELAY,
+        config.RPC_RETRY_MAX_DELAY,
+        config.RPC_CIRCUIT_FAILURE_THRESHOLD,
+        config.RPC_CIRCUIT_RESET_TIMEOUT
+    )
+
+    # slots of finalized blocks are cached (repeated runs are served from the cache)
+    rpc_cache = RpcCache(config.RPC_CACHE_PATH, config.RPC_CACHE_MAX_SIZE)
+
+    execution_client_url = f"http://{config.EXECUTION_CLIENT_IP}:{config.EXECUTION_CLIENT_PORT}"
+    execution_client = ExecutionClientConnector(
+        execution_client_url, config.ETHERSCAN_URL, config.ETHERSCAN_API_KEY, sql_db_connector, config.SQL_DATABASE_TABLE_CONTRACT, retry_handler, rpc_cache, config.SQL_DATABASE_TABLE_ABI)
+
+    finalized_block = execution_client.update_finality_watermark()
+    block = args.block if args.block is not None else finalized_block
+
+    storage_reader = StorageReader(
+        execution_client, args.batch_size, args.workers)
+    proxy_slots = storage_reader.get_proxy_slots(addresses, block)
+
+    slot_names = ["implementation", "admin", "beacon", "proxiable"]
+    with open(args.output, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["contract_address"] + slot_names)
+        for address, slots in proxy_slots.items():
+            writer.writerow([address] + [slots[slot_name] or "" for slot_name in slot_names])
+
+    proxy_count = sum(1 for slots in proxy_slots.values()
+                      if any(slot is not None for slot in slots.values()))
+    logging.info(
+        f"Proxies resolved at block {block}: {proxy_count} of {len(addresses)} contracts")
+    logging.info(f"RPC cache stats: {rpc_cache.stats()}")
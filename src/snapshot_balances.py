@@ -0,0 +1,75 @@
+from connectors import SqlDatabaseConnector, ExecutionClientConnector, RetryHandler
+from collector import BalanceSnapshotter
+import config
+import argparse
+import csv
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Snapshot ETH or ERC20 balances of many addresses at one or more blocks into a csv file.")
+    parser.add_argument("--block", type=int, action="append", required=True,
+                        help="block of the snapshot (can be repeated)")
+    parser.add_argument("--token", default=None,
+                        help="ERC20 contract address (default: ETH balances)")
+    parser.add_argument("--address-file", default=None,
+                        help="file with one address per line")
+    parser.add_argument("--holders-of", default=None,
+                        help="contract address whose holders in the holder balance table are snapshotted")
+    parser.add_argument("--output", required=True,
+                        help="csv file (block_number, address, balance)")
+    parser.add_argument("--method", choices=["multicall", "batch"], default=config.SNAPSHOT_METHOD,
+                        help="Multicall3 aggregate3 calls or json-rpc batches")
+    parser.add_argument("--batch-size", type=int, default=config.SNAPSHOT_BATCH_SIZE,
+                        help="addresses per request")
+    parser.add_argument("--workers", type=int, default=config.SNAPSHOT_WORKERS,
+                        help="concurrent requests")
+    args = parser.parse_args()
+
+    sql_db_connector = SqlDatabaseConnector(
+        config.SQL_DATABASE_HOST,
+        config.SQL_DATABASE_PORT,
+        config.SQL_DATABASE_USER,
+        config.SQL_DATABASE_PASSWORD,
+        config.SQL_DATABASE_NAME,
+        []
+    )
+
+    addresses = []
+    if args.address_file is not None:
+        with open(args.address_file, "r") as f:
+            addresses.extend([line.strip() for line in f if line.strip() != ""])
+    if args.holders_of is not None:
+        addresses.extend([holder["holder_address"] for holder in sql_db_connector.query_holders(
+            config.SQL_DATABASE_TABLE_HOLDER_BALANCE, args.holders_of)])
+    if len(addresses) == 0:
+        parser.error("no addresses (use --address-file or --holders-of)")
+
+    retry_handler = RetryHandler(
+        config.RPC_MAX_RETRIES,
+        config.RPC_RETRY_BASE_DELAY,
+        config.RPC_RETRY_MAX_DELAY,
+        config.RPC_CIRCUIT_FAILURE_THRESHOLD,
+        config.RPC_CIRCUIT_RESET_TIMEOUT
+    )
+
+    execution_client_url = f"http://{config.EXECUTION_CLIENT_IP}:{config.EXECUTION_CLIENT_PORT}"
+    execution_client = ExecutionClientConnector(
+        execution_client_url, config.ETHERSCAN_URL, config.ETHERSCAN_API_KEY, sql_db_connector, config.SQL_DATABASE_TABLE_CONTRACT, retry_handler, abi_table_name=config.SQL_DATABASE_TABLE_ABI)
+
+    balance_snapshotter = BalanceSnapshotter(
+        execution_client, args.method, args.batch_size, args.workers)
+
+    balances = balance_snapshotter.snapshot(
+        list(dict.fromkeys(addresses)), args.block, args.token)
+
+    with open(args.output, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["block_number", "address", "balance"])
+        for block_number, block_balances in balances.items():
+            for address, balance in block_balances.items():
+                writer.writerow([block_number, address, balance])
+
+    logging.info(f"RPC retry stats: {retry_handler.stats()}")